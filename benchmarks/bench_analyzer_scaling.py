@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Measure Valuation_Analyzer_Pure against universe size.
+
+For each size a synthetic universe is generated (generate_universe.py) and a
+fresh worker process, pointed at it with PE_VALUATION_DATA_DIR, times:
+
+    load       Valuation_Analyzer_Pure() - snapshot loading, industry stats, revisions
+    valuation  aggregate_company_records over the whole universe
+    table      build_valuation_table on those records
+    export     save_to_excel_fast
+
+and reports its peak RSS. Each run is appended to benchmarks/results/analyzer_scaling.jsonl
+with the git commit, so results can be compared across versions:
+
+    python3 benchmarks/bench_analyzer_scaling.py --sizes 1000 5000 50000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'modules'))
+sys.path.insert(0, BENCH_DIR)
+
+from generate_universe import generate_universe
+
+RESULTS_PATH = os.path.join(BENCH_DIR, 'results', 'analyzer_scaling.jsonl')
+DEFAULT_SIZES = [1000, 5000, 20000, 50000]
+STAGES = ['load', 'valuation', 'table', 'export']
+
+
+def run_worker(universe_dir, result_path):
+    """Time each stage in this process; PE_VALUATION_DATA_DIR must already point at universe_dir"""
+    from universe import load_universe
+    from valuation_analyzer import Valuation_Analyzer_Pure, build_valuation_table
+
+    stock_list = load_universe([os.path.join(universe_dir, 'universe.json')])
+
+    timings = {}
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        started = time.perf_counter()
+        analyzer = Valuation_Analyzer_Pure(stock_list=stock_list)
+        timings['load'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        records = analyzer.aggregate_company_records(stock_list)
+        timings['valuation'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        table = build_valuation_table(records)
+        timings['table'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        analyzer.save_to_excel_fast(records, os.path.join(universe_dir, 'valuation.xlsx'))
+        timings['export'] = time.perf_counter() - started
+
+    result = {
+        **{f"{stage}_seconds": round(seconds, 3) for stage, seconds in timings.items()},
+        'rows': len(table),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+
+def measure(size, seed=0):
+    """Generate a universe of size tickers and measure it in a fresh process"""
+    with tempfile.TemporaryDirectory() as universe_dir:
+        generate_universe(size, universe_dir, seed=seed)
+        result_path = os.path.join(universe_dir, 'result.json')
+        env = {**os.environ, 'PE_VALUATION_DATA_DIR': universe_dir}
+        subprocess.run([sys.executable, __file__, '--worker', universe_dir, result_path], env=env, check=True)
+        with open(result_path, 'r') as f:
+            return {'size': size, **json.load(f)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-save', action='store_true', help="do not append to the results file")
+    parser.add_argument('--worker', nargs=2, metavar=('UNIVERSE_DIR', 'RESULT_PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        sys.exit(0)
+
+    run = {'date': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit(),
+           'python': platform.python_version(), 'results': []}
+    print(f"{'tickers':>8}" + ''.join(f"{stage + ' (s)':>14}" for stage in STAGES) + f"{'peak RSS (MB)':>15}")
+    for size in args.sizes:
+        result = measure(size, args.seed)
+        run['results'].append(result)
+        print(f"{size:>8}" + ''.join(f"{result[stage + '_seconds']:>14.3f}" for stage in STAGES)
+              + f"{result['peak_rss_mb']:>15.1f}")
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+        with open(RESULTS_PATH, 'a') as f:
+            f.write(json.dumps(run) + '\n')
+        print(f"Appended results to {RESULTS_PATH}")
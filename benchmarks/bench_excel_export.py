@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Compare the DataFrame.to_excel export path with the direct xlsxwriter path"""
+
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+from excel_export import write_industry_workbook, write_dataframes_workbook
+from valuation_analyzer import build_industry_dataframes
+
+UNIVERSE_SIZES = [200, 2000, 20000]
+# Industries grow with the universe, but far slower than the ticker count
+TICKERS_PER_INDUSTRY = 150
+
+
+def synthetic_record(rng, industry, ticker):
+    """A company_data dict shaped like Valuation_Analyzer_Pure.process_company output"""
+    eps_25 = round(rng.uniform(0.5, 20), 2)
+    eps_26 = round(eps_25 * rng.uniform(0.9, 1.3), 2)
+    pe_median = round(rng.uniform(8, 60), 1)
+    price = round(rng.uniform(10, 800), 2)
+    record = {
+        "Revenue Growth Forecast (5Y)": round(rng.uniform(-5, 40), 2),
+        "EPS Growth Forecast (5Y)": round(rng.uniform(-5, 40), 2),
+        "EPS Growth Past 5 Years": round(rng.uniform(-20, 80), 2),
+        "預估PE": round(rng.uniform(5, 60), 2),
+        "25年EPS": eps_25,
+        "25年合理價": float(round(eps_25 * 20)),
+        "26年EPS": eps_26,
+        "26年合理價": float(round(eps_26 * 20)),
+        "五年PEMEDIAN": pe_median,
+        "五年PE中位價": float(round(pe_median * eps_25)),
+        "市值": round(rng.uniform(1, 4000), 2),
+        "股價": price,
+        "25年估值": rng.choice(["高估", "低估"]),
+        "25年相差百分比": rng.uniform(-80, 80),
+        "26年PE中位價": float(round(pe_median * eps_26)),
+        "26年估值": rng.choice(["高估", "低估", None]),
+        "26年相差百分比": rng.choice([rng.uniform(-80, 80), math.nan]),
+    }
+    record['Industry'] = industry
+    record['Company'] = ticker
+    return record
+
+
+def synthetic_industry_records(size, seed=0):
+    rng = random.Random(seed)
+    industry_records = {}
+    for index in range(size):
+        industry = f"Industry {index // TICKERS_PER_INDUSTRY:04d}"
+        ticker = f"T{index:05d}"
+        industry_records.setdefault(industry, []).append(synthetic_record(rng, industry, ticker))
+    return industry_records
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def export_via_dataframes(industry_records, path):
+    write_dataframes_workbook(build_industry_dataframes(industry_records), path)
+
+
+if __name__ == "__main__":
+    print(f"{'tickers':>8} {'to_excel (s)':>14} {'xlsxwriter (s)':>16} {'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in UNIVERSE_SIZES:
+            industry_records = synthetic_industry_records(size)
+            legacy = time_call(export_via_dataframes, industry_records, os.path.join(tmp_dir, 'legacy.xlsx'))
+            fast = time_call(write_industry_workbook, industry_records, os.path.join(tmp_dir, 'fast.xlsx'))
+            print(f"{size:>8} {legacy:>14.3f} {fast:>16.3f} {legacy / fast:>8.1f}x")
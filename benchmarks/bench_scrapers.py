@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Measure scraper throughput offline against benchmarks/mock_server.py.
+
+Each scraper runs its get_company_metrics loop over a synthetic stock list with
+the inter-ticker sleeps disabled, so the result reflects fetch, retry and parse
+cost only. Pacing, latency and error injection are set from the command line:
+
+    python3 benchmarks/bench_scrapers.py --tickers 40 --latency 0.2 --error-rate 0.05
+
+With --adaptive the scrapers are paced by an AdaptiveHostBudget (AIMD) with a
+fresh state instead of a fixed interval, which shows how close the learned rate
+gets to the mock site's --rate-limit and how many 429s it costs:
+
+    python3 benchmarks/bench_scrapers.py --tickers 400 --rate-limit 20 --adaptive
+
+With --threads the tickers are fetched concurrently through scrape_ticker, as
+`main.py scrape` does, and --parse-workers moves HTML parsing to a ParsePool so
+it overlaps the fetches on several cores (use --pad-kb for heavier pages):
+
+    python3 benchmarks/bench_scrapers.py --tickers 400 --threads 8 --parse-workers 4 --pad-kb 200
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from instrumentation import RECORDER, print_summary
+from macrotrends_slugs import SlugResolver
+from mock_server import add_server_arguments, server_from_args
+from parse_pool import ParsePool
+from utils import AdaptiveHostBudget, HostRateLimiter
+
+# Scraper name -> (module, class)
+SCRAPERS = {
+    'ratio': ('ratio_scraper', 'Ratio_Scraper_Fixed'),
+    'forecast': ('forecast_scraper', 'Forecast_Scraper_Working'),
+    'pe': ('pe_scraper', 'PERatioScraper'),
+    'quarterly': ('quarterly_scraper', 'Quarterly_Scraper'),
+}
+
+
+def build_scraper(name, base_url, rate_limiter, slug_cache_path, parse_pool=None):
+    module_name, class_name = SCRAPERS[name]
+    scraper_class = getattr(importlib.import_module(module_name), class_name)
+    if name == 'quarterly':
+        return scraper_class(base_url=base_url, rate_limiter=rate_limiter, parse_pool=parse_pool)
+    if name == 'ratio':
+        # yfinance quotes cannot be redirected to the mock server
+        return scraper_class(base_url=base_url, rate_limiter=rate_limiter, delay_range=(0, 0), fetch_prices=False,
+                             parse_pool=parse_pool)
+    if name == 'pe':
+        # Synthetic slugs must not end up in the real data/macrotrends_slugs.json
+        resolver = SlugResolver(base_url, rate_limiter, cache_path=slug_cache_path)
+        return scraper_class(base_url=base_url, rate_limiter=rate_limiter, delay_range=(0, 0),
+                             slug_resolver=resolver, parse_pool=parse_pool)
+    return scraper_class(base_url=base_url, rate_limiter=rate_limiter, delay_range=(0, 0), parse_pool=parse_pool)
+
+
+def scrape_concurrently(scraper, stock_list, threads):
+    """scrape_ticker over the stock list on a thread pool, like main.py scrape's per-host workers"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    tickers = [ticker for companies in stock_list.values() for ticker in companies]
+    if hasattr(scraper, 'slugs'):
+        scraper.slugs.resolve(tickers)
+    with ThreadPoolExecutor(threads) as executor:
+        results = executor.map(scraper.scrape_ticker, tickers)
+        return {ticker: result for ticker, result in zip(tickers, results) if result}
+
+
+def run_scraper(name, server, stock_list, min_interval, verbose=False, adaptive=None, threads=1, parse_pool=None):
+    """
+    Run one scraper over the stock list.
+
+    Args:
+        adaptive (dict, optional): AdaptiveHostBudget arguments; pace adaptively instead of every min_interval
+        threads (int): Concurrent scrape_ticker calls, 1 runs get_company_metrics
+        parse_pool (ParsePool, optional): Parse pages in worker processes
+
+    Returns:
+        dict: tickers, succeeded, seconds, tickers_per_minute, statuses, rate (learned, adaptive only)
+    """
+    statuses_before = dict(server.status_counts)
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        if adaptive is not None:
+            limiter = AdaptiveHostBudget(state_dir=state_dir, **adaptive)
+        else:
+            limiter = HostRateLimiter(min_interval=min_interval, jitter=0)
+        scraper = build_scraper(name, server.base_url, limiter, os.path.join(state_dir, 'macrotrends_slugs.json'),
+                                parse_pool)
+        started = time.perf_counter()
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            if threads > 1:
+                results = scrape_concurrently(scraper, stock_list, threads)
+            else:
+                results = scraper.get_company_metrics(stock_list=stock_list)
+        elapsed = time.perf_counter() - started
+        rate = limiter.rate(server.base_url) if adaptive is not None else None
+
+    tickers = sum(len(companies) for companies in stock_list.values())
+    return {
+        'tickers': tickers,
+        'succeeded': len(results),
+        'seconds': elapsed,
+        'tickers_per_minute': len(results) / elapsed * 60,
+        'statuses': {status: count - statuses_before.get(status, 0)
+                     for status, count in server.status_counts.items()
+                     if count != statuses_before.get(status, 0)},
+        'rate': rate,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scrapers', nargs='+', choices=sorted(SCRAPERS), default=sorted(SCRAPERS))
+    parser.add_argument('--tickers', type=int, default=40, help="synthetic tickers per scraper")
+    parser.add_argument('--min-interval', type=float, default=0.0, help="client-side per-host pacing in seconds")
+    parser.add_argument('--verbose', action='store_true', help="show the scrapers' own output")
+    parser.add_argument('--adaptive', action='store_true', help="pace with AIMD instead of --min-interval")
+    parser.add_argument('--initial-rate', type=float, default=1.0, help="adaptive: starting requests/second")
+    parser.add_argument('--increase', type=float, default=1.0,
+                        help="adaptive: requests/second gained per second while healthy")
+    parser.add_argument('--threads', type=int, default=1, help="concurrent tickers per scraper")
+    parser.add_argument('--parse-workers', type=int, default=0, help="parse in a pool of this many processes")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args).start()
+    stock_list = {'Benchmark': [f"T{index:04d}" for index in range(args.tickers)]}
+    server.tickers = stock_list['Benchmark']
+    adaptive = {'initial_rate': args.initial_rate, 'increase': args.increase, 'max_rate': 1000.0,
+                'cooldown': 1.0} if args.adaptive else None
+    pacing = f"adaptive from {args.initial_rate}/s" if adaptive else f"client interval {args.min_interval}s"
+    parse_pool = ParsePool(args.parse_workers) if args.parse_workers else None
+    print(f"Mock site {server.base_url}: latency {args.latency}s, error rate {args.error_rate:.0%}, "
+          f"rate limit {args.rate_limit or 'none'}, {pacing}, {args.threads} threads, "
+          f"{args.parse_workers or 'no'} parse workers")
+
+    print(f"{'scraper':<10}{'ok':>9}{'seconds':>10}{'tickers/min':>13}  statuses")
+    try:
+        for name in args.scrapers:
+            try:
+                result = run_scraper(name, server, stock_list, args.min_interval, args.verbose, adaptive,
+                                     args.threads, parse_pool)
+            except ImportError as e:
+                print(f"{name:<10}  skipped: {e}")
+                continue
+            statuses = ' '.join(f"{status}:{count}" for status, count in sorted(result['statuses'].items()))
+            if result['rate'] is not None:
+                statuses += f"  learned {result['rate']:.1f}/s"
+            print(f"{name:<10}{result['succeeded']:>4}/{result['tickers']:<4}{result['seconds']:>10.2f}"
+                  f"{result['tickers_per_minute']:>13.1f}  {statuses}")
+    finally:
+        server.stop()
+        if parse_pool:
+            parse_pool.close()
+
+    print()
+    print_summary(RECORDER.summary())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic ticker universe of any size in the data/ snapshot layout.
+
+Every synthetic ticker copies the ratio, forecast and PE records of a randomly
+chosen real ticker from the latest snapshots in data/ and scales each numeric
+field by a random factor, so field names, value types (including the strings
+and nulls the scrapers store) and value ranges match real snapshots. Quarterly
+EPS/revenue arrays are derived from the forecast. The stock list is written as
+the universe file universe.json; point the CLI at the tree with
+PE_VALUATION_DATA_DIR and at the universe with --universe:
+
+    python3 benchmarks/generate_universe.py --size 50000 --output /tmp/universe
+    PE_VALUATION_DATA_DIR=/tmp/universe python3 main.py analyze --universe /tmp/universe/universe.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'modules'))
+
+from paths import PROJECT_ROOT
+from universe import write_universe
+
+REAL_DATA_DIR = os.path.join(PROJECT_ROOT, 'data')
+
+# Dataset (subdirectory) -> snapshot file prefix
+SNAPSHOTS = {
+    'ratio': 'stock_list_metrics',
+    'forecast': 'stock_list_forecasts',
+    'pe': 'stock_list_PE',
+    'quarterly': 'stock_list_quarterly',
+}
+
+TICKERS_PER_INDUSTRY = 150
+QUARTERS = 12
+
+
+def load_templates(data_dir=REAL_DATA_DIR):
+    """Latest real ratio/forecast/PE snapshots, restricted to tickers present in all three"""
+    templates = {}
+    for dataset in ('ratio', 'forecast', 'pe'):
+        files = glob.glob(os.path.join(data_dir, dataset, f"{SNAPSHOTS[dataset]}_*.json"))
+        if not files:
+            raise FileNotFoundError(f"No {dataset} snapshot in {data_dir} to use as a template")
+        with open(max(files, key=os.path.getmtime), 'r') as f:
+            templates[dataset] = json.load(f)
+    tickers = sorted(set(templates['ratio']) & set(templates['forecast']) & set(templates['pe']))
+    return templates, tickers
+
+
+def jitter(value, rng, spread):
+    """Scale every number inside a JSON value by one random factor per number"""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return round(value * rng.uniform(1 - spread, 1 + spread), 4)
+    if isinstance(value, dict):
+        return {key: jitter(item, rng, spread) for key, item in value.items()}
+    if isinstance(value, list):
+        return [jitter(item, rng, spread) for item in value]
+    return value
+
+
+def quarterly_record(forecast, rng):
+    """Plausible quarterly history ending near a quarter of the forecast's annual EPS/revenue"""
+    annual = forecast.get('annual', {})
+    eps = (annual.get('current_eps') or rng.uniform(1, 10)) / 4
+    revenue = (annual.get('current_revenue') or rng.uniform(1e9, 1e11)) / 4
+    growth = rng.uniform(-0.02, 0.05)
+    periods, eps_values, revenue_values = [], [], []
+    for index in range(QUARTERS):
+        decay = (1 + growth) ** (index - QUARTERS + 1)
+        periods.append(f"Q{index % 4 + 1} {2023 + index // 4}")
+        eps_values.append(round(eps * decay * rng.uniform(0.85, 1.15), 2))
+        revenue_values.append(round(revenue * decay * rng.uniform(0.95, 1.05), -5))
+    return {'periods': periods, 'eps': eps_values, 'revenue': revenue_values}
+
+
+def generate_universe(size, output_dir, snapshot_date='2025-01-01', seed=0, spread=0.3, data_dir=REAL_DATA_DIR):
+    """
+    Write ratio/forecast/PE/quarterly snapshots and universe.json for size tickers.
+
+    Returns:
+        dict: Industry -> tickers mapping of the synthetic universe
+    """
+    rng = random.Random(seed)
+    templates, template_tickers = load_templates(data_dir)
+    snapshots = {dataset: {} for dataset in SNAPSHOTS}
+    stock_list = {}
+
+    for index in range(size):
+        industry = f"Industry {index // TICKERS_PER_INDUSTRY:04d}"
+        ticker = f"T{index:05d}"
+        template = rng.choice(template_tickers)
+        stock_list.setdefault(industry, []).append(ticker)
+
+        ratio = jitter(templates['ratio'][template], rng, spread)
+        ratio['industry'] = industry
+        snapshots['ratio'][ticker] = ratio
+        snapshots['forecast'][ticker] = jitter(templates['forecast'][template], rng, spread)
+        snapshots['pe'][ticker] = jitter(templates['pe'][template], rng, spread)
+        snapshots['quarterly'][ticker] = quarterly_record(snapshots['forecast'][ticker], rng)
+
+    for dataset, prefix in SNAPSHOTS.items():
+        directory = os.path.join(output_dir, dataset)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{prefix}_{snapshot_date}.json"), 'w') as f:
+            json.dump(snapshots[dataset], f)
+    write_universe(os.path.join(output_dir, 'universe.json'), stock_list)
+
+    return stock_list
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, required=True, help="number of tickers")
+    parser.add_argument('--output', required=True, help="directory to write the data tree to")
+    parser.add_argument('--date', default='2025-01-01', help="snapshot date in the file names")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    stock_list = generate_universe(args.size, args.output, args.date, args.seed)
+    print(f"Wrote {args.size} tickers in {len(stock_list)} industries to {args.output}")
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the StockAnalysis and macrotrends pages the scrapers read.
+
+Serves the HTML fixtures in benchmarks/fixtures for any ticker, with
+configurable response latency, injected 429/5xx errors and a server-side rate
+limit, so scraper throughput can be measured without touching the real sites.
+
+    python3 benchmarks/mock_server.py --port 8900 --latency 0.2 --error-rate 0.05 --rate-limit 10
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+# Request path -> fixture file; the first group is the ticker
+ROUTES = [
+    (re.compile(r'^/stocks/([^/]+)/statistics/?$'), 'statistics.html'),
+    (re.compile(r'^/stocks/([^/]+)/forecast/?$'), 'forecast.html'),
+    (re.compile(r'^/stocks/([^/]+)/financials/?$'), 'financials-quarterly.html'),
+    (re.compile(r'^/stocks/charts/([^/]+)/[^/]+/pe-ratio/?$'), 'pe-ratio.html'),
+]
+
+# macrotrends ticker search list, generated from MockSiteServer.tickers
+SEARCH_LIST_PATH = '/assets/php/ticker_search_list.php'
+
+INJECTED_STATUSES = [429, 500, 502, 503]
+
+
+class MockSiteServer:
+    """
+    Threaded mock site running in the background.
+
+    Args:
+        port (int): Port to listen on, 0 picks a free one
+        latency (float): Mean seconds before each response
+        jitter (float): Standard deviation of the latency
+        error_rate (float): Fraction of requests answered with a random 429/5xx
+        rate_limit (float, optional): Requests per second allowed before answering 429
+        pad_kb (int): Extra kilobytes of script markup per page, to approach real page weight
+        seed (int): Random seed for latency and error injection
+        tickers (list, optional): Tickers listed in the macrotrends ticker search list
+    """
+
+    def __init__(self, port=0, latency=0.05, jitter=0.0, error_rate=0.0, rate_limit=None, pad_kb=0, seed=0,
+                 tickers=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.rng = random.Random(seed)
+        self.tickers = list(tickers or [])
+        self.status_counts = {}
+        self._lock = threading.Lock()
+        self._allowance = rate_limit or 0
+        self._last_check = time.monotonic()
+
+        padding = f"<script>var payload = \"{'x' * (pad_kb * 1024)}\";</script>\n" if pad_kb else ''
+        self.fixtures = {name: (FIXTURES_DIR / name).read_text().replace('</body>', padding + '</body>')
+                         for _, name in ROUTES}
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _within_rate_limit(self):
+        """Token bucket of rate_limit requests per second (burst of one second)"""
+        if not self.rate_limit:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate_limit, self._allowance + (now - self._last_check) * self.rate_limit)
+            self._last_check = now
+            if self._allowance < 1:
+                return False
+            self._allowance -= 1
+            return True
+
+    def respond(self, path):
+        """Pick (status, body) for a request path"""
+        with self._lock:
+            delay = max(0.0, self.rng.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+            injected = self.rng.random() < self.error_rate
+            injected_status = self.rng.choice(INJECTED_STATUSES)
+        time.sleep(delay)
+
+        if not self._within_rate_limit():
+            return 429, "Too Many Requests"
+        if injected:
+            return injected_status, "Injected error"
+
+        route_path = path.split('?', 1)[0]
+        if route_path == SEARCH_LIST_PATH:
+            return 200, json.dumps([{'n': f"{ticker} Inc - {ticker}", 's': f"{ticker}/{ticker.lower()}-inc"}
+                                    for ticker in self.tickers])
+        for pattern, name in ROUTES:
+            match = pattern.match(route_path)
+            if match:
+                return 200, self.fixtures[name].replace('{TICKER}', match.group(1).upper())
+        return 404, "Not Found"
+
+    def _handler_class(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = site.respond(self.path)
+                with site._lock:
+                    site.status_counts[status] = site.status_counts.get(status, 0) + 1
+                payload = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                if status == 429:
+                    self.send_header('Retry-After', '1')
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.05, help="mean response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="latency standard deviation in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered 429/5xx")
+    parser.add_argument('--rate-limit', type=float, help="requests per second before answering 429")
+    parser.add_argument('--pad-kb', type=int, default=0, help="extra kilobytes per page")
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def server_from_args(args, port=0):
+    return MockSiteServer(port=port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          rate_limit=args.rate_limit, pad_kb=args.pad_kb, seed=args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the scraper fixtures locally")
+    parser.add_argument('--port', type=int, default=8900)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, port=args.port)
+    print(f"Mock StockAnalysis/macrotrends site on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
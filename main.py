@@ -1,15 +1,509 @@
-# example_usage.py
+#!/usr/bin/env python3
+"""
+PE valuation command line.
 
-from modules.pe_scraper import get_pe_ratio
+    python3 main.py scrape [--datasets ratio forecast pe quarterly] [--watchlist NAME] [--deadline 09:30] [--profile]
+    python3 main.py analyze [--year 2025] [--horizon 2] [--industry 銀行] [--profile]
+    python3 main.py report [--output valuation/stock_data.xlsx] [--live-prices] [--profile]
+    python3 main.py watch [--debounce 2] [--polling]
+    python3 main.py ticker AAPL
+    python3 main.py refresh AAPL
+    python3 main.py serve [--port 8765] [--price-interval 15]
+    python3 main.py universe [--resolve-slugs]
+    python3 main.py queue enqueue|work|status|serve
 
-def main():
-    stock_symbol = "AAPL"  # Example: Apple Inc.
-    pe_ratio = get_pe_ratio(stock_symbol)
-    
-    if pe_ratio is not None:
-        print(f"The 5-year average PE ratio for {stock_symbol} is {pe_ratio}.")
+Every command takes --universe NAME/PATH ... to use other universe files than
+universes/default.json (see modules/universe.py).
+
+Heavy libraries (pandas, yfinance, bs4, xlsxwriter) are only imported by the
+subcommands that need them, so `ticker` answers from cached snapshots quickly.
+"""
+
+import argparse
+import os
+import sys
+
+MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules')
+if MODULES_DIR not in sys.path:
+    sys.path.insert(0, MODULES_DIR)
+
+SCRAPERS = {
+    'ratio': ('ratio_scraper', 'Ratio_Scraper_Fixed'),
+    'forecast': ('forecast_scraper', 'Forecast_Scraper_Working'),
+    'pe': ('pe_scraper', 'PERatioScraper'),
+    'quarterly': ('quarterly_scraper', 'Quarterly_Scraper'),
+}
+
+SUMMARY_COLUMNS = ["Company", "股價", "預估PE", "五年PE中位價"]
+
+
+def run_scraper(dataset, stock_list, options=None, task_budget=90):
+    """
+    Scrape one dataset for the whole stock list on this thread and write today's snapshot.
+
+    Args:
+        options (dict, optional): Dataset -> extra get_company_metrics arguments, e.g. the forecast's current_year
+        task_budget (float): Seconds per ticker attempt
+    """
+    import importlib
+
+    module_name, class_name = SCRAPERS[dataset]
+    scraper_class = getattr(importlib.import_module(module_name), class_name)
+    # The quarterly scraper's thread pool would take its tickers off the profiled thread
+    scraper = scraper_class(max_workers=1) if dataset == 'quarterly' else scraper_class()
+    data = scraper.get_company_metrics(stock_list=stock_list, task_budget=task_budget,
+                                       **(options or {}).get(dataset, {}))
+    return scraper.write_snapshot(data)
+
+
+def _schedule(args, stock_list):
+    """Prioritised tasks of a scrape of the stock list, see modules/scrape_scheduler.py"""
+    from scrape_scheduler import build_schedule, load_watchlist, next_deadline
+
+    watchlist = load_watchlist(args.watchlist)
+    outside = sorted(set(watchlist).difference(*stock_list.values()))
+    if outside:
+        print(f"Watchlist tickers outside the universe are not scraped: {', '.join(outside)}")
+    deadline = next_deadline(args.deadline) if args.deadline else None
+    return build_schedule(args.datasets, stock_list, watchlist=watchlist, deadline=deadline)
+
+
+def cmd_scrape(args):
+    import importlib
+    import time
+    from instrumentation import RECORDER
+
+    stock_list = _stock_list(args)
+    if args.profile:
+        from profiling import RunProfiler
+
+        # One dataset at a time on this thread, each profile is saved next to its snapshot;
+        # the scheduling options (--workers-per-host, --watchlist, --deadline, --parse-workers) do not apply
+        for dataset in args.datasets:
+            with RunProfiler() as profiler:
+                path = run_scraper(dataset, stock_list, options={'forecast': {'current_year': args.year}},
+                                   task_budget=args.task_budget)
+            profiler.write(path)
     else:
-        print(f"Failed to retrieve the PE ratio for {stock_symbol}.")
+        from parse_pool import ParsePool
+        from scrape_scheduler import ScheduledScrape
+
+        # Every host works through its tasks by deadline and priority, datasets of a host share its budget
+        tasks = _schedule(args, stock_list)
+        workers = (os.cpu_count() or 1) if args.parse_workers is None else args.parse_workers
+        # A single core gains nothing from parsing out of process
+        parse_pool = ParsePool(workers) if workers > 1 else None
+        scrapers = {dataset: getattr(importlib.import_module(SCRAPERS[dataset][0]), SCRAPERS[dataset][1])(
+                        parse_pool=parse_pool)
+                    for dataset in args.datasets}
+        scheduled = ScheduledScrape(scrapers, workers_per_host=args.workers_per_host,
+                                    options={'forecast': {'current_year': args.year}}, task_budget=args.task_budget)
+        due = [task for task in tasks if task.deadline is not None]
+        if due:
+            print(f"{len(due)} tasks due by {time.strftime('%Y-%m-%d %H:%M %Z', time.localtime(due[0].deadline))}")
+            scheduled.check_feasibility(tasks)
+        try:
+            _, missed = scheduled.run(tasks)
+        finally:
+            if parse_pool:
+                parse_pool.close()
+        scheduled.failures.print_summary()
+        if missed:
+            print(f"Missed deadline: {', '.join(f'{task.dataset}/{task.ticker}' for task in missed)}")
+        elif due:
+            print(f"All {len(due)} deadline tasks finished in time")
+    RECORDER.write('scrape')
+
+
+def _universe(args):
+    from universe import load_universe
+
+    return load_universe(args.universe)
+
+
+def _analyzer(args):
+    from valuation_analyzer import Valuation_Analyzer_Pure
+
+    # Industry statistics always cover the whole universe, --industry only filters the output
+    return Valuation_Analyzer_Pure(args.year, stock_list=_universe(args), horizon=args.horizon)
+
+
+def _stock_list(args):
+    universe = _universe(args)
+    if getattr(args, 'industry', None):
+        unknown = [industry for industry in args.industry if industry not in universe]
+        if unknown:
+            sys.exit(f"Unknown industry: {', '.join(unknown)}")
+        return {industry: universe[industry] for industry in args.industry}
+    return universe
+
+
+def _profiled(args, output_path, run):
+    """Call run(), profiled with the report written next to output_path when --profile is set"""
+    if not args.profile:
+        return run()
+
+    from profiling import RunProfiler
+
+    with RunProfiler() as profiler:
+        result = run()
+    profiler.write(output_path)
+    return result
+
+
+def cmd_analyze(args):
+    from datetime import date
+    from paths import VALUATION_DIR
+    from report_format import format_value
+
+    stock_list = _stock_list(args)
+
+    def run():
+        return _analyzer(args).build_valuation_table(stock_list)
+
+    table = _profiled(args, os.path.join(VALUATION_DIR, f'analyze_{date.today()}'), run)
+    if table.empty:
+        print("No companies could be valued.")
+        return
+
+    suffix = str(args.year)[-2:]
+    columns = SUMMARY_COLUMNS + [f"{suffix}年估值", f"{suffix}年相差百分比"]
+    for industry, rows in table.groupby('Industry', sort=False):
+        print(f"\n{industry}")
+        display = rows[columns].copy()
+        for column in columns:
+            display[column] = [format_value(column, value) for value in rows[column]]
+        print(display.to_string(index=False))
+
+
+def cmd_report(args):
+    from datetime import date
+    from paths import VALUATION_DIR
+
+    output = args.output or os.path.join(VALUATION_DIR, f'stock_data_{date.today()}.xlsx')
+
+    stock_list = _stock_list(args)
+
+    def run():
+        analyzer = _analyzer(args)
+        records = analyzer.aggregate_company_records(stock_list)
+        if args.live_prices:
+            from price_stream import fetch_quotes
+            from universe import unique_tickers
+            from valuation_analyzer import apply_prices
+
+            print(f"Repriced {apply_prices(records, fetch_quotes(unique_tickers(stock_list)))} records at live quotes")
+        analyzer.save_to_excel_fast(records, output)
+
+    _profiled(args, output, run)
+
+
+def cmd_watch(args):
+    from datetime import date
+    from paths import VALUATION_DIR
+    from snapshot_watch import WATCHED_DATASETS, WatchedValuation, open_watcher
+    from valuation_analyzer import SNAPSHOT_PATTERNS
+
+    output = args.output or os.path.join(VALUATION_DIR, f'stock_data_{date.today()}.xlsx')
+    # Watch before the first load so no snapshot landing in between is missed
+    watcher = open_watcher(sorted({os.path.dirname(SNAPSHOT_PATTERNS[dataset]) for dataset in WATCHED_DATASETS}),
+                           polling=args.polling)
+    watched = WatchedValuation(_analyzer(args), _stock_list(args), output)
+    print(f"Watching snapshots, report at {output} (Ctrl-C to stop)")
+    try:
+        watched.run(watcher, debounce=args.debounce)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def _industries_of(ticker, stock_list):
+    return [industry for industry, tickers in stock_list.items() if ticker in tickers] or [None]
+
+
+def _print_company(ticker, industry, company_data):
+    from report_format import format_record
+
+    if company_data is None:
+        sys.exit(1)
+    print(f"\n{ticker}" + (f" ({industry})" if industry else ""))
+    for key, value in format_record(company_data).items():
+        print(f"  {key}: {value}")
+
+
+def cmd_ticker(args):
+    ticker = args.symbol.upper()
+    analyzer = _analyzer(args)
+    for industry in _industries_of(ticker, analyzer.stock_list):
+        _print_company(ticker, industry, analyzer.process_company(ticker, industry))
+
+
+def cmd_refresh(args):
+    from instrumentation import RECORDER
+    from ticker_refresh import TickerRefresher
+
+    ticker = args.symbol.upper()
+    stock_list = _universe(args)
+    refresher = TickerRefresher(args.year, horizon=args.horizon, stock_list=stock_list)
+    results, refreshed, elapsed = refresher.refresh(ticker, _industries_of(ticker, stock_list))
+    print(f"Refreshed {', '.join(refreshed) or 'nothing'} for {ticker} in {elapsed:.1f}s")
+    RECORDER.write(f'refresh_{ticker}')
+    for industry, company_data in results.items():
+        _print_company(ticker, industry, company_data)
+
+
+def cmd_serve(args):
+    import asyncio
+    from valuation_service import ValuationService
+
+    service = ValuationService(_universe(args), current_year=args.year, horizon=args.horizon,
+                               poll_interval=args.poll_interval, price_interval=args.price_interval,
+                               publish=args.publish)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+def cmd_publish(args):
+    from shared_table import SharedTablePublisher
+    from valuation_analyzer import latest_snapshot_signature
+
+    publisher = SharedTablePublisher(args.name)
+    if args.remove:
+        publisher.close(unlink=True)
+        print(f"Removed {args.name}")
+        return
+    signature = latest_snapshot_signature()
+    table = _analyzer(args).build_valuation_table(_stock_list(args))
+    generation = publisher.publish_frame(table, metadata={
+        'year': args.year,
+        'horizon': args.horizon,
+        'snapshots': {kind: entry[0] if entry else None for kind, entry in signature.items()},
+    })
+    # The segments outlive this process until the next publish replaces them
+    publisher.close()
+    print(f"Published {len(table)} rows as {args.name} generation {generation}")
+
+
+def cmd_universe(args):
+    from universe import available_universes, unique_tickers
+
+    stock_list = _universe(args)
+    tickers = unique_tickers(stock_list)
+    for industry, companies in stock_list.items():
+        print(f"{industry}: {len(companies)}")
+    print(f"{len(tickers)} tickers in {len(stock_list)} industries "
+          f"(available universes: {', '.join(available_universes())})")
+
+    if args.resolve_slugs:
+        from macrotrends_slugs import SlugResolver
+
+        slugs = SlugResolver().resolve(tickers)
+        missing = sorted(set(tickers) - set(slugs))
+        print(f"macrotrends slugs: {len(slugs)} resolved" + (f", missing {', '.join(missing)}" if missing else ""))
+
+
+def _queue_worker(location, run_id, lease_seconds, delay_range, task_budget):
+    """Body of one `queue work` process"""
+    from instrumentation import RECORDER
+    from work_queue import QueueWorker, open_queue
+
+    worker = QueueWorker(open_queue(location), lease_seconds=lease_seconds, delay_range=delay_range,
+                         task_budget=task_budget)
+    counts = worker.run(run_id)
+    print(f"[{worker.worker}] finished: {counts['done']} done, {counts['failed']} failed, {counts['lost']} lost")
+    RECORDER.write(f"queue_{os.getpid()}")
+
+
+def cmd_queue_enqueue(args):
+    from work_queue import WorkQueue, QUEUE_PATH
+
+    stock_list = _stock_list(args)
+    queue = WorkQueue(args.queue or QUEUE_PATH)
+    run_id = queue.enqueue(args.datasets, stock_list, options={'forecast': {'current_year': args.year}},
+                           schedule=_schedule(args, stock_list))
+    print(f"Enqueued run {run_id}: {sum(queue.progress(run_id)[args.datasets[0]].values())} tickers "
+          f"x {', '.join(args.datasets)} in {queue.path}")
+
+
+def cmd_queue_work(args):
+    import multiprocessing
+    from work_queue import RemoteWorkQueue, assemble_finished, open_queue
+
+    queue = open_queue(args.queue)
+    run_id = args.run or queue.latest_run()
+    if run_id is None:
+        sys.exit("Nothing enqueued, run `main.py queue enqueue` first")
+
+    processes = [multiprocessing.Process(target=_queue_worker, name=f"queue-worker-{index}",
+                                         args=(args.queue, run_id, args.lease, tuple(args.delay), args.task_budget))
+                 for index in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    # Remote workers leave assembly to the `queue serve` process, next to the data
+    if not isinstance(queue, RemoteWorkQueue):
+        for dataset, path in assemble_finished(queue, run_id).items():
+            print(f"Assembled {dataset} snapshot {path}")
+    _print_queue_progress(run_id, queue.progress(run_id))
+
+
+def _print_queue_progress(run_id, progress):
+    print(f"Run {run_id}")
+    for dataset, statuses in sorted(progress.items()):
+        counts = ', '.join(f"{statuses[status]} {status}" for status in ('done', 'leased', 'pending', 'failed')
+                           if statuses.get(status))
+        print(f"  {dataset}: {counts}")
+
+
+def cmd_queue_status(args):
+    from work_queue import open_queue
+
+    queue = open_queue(args.queue)
+    run_id = args.run or queue.latest_run()
+    if run_id is None:
+        sys.exit("Nothing enqueued")
+    _print_queue_progress(run_id, queue.progress(run_id))
+    if hasattr(queue, 'assemblies'):
+        for dataset, path in sorted(queue.assemblies(run_id).items()):
+            print(f"  {dataset} snapshot: {path or 'being written'}")
+
+
+def cmd_queue_serve(args):
+    from work_queue import QueueServer, WorkQueue, QUEUE_PATH
+
+    QueueServer(WorkQueue(args.queue or QUEUE_PATH), args.host, args.port).serve_forever()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Stock valuation from scraped PE, ratio and forecast snapshots")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    universe = argparse.ArgumentParser(add_help=False)
+    universe.add_argument('--universe', nargs='+',
+                          help="universe names in universes/ or file paths, merged "
+                               "(default PE_VALUATION_UNIVERSE or 'default')")
+
+    scheduling = argparse.ArgumentParser(add_help=False)
+    scheduling.add_argument('--watchlist', nargs='+',
+                            help="held names scraped first and by the deadline (default universes/watchlist.* if present)")
+    scheduling.add_argument('--deadline', default='09:30', metavar='HH:MM',
+                            help="US/Eastern time the watchlist and imminent reporters should be fresh by "
+                                 "(default the 09:30 open, '' for none)")
+
+    scrape = subparsers.add_parser('scrape', parents=[universe, scheduling], help="scrape snapshots for the stock list")
+    scrape.add_argument('--datasets', nargs='+', choices=sorted(SCRAPERS), default=['ratio', 'pe', 'forecast'])
+    scrape.add_argument('--profile', action='store_true',
+                        help="scrape datasets one after another on one thread and save a cProfile/tracemalloc report "
+                             "per snapshot (--year and --task-budget apply; --workers-per-host, --watchlist, "
+                             "--deadline and --parse-workers are ignored)")
+    scrape.add_argument('--workers-per-host', type=int, default=2, help="concurrent tasks per scraped site")
+    scrape.add_argument('--year', type=int, default=2025, help="current fiscal year of the forecast scrape")
+    scrape.add_argument('--parse-workers', type=int,
+                        help="processes parsing fetched pages, defaults to the CPU count (0 or 1 parses in the fetch threads)")
+    scrape.add_argument('--task-budget', type=float, default=90,
+                        help="wall-clock seconds per ticker attempt before it is abandoned and retried later")
+    scrape.set_defaults(func=cmd_scrape)
+
+    valuation = argparse.ArgumentParser(add_help=False, parents=[universe])
+    valuation.add_argument('--year', type=int, default=2025, help="first fiscal year to value")
+    valuation.add_argument('--horizon', type=int, default=2, help="number of fiscal years to value")
+
+    analyze = subparsers.add_parser('analyze', parents=[valuation], help="print the valuation summary")
+    analyze.add_argument('--industry', nargs='+', help="only these industries")
+    analyze.add_argument('--profile', action='store_true', help="save a cProfile/tracemalloc report in valuation/")
+    analyze.set_defaults(func=cmd_analyze)
+
+    report = subparsers.add_parser('report', parents=[valuation], help="write the Excel report")
+    report.add_argument('--industry', nargs='+', help="only these industries")
+    report.add_argument('--output', help="Excel path (default valuation/stock_data_<today>.xlsx)")
+    report.add_argument('--profile', action='store_true', help="save a cProfile/tracemalloc report next to the Excel file")
+    report.add_argument('--live-prices', action='store_true',
+                        help="value at current quotes instead of the ratio snapshot prices")
+    report.set_defaults(func=cmd_report)
+
+    watch = subparsers.add_parser('watch', parents=[valuation],
+                                  help="re-value changed tickers and rewrite the report whenever snapshots land")
+    watch.add_argument('--industry', nargs='+', help="only these industries")
+    watch.add_argument('--output', help="Excel path (default valuation/stock_data_<today>.xlsx)")
+    watch.add_argument('--debounce', type=float, default=2.0, help="seconds of quiet after a write before reloading")
+    watch.add_argument('--polling', action='store_true', help="poll the snapshot directories instead of using inotify")
+    watch.set_defaults(func=cmd_watch)
+
+    ticker = subparsers.add_parser('ticker', parents=[valuation], help="value one ticker from cached snapshots")
+    ticker.add_argument('symbol')
+    ticker.set_defaults(func=cmd_ticker)
+
+    refresh = subparsers.add_parser('refresh', parents=[valuation],
+                                    help="fetch one ticker now, value it and overlay it on the snapshots")
+    refresh.add_argument('symbol')
+    refresh.set_defaults(func=cmd_refresh)
+
+    serve = subparsers.add_parser('serve', parents=[valuation], help="run the local valuation query service")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--poll-interval', type=float, default=5.0)
+    serve.add_argument('--price-interval', type=float,
+                       help="poll live quotes every this many seconds and re-value changed prices")
+    serve.add_argument('--publish', nargs='?', const='pe_valuation', metavar='NAME',
+                       help="also publish every state to shared memory (default name pe_valuation)")
+    serve.set_defaults(func=cmd_serve)
+
+    publish = subparsers.add_parser('publish', parents=[valuation],
+                                    help="publish the valuation table to shared memory for local readers")
+    publish.add_argument('--industry', nargs='+', help="only these industries")
+    publish.add_argument('--name', default='pe_valuation', help="shared memory name")
+    publish.add_argument('--remove', action='store_true', help="remove the published table instead")
+    publish.set_defaults(func=cmd_publish)
+
+    universe_command = subparsers.add_parser('universe', parents=[universe],
+                                             help="list the universe and optionally resolve macrotrends slugs")
+    universe_command.add_argument('--resolve-slugs', action='store_true',
+                                  help="resolve and cache missing macrotrends URL slugs")
+    universe_command.set_defaults(func=cmd_universe)
+
+    queue = subparsers.add_parser('queue', help="scrape through a leased work queue shared by worker processes/hosts")
+    queue_commands = queue.add_subparsers(dest='queue_command', required=True)
+    queue_location = argparse.ArgumentParser(add_help=False)
+    queue_location.add_argument('--queue', help="SQLite queue file (default data/queue.sqlite3) or http://host:port "
+                                                "of `queue serve`")
+
+    enqueue = queue_commands.add_parser('enqueue', parents=[universe, queue_location, scheduling],
+                                        help="add a run with one task per dataset and ticker")
+    enqueue.add_argument('--datasets', nargs='+', choices=sorted(SCRAPERS), default=['ratio', 'pe', 'forecast'])
+    enqueue.add_argument('--industry', nargs='+', help="only these industries")
+    enqueue.add_argument('--year', type=int, default=2025, help="current fiscal year of the forecast scrape")
+    enqueue.set_defaults(func=cmd_queue_enqueue)
+
+    work = queue_commands.add_parser('work', parents=[queue_location],
+                                     help="run worker processes until the run is finished, then assemble snapshots")
+    work.add_argument('--run', help="run id (default: latest)")
+    work.add_argument('--processes', type=int, default=2)
+    work.add_argument('--lease', type=float, default=120, help="lease seconds, renewed by heartbeats")
+    work.add_argument('--delay', type=float, nargs=2, default=[0, 0], metavar=('MIN', 'MAX'),
+                      help="extra seconds slept after each task on top of the per-host budget")
+    work.add_argument('--task-budget', type=float, default=90,
+                      help="wall-clock seconds per task attempt before it is failed back to the queue")
+    work.set_defaults(func=cmd_queue_work)
+
+    status = queue_commands.add_parser('status', parents=[queue_location], help="task counts of a run")
+    status.add_argument('--run', help="run id (default: latest)")
+    status.set_defaults(func=cmd_queue_status)
+
+    serve_queue = queue_commands.add_parser('serve', help="serve the queue to workers on other hosts")
+    serve_queue.add_argument('--queue', help="SQLite queue file (default data/queue.sqlite3)")
+    serve_queue.add_argument('--host', default='127.0.0.1')
+    serve_queue.add_argument('--port', type=int, default=8766)
+    serve_queue.set_defaults(func=cmd_queue_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
 
 if __name__ == "__main__":
     main()
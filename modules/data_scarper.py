@@ -4,6 +4,7 @@ import yfinance as yf
 
 # custom imports
 from utils import fetch_url, parse_html, extract_percentage
+from paths import data_path
 import ast
 
 class StockAnalysisScraper:
@@ -20,11 +21,11 @@ class StockAnalysisScraper:
         import os
 
         # Find latest ratio file
-        ratio_files = glob.glob("../data/ratio/stock_list_metrics_*.json")
+        ratio_files = glob.glob(data_path('ratio', 'stock_list_metrics_*.json'))
         latest_ratio = max(ratio_files, key=os.path.getmtime) if ratio_files else None
 
         # Find latest forecast file
-        forecast_files = glob.glob("../data/forecast/stock_list_forecasts_*.json")
+        forecast_files = glob.glob(data_path('forecast', 'stock_list_forecasts_*.json'))
         latest_forecast = max(forecast_files, key=os.path.getmtime) if forecast_files else None
 
         if latest_ratio:
@@ -0,0 +1,108 @@
+import math
+import re
+
+import pandas as pd
+import xlsxwriter
+
+from report_format import EXCEL_NUM_FORMATS, metric_format_key
+
+# Excel sheet names are limited to 31 characters and may not contain []:*?/\
+INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+CELL_FORMATS = {
+    'header': {'bold': True},
+    'label': {'bold': True},
+    'text': {},
+    **{key: {'num_format': num_format} for key, num_format in EXCEL_NUM_FORMATS.items()},
+}
+
+
+def to_cell_value(value):
+    """Map a typed value to a cell value, NaN becomes a blank cell"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def sheet_name_for(industry):
+    """Sanitise an industry name into a valid worksheet name"""
+    return INVALID_SHEET_CHARS.sub('_', industry)[:31] or 'Sheet'
+
+
+def unique_sheet_names(industries):
+    """
+    Valid worksheet names for industries, numbered where sanitising makes two equal.
+
+    Excel compares sheet names case-insensitively, and long sector names from
+    universe files can share their first 31 characters.
+
+    Returns:
+        dict: Industry -> worksheet name
+    """
+    names, taken = {}, set()
+    for industry in industries:
+        name = base = sheet_name_for(industry)
+        counter = 1
+        while name.lower() in taken:
+            counter += 1
+            suffix = f" ({counter})"
+            name = base[:31 - len(suffix)] + suffix
+        taken.add(name.lower())
+        names[industry] = name
+    return names
+
+
+def write_industry_workbook(industry_records, path):
+    """
+    Write one worksheet per industry straight from the company records.
+
+    The workbook is written with xlsxwriter in constant_memory mode: each metric
+    is one row with companies as columns (the same layout as the transposed
+    DataFrames), written with a single write_row call and a precomputed format.
+    Values are written as typed numbers; the display format comes from report_format.
+
+    Args:
+        industry_records (dict): Industry -> list of company_data dicts (with 'Company')
+        path (str): Excel file path to save
+    """
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    formats = {key: workbook.add_format(spec) for key, spec in CELL_FORMATS.items()}
+    metric_formats = {}
+    sheet_names = unique_sheet_names(industry_records)
+
+    for industry, records in industry_records.items():
+        if not records:
+            continue
+
+        worksheet = workbook.add_worksheet(sheet_names[industry])
+        worksheet.set_column(0, 0, 28)
+
+        worksheet.write_row(0, 0, ['Industry', industry], formats['header'])
+        worksheet.write_row(1, 0, ['Company'] + [record.get('Company') for record in records], formats['header'])
+
+        metrics = [metric for metric in records[0] if metric not in ('Industry', 'Company')]
+        for row, metric in enumerate(metrics, start=2):
+            format_key = metric_formats.get(metric)
+            if format_key is None:
+                format_key = metric_formats[metric] = metric_format_key(metric)
+            worksheet.write_string(row, 0, metric, formats['label'])
+            worksheet.write_row(row, 1, [to_cell_value(record.get(metric)) for record in records],
+                                formats[format_key])
+
+    workbook.close()
+
+
+def write_dataframes_workbook(industry_dataframes, path):
+    """
+    Write one worksheet per industry from transposed DataFrames via DataFrame.to_excel.
+
+    Missing values are written as 'N/A' and numbers without display formats.
+
+    Args:
+        industry_dataframes (dict): Industry -> transposed DataFrame
+        path (str): Excel file path to save
+    """
+    sheet_names = unique_sheet_names(industry_dataframes)
+    with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+        for industry, df in industry_dataframes.items():
+            df.to_excel(writer, sheet_name=sheet_names[industry], index=True, na_rep="N/A")
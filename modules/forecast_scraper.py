@@ -1,10 +1,184 @@
-from utils import fetch_url, parse_html
-import json, time, random
+from utils import fetch_url, parse_html, STOCKANALYSIS_URL
+from paths import snapshot_path
+from snapshot_schema import write_typed_snapshot
+from instrumentation import RECORDER, instrument_extractor, paced_sleep
+from parse_pool import run_parser
+from task_deadline import TASK_BUDGET_SECONDS, scrape_guarded
+import json, random
 from datetime import datetime
 from names import STOCK_LIST
+from universe import unique_tickers
+
+
+def parse_value(value_str):
+    """Parse a value string from the website into a numeric value"""
+    if not value_str or value_str == 'n/a' or value_str == '-' or value_str == 'N/A' or 'Pro' in value_str:
+        return None
+
+    # Remove currency symbols, commas, and extra whitespace
+    value_str = value_str.replace('$', '').replace(',', '').strip()
+
+    try:
+        # Handle percentage
+        if '%' in value_str:
+            return float(value_str.replace('%', ''))
+
+        # Handle billions/millions/trillions
+        multipliers = {'T': 1e12, 'B': 1e9, 'M': 1e6, 'K': 1e3}
+        for suffix, multiplier in multipliers.items():
+            if value_str.endswith(suffix):
+                return float(value_str[:-1]) * multiplier
+
+        # Try direct conversion
+        return float(value_str)
+    except (ValueError, AttributeError):
+        return None
+
+
+def parse_fiscal_year(header):
+    """Parse a forecast table column header such as 'FY 2026' or '2026' into a fiscal year"""
+    digits = ''.join(filter(str.isdigit, header))
+    if len(digits) != 4:
+        return None
+    return int(digits)
+
+
+def select_current_and_next(annual_by_year, current_year):
+    """
+    Derive the legacy current/next year fields from the stored forecast horizon.
+
+    If current_year is not in the horizon, the first forecast year within two
+    years of it is used instead, with the following column as next year.
+    """
+    years = sorted(int(year) for year in annual_by_year)
+    current = current_year if current_year in years else next(
+        (year for year in years if current_year <= year <= current_year + 2), None)
+    if current is None:
+        return {}
+
+    current_values = annual_by_year.get(str(current), {})
+    next_values = annual_by_year.get(str(current + 1), {})
+    return {
+        'current_eps': current_values.get('eps'),
+        'current_growth': current_values.get('eps_growth'),
+        'next_year_eps': next_values.get('eps'),
+        'next_year_growth': next_values.get('eps_growth'),
+        'current_revenue': current_values.get('revenue'),
+        'current_revenue_growth': current_values.get('revenue_growth'),
+        'next_year_revenue': next_values.get('revenue'),
+        'next_year_revenue_growth': next_values.get('revenue_growth'),
+    }
+
+
+def parse_forecast(content, current_year=2025):
+    """
+    Forecast tables of a forecast page, see Forecast_Scraper_Working.extract_forecast_data.
+
+    Pure function of the page text, so it can run in a ParsePool worker.
+    """
+    soup = parse_html(content)
+    forecast_data = {
+        'annual': {
+            'current_eps': None,
+            'current_growth': None,
+            'next_year_eps': None,
+            'next_year_growth': None,
+            'current_revenue': None,
+            'current_revenue_growth': None,
+            'next_year_revenue': None,
+            'next_year_revenue_growth': None,
+        },
+        'annual_by_year': {},
+        'quarterly': {
+            'eps': [],
+            'revenue': [],
+            'revenue_growth': [],
+            'eps_growth': [],
+        }
+    }
+
+    # Find all tables
+    tables = soup.find_all('table')
+
+    # Process each table to find forecast tables (tables 5-8)
+    for table in tables:
+        # Get table header to identify what this table contains
+        header_row = table.find('thead')
+        if not header_row:
+            continue
+
+        headers = [th.get_text(strip=True) for th in header_row.find_all('th')]
+
+        # Skip if not a forecast table (should have years as headers)
+        if len(headers) < 2:
+            continue
+
+        # Identify table type by first header
+        table_type = headers[0] if headers else ""
+        if 'EPS Growth' in table_type:
+            metric = 'eps_growth'
+        elif 'EPS' in table_type:
+            metric = 'eps'
+        elif 'Revenue Growth' in table_type:
+            metric = 'revenue_growth'
+        elif 'Revenue' in table_type:
+            metric = 'revenue'
+        else:
+            continue
+
+        # Year columns (skip first column which is the label)
+        fiscal_years = [parse_fiscal_year(header) for header in headers[1:]]
+        if not any(fiscal_years):
+            continue
+
+        # Get table body rows
+        body = table.find('tbody')
+        if not body:
+            continue
+
+        rows = body.find_all('tr')
+
+        # Find the "Avg" row (or first data row if Avg doesn't exist)
+        avg_row = None
+        for row in rows:
+            cells = row.find_all('td')
+            if cells and cells[0].get_text(strip=True) in ['Avg', 'Average']:
+                avg_row = cells
+                break
+
+        # If no Avg row, try first data row
+        if not avg_row and rows:
+            avg_row = rows[0].find_all('td')
+
+        if not avg_row or len(avg_row) < 2:
+            continue
+
+        # Store every year column (index + 1 because first cell is label)
+        for idx, fiscal_year in enumerate(fiscal_years):
+            if fiscal_year is None or idx + 1 >= len(avg_row):
+                continue
+            cell = avg_row[idx + 1]
+            value = parse_value(cell.get('title') or cell.get_text(strip=True))
+            forecast_data['annual_by_year'].setdefault(str(fiscal_year), {})[metric] = value
+
+    forecast_data['annual'].update(select_current_and_next(forecast_data['annual_by_year'], current_year))
+    return forecast_data
+
 
 class Forecast_Scraper_Working():
-    def __init__(self):
+    def __init__(self, base_url=STOCKANALYSIS_URL, rate_limiter=None, delay_range=(0, 0), parse_pool=None):
+        """
+        Args:
+            base_url (str): Site root, replaced by a local mock server in benchmarks
+            rate_limiter (optional): Per-host pacing passed to fetch_url, defaults to RATE_BUDGET
+            delay_range (tuple): Seconds (min, max) slept between tickers in get_company_metrics on top of
+                the adaptive per-host rate of RATE_BUDGET (none by default)
+            parse_pool (ParsePool, optional): Parse pages in worker processes instead of this thread
+        """
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.delay_range = delay_range
+        self.parse_pool = parse_pool
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)'
                           ' Chrome/91.0.4472.124 Safari/537.36'
@@ -13,184 +187,60 @@ class Forecast_Scraper_Working():
 
     def parse_value(self, value_str):
         """Parse a value string from the website into a numeric value"""
-        if not value_str or value_str == 'n/a' or value_str == '-' or value_str == 'N/A' or 'Pro' in value_str:
-            return None
-
-        # Remove currency symbols, commas, and extra whitespace
-        value_str = value_str.replace('$', '').replace(',', '').strip()
-
-        try:
-            # Handle percentage
-            if '%' in value_str:
-                return float(value_str.replace('%', ''))
+        return parse_value(value_str)
 
-            # Handle billions/millions/trillions
-            multipliers = {'T': 1e12, 'B': 1e9, 'M': 1e6, 'K': 1e3}
-            for suffix, multiplier in multipliers.items():
-                if value_str.endswith(suffix):
-                    return float(value_str[:-1]) * multiplier
-
-            # Try direct conversion
-            return float(value_str)
-        except (ValueError, AttributeError):
-            return None
+    def parse_fiscal_year(self, header):
+        """Parse a forecast table column header such as 'FY 2026' or '2026' into a fiscal year"""
+        return parse_fiscal_year(header)
 
+    @instrument_extractor('forecast')
     def extract_forecast_data(self, ticker, current_year=2025):
         """
         Extract EPS and Revenue forecast data for a given ticker from the forecast page.
+
+        Every fiscal year column of the forecast tables is stored under
+        'annual_by_year', so valuations for any year can be made without re-scraping.
+        The 'annual' block keeps the current/next year values for current_year.
+
         Args:
             ticker: Stock ticker symbol
-            current_year: Current fiscal year (default 2025)
+            current_year: Fiscal year used for the 'annual' current/next fields (default 2025)
         """
-        url = f"https://stockanalysis.com/stocks/{ticker}/forecast/"
-        response = fetch_url(url, self.headers)
+        url = f"{self.base_url}/stocks/{ticker}/forecast/"
+        response = fetch_url(url, self.headers, rate_limiter=self.rate_limiter)
 
         if not response:
             print(f"Failed to fetch forecast data for {ticker}")
             return None
 
-        soup = parse_html(response.text)
-        forecast_data = {
-            'annual': {
-                'current_eps': None,
-                'current_growth': None,
-                'next_year_eps': None,
-                'next_year_growth': None,
-                'current_revenue': None,
-                'current_revenue_growth': None,
-                'next_year_revenue': None,
-                'next_year_revenue_growth': None,
-            },
-            'quarterly': {
-                'eps': [],
-                'revenue': [],
-                'revenue_growth': [],
-                'eps_growth': [],
-            }
-        }
-
-        # Find all tables
-        tables = soup.find_all('table')
-
-        # Process each table to find forecast tables (tables 5-8)
-        for table in tables:
-            # Get table header to identify what this table contains
-            header_row = table.find('thead')
-            if not header_row:
-                continue
-
-            headers = [th.get_text(strip=True) for th in header_row.find_all('th')]
+        forecast_data = run_parser(self.parse_pool, parse_forecast, response.text, current_year)
 
-            # Skip if not a forecast table (should have years as headers)
-            if len(headers) < 2:
-                continue
-
-            # Identify table type by first header
-            table_type = headers[0] if headers else ""
-
-            # Get year columns (skip first column which is the label)
-            year_headers = headers[1:]
-
-            # Try to find year indices for current and next year
-            try:
-                current_year_idx = None
-                next_year_idx = None
-                current_year_str = str(current_year)
-                next_year_str = str(current_year + 1)
-
-                for idx, year_header in enumerate(year_headers):
-                    if current_year_str in year_header:
-                        current_year_idx = idx
-                    if next_year_str in year_header:
-                        next_year_idx = idx
-
-                # If current year not found, use first available year (year_headers[0])
-                if current_year_idx is None and len(year_headers) > 0:
-                    # Check if first year is numeric and close to current year
-                    try:
-                        first_year = int(''.join(filter(str.isdigit, year_headers[0])))
-                        if first_year >= current_year and first_year <= current_year + 2:
-                            current_year_idx = 0
-                            # Also adjust next year to be index 1 if available
-                            if len(year_headers) > 1:
-                                next_year_idx = 1
-                    except:
-                        pass
-
-                # Still no current year? Skip this table
-                if current_year_idx is None:
-                    continue
-
-            except (ValueError, IndexError):
-                continue
-
-            # Get table body rows
-            body = table.find('tbody')
-            if not body:
-                continue
-
-            rows = body.find_all('tr')
-
-            # Find the "Avg" row (or first data row if Avg doesn't exist)
-            avg_row = None
-            for row in rows:
-                cells = row.find_all('td')
-                if cells and cells[0].get_text(strip=True) in ['Avg', 'Average']:
-                    avg_row = cells
-                    break
-
-            # If no Avg row, try first data row
-            if not avg_row and rows:
-                avg_row = rows[0].find_all('td')
-
-            if not avg_row or len(avg_row) < 2:
-                continue
-
-            # Extract values based on table type
-            # Get current year value (index + 1 because first cell is label)
-            current_val = None
-            next_val = None
-
-            if current_year_idx is not None and current_year_idx + 1 < len(avg_row):
-                current_cell = avg_row[current_year_idx + 1]
-                current_val = self.parse_value(current_cell.get('title') or current_cell.get_text(strip=True))
-
-            if next_year_idx is not None and next_year_idx + 1 < len(avg_row):
-                next_cell = avg_row[next_year_idx + 1]
-                next_val = self.parse_value(next_cell.get('title') or next_cell.get_text(strip=True))
-
-            # Store based on table type
-            if 'EPS Growth' in table_type:
-                forecast_data['annual']['current_growth'] = current_val
-                forecast_data['annual']['next_year_growth'] = next_val
+        print(f"Extracted forecast data for {ticker}")
+        return forecast_data
 
-            elif 'EPS' in table_type and 'Growth' not in table_type:
-                forecast_data['annual']['current_eps'] = current_val
-                forecast_data['annual']['next_year_eps'] = next_val
+    def select_current_and_next(self, annual_by_year, current_year):
+        """Derive the legacy current/next year fields from the stored forecast horizon"""
+        return select_current_and_next(annual_by_year, current_year)
 
-            elif 'Revenue Growth' in table_type:
-                forecast_data['annual']['current_revenue_growth'] = current_val
-                forecast_data['annual']['next_year_revenue_growth'] = next_val
+    def scrape_ticker(self, ticker, industry=None, current_year=2025):
+        """Forecast of one ticker as stored in the forecast snapshot, or None"""
+        return self.extract_forecast_data(ticker, current_year)
 
-            elif 'Revenue' in table_type and 'Growth' not in table_type:
-                forecast_data['annual']['current_revenue'] = current_val
-                forecast_data['annual']['next_year_revenue'] = next_val
+    def get_company_metrics(self, current_year=2025, stock_list=STOCK_LIST, task_budget=TASK_BUDGET_SECONDS):
+        """Get forecast metrics for all companies in the stock list, each ticker under a task_budget deadline"""
+        return scrape_guarded(unique_tickers(stock_list),
+                              lambda ticker: self.scrape_ticker(ticker, current_year=current_year), 'forecast',
+                              budget=task_budget,
+                              # Wait to avoid rate limiting
+                              pause=lambda: paced_sleep(random.uniform(*self.delay_range)))
 
-        print(f"Extracted forecast data for {ticker}")
-        return forecast_data
+    def write_snapshot(self, data):
+        """Write the collected data as today's forecast snapshot and return its path"""
+        path = snapshot_path('forecast', 'stock_list_forecasts', self.current_date)
+        write_typed_snapshot('forecast', path, data)
+        print(f"Saved {len(data)} tickers to {path}")
+        return path
 
-    def get_company_metrics(self, current_year=2025):
-        """Get forecast metrics for all companies in STOCK_LIST"""
-        all_companies_forecasts = {}
-        for industry, companies in STOCK_LIST.items():
-            for company in companies:
-                print(f"Fetching forecast data for {company}...")
-                forecast = self.extract_forecast_data(company, current_year)
-                if forecast:
-                    all_companies_forecasts[company] = forecast
-                # Wait to avoid rate limiting
-                time.sleep(random.uniform(10, 30))
-        return all_companies_forecasts
 
 if __name__ == "__main__":
     scraper = Forecast_Scraper_Working()
@@ -208,5 +258,5 @@ if __name__ == "__main__":
 
     # Uncomment below to run for all stocks
     all_forecasts = scraper.get_company_metrics()
-    with open(f'../data/forecast/stock_list_forecasts_{scraper.current_date}.json', 'w') as f:
-        json.dump(all_forecasts, f, indent=2)
+    scraper.write_snapshot(all_forecasts)
+    RECORDER.write('forecast')
@@ -0,0 +1,180 @@
+import json
+import os
+import hashlib
+
+from paths import data_path
+from records import RecordTable
+from snapshot_schema import typed_frame
+
+INDUSTRY_STATS_DIR = data_path('industry')
+
+
+def snapshot_signature(snapshot_path, stock_list):
+    """
+    Build the cache key for a ratio snapshot.
+
+    The key changes whenever the snapshot file is rewritten (size or mtime)
+    or the industry grouping in the stock list changes.
+
+    Args:
+        snapshot_path (str): Path of the ratio snapshot JSON file.
+        stock_list (dict): Industry -> tickers mapping used for grouping.
+
+    Returns:
+        dict: Signature stored alongside the cached statistics.
+    """
+    stat = os.stat(snapshot_path)
+    grouping = json.dumps({industry: sorted(tickers) for industry, tickers in stock_list.items()},
+                          sort_keys=True, ensure_ascii=False)
+    return {
+        'snapshot': os.path.basename(snapshot_path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'universe': hashlib.sha1(grouping.encode('utf-8')).hexdigest(),
+    }
+
+
+def compute_industry_stats(ratio_data, stock_list):
+    """
+    Compute per-industry quartiles and per-ticker percentile ranks in one groupby pass.
+
+    A ticker listed under several industries is ranked within each of them.
+
+    Args:
+        ratio_data (dict or RecordTable): Ticker -> ratio metrics, as stored in a ratio snapshot.
+        stock_list (dict): Industry -> tickers mapping.
+
+    Returns:
+        dict: {'stats': {industry: {metric: {q1, median, q3, count}}},
+               'ranks': {industry: {ticker: {metric: percentile}}}}
+    """
+    # Only needed when the cache is cold
+    import numpy as np
+    import pandas as pd
+
+    rows = [(industry, ticker) for industry, tickers in stock_list.items()
+            for ticker in tickers if ticker in ratio_data]
+    if not rows:
+        return {'stats': {}, 'ranks': {}}
+
+    # Float columns of the ratio schema, one row per (industry, ticker)
+    records = ratio_data if hasattr(ratio_data, 'frame') else {ticker: ratio_data[ticker] for _, ticker in rows}
+    numeric = typed_frame(records).select_dtypes('float64')
+    frame = numeric.loc[[ticker for _, ticker in rows]]
+    frame.index = pd.MultiIndex.from_tuples(rows, names=['industry', 'ticker'])
+    frame = frame.dropna(axis=1, how='all')
+
+    grouped = frame.groupby(level='industry', sort=False)
+    quantiles = grouped.quantile([0.25, 0.5, 0.75])
+    counts = grouped.count()
+    ranks = grouped.rank(pct=True)
+
+    stats = {}
+    for industry in counts.index:
+        q = quantiles.loc[industry]
+        industry_stats = {}
+        for metric in frame.columns:
+            count = int(counts.at[industry, metric])
+            if count == 0:
+                continue
+            industry_stats[metric] = {
+                'q1': float(q.at[0.25, metric]),
+                'median': float(q.at[0.5, metric]),
+                'q3': float(q.at[0.75, metric]),
+                'count': count,
+            }
+        stats[industry] = industry_stats
+
+    rank_table = {}
+    for (industry, ticker), values in zip(ranks.index, ranks.to_numpy()):
+        rank_table.setdefault(industry, {})[ticker] = {
+            metric: round(float(value), 4)
+            for metric, value in zip(ranks.columns, values) if not np.isnan(value)
+        }
+
+    return {'stats': stats, 'ranks': rank_table}
+
+
+class IndustryStats:
+    """Cached industry-relative statistics for one ratio snapshot"""
+
+    def __init__(self, stats, ranks):
+        self.stats = stats
+        # One rank per ticker and ratio, kept as a table per industry
+        self.ranks = {industry: RecordTable.from_records(tickers) for industry, tickers in ranks.items()}
+
+    @classmethod
+    def for_snapshot(cls, snapshot_path, ratio_data, stock_list, cache_dir=INDUSTRY_STATS_DIR):
+        """
+        Load the statistics for a snapshot from cache, recomputing them if the
+        snapshot or the industry grouping changed since they were cached.
+
+        Args:
+            snapshot_path (str): Path of the ratio snapshot the data was loaded from.
+            ratio_data (dict or RecordTable): Contents of that snapshot.
+            stock_list (dict): Industry -> tickers mapping.
+            cache_dir (str): Directory holding cached statistics.
+
+        Returns:
+            IndustryStats: Statistics ready for lookups.
+        """
+        signature = snapshot_signature(snapshot_path, stock_list)
+        snapshot_name = os.path.splitext(signature['snapshot'])[0]
+        cache_path = os.path.join(cache_dir, f"{snapshot_name}_industry.json")
+
+        if os.path.exists(cache_path):
+            with open(cache_path, 'r') as f:
+                cached = json.load(f)
+            if cached.get('source') == signature:
+                return cls(cached['stats'], cached['ranks'])
+
+        print(f"Computing industry statistics for {signature['snapshot']}")
+        computed = compute_industry_stats(ratio_data, stock_list)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, 'w') as f:
+            json.dump({'source': signature, **computed}, f, ensure_ascii=False)
+
+        return cls(computed['stats'], computed['ranks'])
+
+    def median(self, industry, metric):
+        """Industry median of a metric, or None if unavailable"""
+        return self.stats.get(industry, {}).get(metric, {}).get('median')
+
+    def quartiles(self, industry, metric):
+        """(q1, median, q3) of a metric within an industry, or None if unavailable"""
+        entry = self.stats.get(industry, {}).get(metric)
+        if not entry:
+            return None
+        return entry['q1'], entry['median'], entry['q3']
+
+    def percentile_rank(self, industry, ticker, metric):
+        """Percentile rank (0-1] of a ticker's metric within its industry, or None"""
+        return self.ranks.get(industry, {}).get(ticker, {}).get(metric)
+
+    def peer_comparison(self, industry, ticker, metrics=None):
+        """
+        Compare a ticker with its industry peers.
+
+        Args:
+            industry (str): Industry the ticker is grouped under.
+            ticker (str): The stock ticker symbol.
+            metrics (list, optional): Metrics to include; defaults to every ranked metric.
+
+        Returns:
+            dict: metric -> {'rank', 'q1', 'median', 'q3'}
+        """
+        ticker_ranks = self.ranks.get(industry, {}).get(ticker, {})
+        industry_stats = self.stats.get(industry, {})
+        comparison = {}
+        for metric in metrics or [metric for metric, rank in ticker_ranks.items() if rank is not None]:
+            entry = industry_stats.get(metric)
+            if entry is None:
+                continue
+            comparison[metric] = {
+                'rank': ticker_ranks.get(metric),
+                'q1': entry['q1'],
+                'median': entry['median'],
+                'q3': entry['q3'],
+            }
+        return comparison
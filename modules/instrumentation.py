@@ -0,0 +1,222 @@
+"""
+Structured scrape instrumentation.
+
+fetch_url, parse_html and the scraper extractors record one event per call
+(stage, ticker, endpoint, duration, bytes, HTTP status, retries). The ticker and
+endpoint come from a context variable set by the @instrument_extractor
+decorator, so the low-level helpers need no extra arguments. At the end of a
+run the events are written as JSON lines plus a Prometheus text-format file,
+and a per-stage latency/throughput summary is printed.
+"""
+
+import contextvars
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from paths import data_path
+from profiling import profile_stage
+from task_deadline import cancellable_sleep
+
+METRICS_DIR = data_path('metrics')
+SUMMARY_QUANTILES = (0.5, 0.95, 0.99)
+
+# {'ticker': ..., 'endpoint': ...} of the extractor running in this thread
+_scrape_context = contextvars.ContextVar('scrape_context', default={})
+
+
+@contextmanager
+def scrape_context(**labels):
+    """Attach labels (ticker, endpoint) to every event recorded inside the block"""
+    token = _scrape_context.set({**_scrape_context.get(), **labels})
+    try:
+        yield
+    finally:
+        _scrape_context.reset(token)
+
+
+class ScrapeRecorder:
+    """Thread-safe in-memory event log of one scrape run"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.events = []
+        self._lock = threading.Lock()
+
+    def record(self, stage, duration, **fields):
+        """
+        Record one event.
+
+        Args:
+            stage (str): 'fetch', 'wait' (rate budget), 'parse', 'extract' or 'sleep'
+            duration (float): Seconds spent in the stage
+            **fields: bytes, status, retries, ok, url ... (ticker/endpoint default to the context)
+        """
+        event = {'ts': time.time(), 'stage': stage, 'duration': round(duration, 6),
+                 **_scrape_context.get(), **fields}
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def timed(self, stage, **fields):
+        """Record the duration of the block; the yielded dict can add fields"""
+        extra = {}
+        started = time.perf_counter()
+        try:
+            with profile_stage(stage):
+                yield extra
+        except BaseException:
+            extra.setdefault('ok', False)
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started, **fields, **extra)
+
+    def reset(self):
+        with self._lock:
+            self.events = []
+            self.started_at = time.time()
+
+    def summary(self):
+        """
+        Per-stage latency quantiles and throughput.
+
+        Returns:
+            dict: stage -> {count, errors, total_seconds, p50, p95, p99, per_second, bytes}
+        """
+        with self._lock:
+            events = list(self.events)
+        elapsed = max(time.time() - self.started_at, 1e-9)
+
+        by_stage = {}
+        for event in events:
+            by_stage.setdefault(event['stage'], []).append(event)
+
+        summary = {}
+        for stage, stage_events in by_stage.items():
+            durations = sorted(event['duration'] for event in stage_events)
+            summary[stage] = {
+                'count': len(stage_events),
+                'errors': sum(1 for event in stage_events if event.get('ok') is False),
+                'total_seconds': round(sum(durations), 3),
+                **{f"p{int(q * 100)}": round(percentile(durations, q), 4) for q in SUMMARY_QUANTILES},
+                'per_second': round(len(stage_events) / elapsed, 3),
+                'bytes': sum(event.get('bytes', 0) for event in stage_events),
+            }
+        return summary
+
+    def prometheus_text(self):
+        """Prometheus text exposition of the run, labelled by stage and endpoint"""
+        with self._lock:
+            events = list(self.events)
+
+        groups = {}
+        for event in events:
+            groups.setdefault((event['stage'], event.get('endpoint', '')), []).append(event)
+
+        lines = [
+            "# HELP scrape_stage_duration_seconds Duration of scrape stages",
+            "# TYPE scrape_stage_duration_seconds summary",
+        ]
+        for (stage, endpoint), group in sorted(groups.items()):
+            labels = f'stage="{stage}",endpoint="{endpoint}"'
+            durations = sorted(event['duration'] for event in group)
+            for q in SUMMARY_QUANTILES:
+                lines.append(f'scrape_stage_duration_seconds{{{labels},quantile="{q}"}} {percentile(durations, q):.6f}')
+            lines.append(f"scrape_stage_duration_seconds_sum{{{labels}}} {sum(durations):.6f}")
+            lines.append(f"scrape_stage_duration_seconds_count{{{labels}}} {len(durations)}")
+
+        fetches = [event for event in events if event['stage'] == 'fetch']
+        counters = (
+            ('scrape_requests_total', "HTTP requests by final status",
+             lambda event: 1, ('endpoint', 'status')),
+            ('scrape_response_bytes_total', "Response body bytes",
+             lambda event: event.get('bytes', 0), ('endpoint',)),
+            ('scrape_retries_total', "Retried HTTP attempts",
+             lambda event: event.get('retries', 0), ('endpoint',)),
+        )
+        for name, help_text, value_of, label_names in counters:
+            totals = {}
+            for event in fetches:
+                key = tuple('' if event.get(label) is None else str(event[label]) for label in label_names)
+                totals[key] = totals.get(key, 0) + value_of(event)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, total in sorted(totals.items()):
+                labels = ','.join(f'{label}="{value}"' for label, value in zip(label_names, key))
+                lines.append(f"{name}{{{labels}}} {total}")
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, run_name, directory=METRICS_DIR):
+        """
+        Write the run's events and metrics and print the summary.
+
+        Returns:
+            tuple: (JSON lines path, Prometheus text path)
+        """
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f"{run_name}_{datetime.now().strftime('%Y-%m-%dT%H%M%S')}")
+        with self._lock:
+            events = list(self.events)
+
+        with open(f"{stem}.jsonl", 'w') as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False) + '\n')
+        with open(f"{stem}.prom", 'w') as f:
+            f.write(self.prometheus_text())
+
+        print_summary(self.summary())
+        print(f"Saved scrape metrics to {stem}.jsonl and {stem}.prom")
+        return f"{stem}.jsonl", f"{stem}.prom"
+
+
+def percentile(sorted_values, q):
+    """Linearly interpolated quantile of an ascending list, NaN if empty"""
+    if not sorted_values:
+        return math.nan
+    position = (len(sorted_values) - 1) * q
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def print_summary(summary):
+    """Print a per-stage summary table"""
+    print(f"{'stage':<10}{'count':>7}{'errors':>8}{'total s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'per s':>8}{'MB':>8}")
+    for stage, row in sorted(summary.items()):
+        print(f"{stage:<10}{row['count']:>7}{row['errors']:>8}{row['total_seconds']:>10.1f}"
+              f"{row['p50']:>9.3f}{row['p95']:>9.3f}{row['p99']:>9.3f}{row['per_second']:>8.2f}"
+              f"{row['bytes'] / 1e6:>8.2f}")
+
+
+# Process-wide recorder used by utils and the scrapers
+RECORDER = ScrapeRecorder()
+
+
+def instrument_extractor(endpoint):
+    """
+    Decorate a scraper method taking (self, ticker, ...) so its calls are
+    recorded as 'extract' events and inner fetch/parse events carry the ticker
+    and endpoint.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, ticker, *args, **kwargs):
+            with scrape_context(ticker=ticker, endpoint=endpoint):
+                with RECORDER.timed('extract') as extra:
+                    result = method(self, ticker, *args, **kwargs)
+                    extra['ok'] = result is not None and result != []
+            return result
+        return wrapper
+    return decorator
+
+
+def paced_sleep(seconds):
+    """time.sleep that is recorded as a 'sleep' event and cut short when the current task is cancelled"""
+    with RECORDER.timed('sleep'):
+        cancellable_sleep(seconds)
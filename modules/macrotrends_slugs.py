@@ -0,0 +1,137 @@
+"""
+Persistent ticker -> macrotrends URL slug cache with automatic resolution.
+
+macrotrends chart URLs need the company slug (/stocks/charts/AAPL/apple/...).
+Slugs are kept in data/macrotrends_slugs.json. Tickers missing from it are
+resolved in bulk from the site's ticker search list (fetched at most once per
+resolver, so one request for the whole universe), then one by one by following
+the redirect of a chart URL with a guessed slug. Tickers that cannot be resolved are remembered with the date and
+retried after UNRESOLVED_RETRY_DAYS instead of on every run.
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import date, timedelta
+
+from paths import data_path
+from utils import fetch_url, write_json_atomic, MACROTRENDS_URL
+
+SLUG_CACHE_PATH = data_path('macrotrends_slugs.json')
+SEARCH_LIST_PATH = '/assets/php/ticker_search_list.php'
+UNRESOLVED_RETRY_DAYS = 30
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8'
+}
+
+CHART_URL_PATTERN = re.compile(r'/stocks/charts/([^/]+)/([^/]+)/')
+
+
+class SlugResolver:
+    """
+    Args:
+        base_url (str): Site root, replaced by a local mock server in benchmarks
+        rate_limiter (optional): Per-host pacing passed to fetch_url, defaults to RATE_BUDGET
+        cache_path (str): JSON file holding resolved and unresolved tickers
+    """
+
+    def __init__(self, base_url=MACROTRENDS_URL, rate_limiter=None, cache_path=SLUG_CACHE_PATH):
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.cache_path = cache_path
+        self._lock = threading.Lock()
+        self._search_list = None
+        self.slugs, self.unresolved = self._read_cache()
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            return {}, {}
+        return cache.get('slugs', {}), cache.get('unresolved', {})
+
+    def _save(self):
+        """Merge with what other processes may have written since, then write atomically"""
+        slugs, unresolved = self._read_cache()
+        slugs.update(self.slugs)
+        unresolved.update(self.unresolved)
+        for ticker in slugs:
+            unresolved.pop(ticker, None)
+        self.slugs, self.unresolved = slugs, unresolved
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        write_json_atomic(self.cache_path, {'slugs': dict(sorted(slugs.items())),
+                                            'unresolved': dict(sorted(unresolved.items()))},
+                          ensure_ascii=False, indent=2)
+
+    def _should_retry(self, ticker):
+        failed_on = self.unresolved.get(ticker)
+        if failed_on is None:
+            return True
+        return date.fromisoformat(failed_on) + timedelta(days=UNRESOLVED_RETRY_DAYS) <= date.today()
+
+    def fetch_search_list(self):
+        """
+        Ticker -> slug for every company in the site's ticker search list.
+
+        Returns:
+            dict: Upper-case ticker -> slug, empty if the list is unavailable
+        """
+        response = fetch_url(self.base_url + SEARCH_LIST_PATH, HEADERS, rate_limiter=self.rate_limiter)
+        if not response:
+            return {}
+        try:
+            entries = response.json()
+        except ValueError:
+            print("Ticker search list is not JSON")
+            return {}
+
+        slugs = {}
+        for entry in entries:
+            ticker, _, slug = str(entry.get('s', '')).partition('/')
+            if ticker and slug:
+                slugs[ticker.upper()] = slug
+        return slugs
+
+    def follow_redirect(self, ticker):
+        """Slug from the URL a chart page with a guessed slug ends up at, or None"""
+        response = fetch_url(f"{self.base_url}/stocks/charts/{ticker}/{ticker.lower()}/pe-ratio", HEADERS,
+                             rate_limiter=self.rate_limiter)
+        if not response:
+            return None
+        match = CHART_URL_PATTERN.search(response.url)
+        if not match or match.group(1).upper() != ticker:
+            return None
+        return match.group(2)
+
+    def resolve(self, tickers):
+        """
+        Slugs of the given tickers, resolving and caching the missing ones.
+
+        Returns:
+            dict: Ticker -> slug for every ticker that could be resolved
+        """
+        tickers = [ticker.upper() for ticker in tickers]
+        with self._lock:
+            missing = [ticker for ticker in tickers if ticker not in self.slugs and self._should_retry(ticker)]
+            if missing:
+                print(f"Resolving macrotrends slugs for {len(missing)} tickers...")
+                if self._search_list is None:
+                    self._search_list = self.fetch_search_list()
+                for ticker in missing:
+                    slug = self._search_list.get(ticker) or self.follow_redirect(ticker)
+                    if slug:
+                        self.slugs[ticker] = slug
+                        self.unresolved.pop(ticker, None)
+                    else:
+                        print(f"No macrotrends slug found for {ticker}")
+                        self.unresolved[ticker] = date.today().isoformat()
+                self._save()
+            return {ticker: self.slugs[ticker] for ticker in tickers if ticker in self.slugs}
+
+    def slug(self, ticker):
+        """Slug of one ticker, resolving it if needed; None if it cannot be resolved"""
+        return self.resolve([ticker]).get(ticker.upper())
@@ -0,0 +1,86 @@
+import glob
+import json
+import os
+import time
+
+from paths import data_path
+
+# Per-ticker records refreshed on demand, layered over the dated snapshots
+OVERLAY_DIR = data_path('overlay')
+
+
+def overlay_path(ticker):
+    """Path of the overlay file of one ticker"""
+    return os.path.join(OVERLAY_DIR, f"{ticker.upper()}.json")
+
+
+def read_overlay(ticker):
+    """Overlay of one ticker: {dataset: {'refreshed_at', 'data'}}, empty if none"""
+    try:
+        with open(overlay_path(ticker), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_overlay(ticker, records):
+    """
+    Store freshly fetched records of one ticker as its overlay.
+
+    Datasets missing from records keep their previous overlay entry.
+
+    Args:
+        ticker (str): Stock ticker symbol
+        records (dict): Dataset ('ratio', 'forecast', 'pe') -> snapshot record
+
+    Returns:
+        str: Path of the overlay file
+    """
+    # utils pulls in requests/bs4, which the analyzer's read path does not need
+    from utils import write_json_atomic
+
+    overlay = read_overlay(ticker)
+    refreshed_at = time.time()
+    for dataset, record in records.items():
+        overlay[dataset] = {'refreshed_at': refreshed_at, 'data': record}
+
+    os.makedirs(OVERLAY_DIR, exist_ok=True)
+    path = overlay_path(ticker)
+    write_json_atomic(path, overlay, indent=2)
+    return path
+
+
+def apply_overlays(datasets, snapshot_mtimes):
+    """
+    Replace snapshot records with newer overlay records, in place.
+
+    An overlay entry only applies while it is newer than the snapshot of its
+    dataset; once a scrape writes a later snapshot the overlay is ignored.
+
+    Args:
+        datasets (dict): Dataset -> loaded snapshot data (ticker -> record)
+        snapshot_mtimes (dict): Dataset -> mtime of the loaded snapshot (0 if none)
+
+    Returns:
+        list: Tickers with at least one overlay record applied
+    """
+    applied = []
+    for path in glob.glob(os.path.join(OVERLAY_DIR, '*.json')):
+        ticker = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'r') as f:
+            overlay = json.load(f)
+        fresh = [dataset for dataset, entry in overlay.items()
+                 if dataset in datasets and entry['refreshed_at'] > snapshot_mtimes.get(dataset, 0)]
+        for dataset in fresh:
+            datasets[dataset][ticker] = overlay[dataset]['data']
+        if fresh:
+            applied.append(ticker)
+    return applied
+
+
+def overlay_signature():
+    """(file count, newest mtime) of the overlay directory, None if it is empty"""
+    files = glob.glob(os.path.join(OVERLAY_DIR, '*.json'))
+    if not files:
+        return None
+    return len(files), max(os.path.getmtime(path) for path in files)
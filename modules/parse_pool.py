@@ -0,0 +1,80 @@
+"""
+Process pool for HTML parsing, so parsing runs on every core while fetches continue.
+
+BeautifulSoup parsing holds the GIL: with concurrent fetch threads it becomes the
+bottleneck of a scrape. Scrapers given a ParsePool send the raw page text to a
+worker process with one of their module-level parse functions (parse_statistics,
+parse_forecast, parse_pe_table, parse_quarterly) and get back the compact
+extracted dict. At most max_pending pages are queued or being parsed; a fetch
+thread that would exceed that blocks until a worker frees up, so downloads never
+run arbitrarily far ahead of parsing.
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from instrumentation import RECORDER
+from task_deadline import TaskCancelled, checkpoint, time_left
+
+
+def _init_worker(path):
+    # Spawned workers (macOS, Windows) need the modules directory to unpickle parse functions
+    sys.path[:] = path
+
+
+class ParsePool:
+    """
+    Args:
+        workers (int, optional): Parser processes, defaults to the number of CPUs
+        max_pending (int, optional): Pages queued or in parsing before fetch threads
+            block, defaults to twice the workers
+    """
+
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.slots = threading.BoundedSemaphore(max_pending or 2 * self.workers)
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(list(sys.path),))
+
+    def parse(self, function, content, *args):
+        """
+        function(content, *args) in a worker process.
+
+        Blocks while max_pending pages are already waiting for a worker. Inside a
+        guarded task (see task_deadline) both waits end with TaskCancelled at the
+        task's deadline; a page still being parsed then finishes in its worker
+        and is discarded.
+        """
+        with RECORDER.timed('parse_wait'):
+            if not self.slots.acquire(timeout=time_left()):
+                checkpoint()
+                raise TaskCancelled('deadline')
+        try:
+            with RECORDER.timed('parse', bytes=len(content), pooled=True):
+                future = self.executor.submit(function, content, *args)
+                try:
+                    return future.result(timeout=time_left())
+                except TimeoutError:
+                    future.cancel()
+                    checkpoint()
+                    raise TaskCancelled('deadline')
+        finally:
+            self.slots.release()
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_parser(pool, function, content, *args):
+    """Parse in the pool when there is one, on the calling thread otherwise"""
+    if pool is None:
+        checkpoint()
+        return function(content, *args)
+    return pool.parse(function, content, *args)
@@ -0,0 +1,30 @@
+import os
+
+# Resolved from this file so scripts work from any working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# PE_VALUATION_DATA_DIR points every snapshot reader and writer at another data
+# tree, e.g. a synthetic universe from benchmarks/generate_universe.py
+DATA_DIR = os.environ.get('PE_VALUATION_DATA_DIR') or os.path.join(PROJECT_ROOT, 'data')
+VALUATION_DIR = os.path.join(PROJECT_ROOT, 'valuation')
+
+
+def data_path(*parts):
+    """Absolute path inside the data/ directory"""
+    return os.path.join(DATA_DIR, *parts)
+
+
+def snapshot_path(dataset, prefix, snapshot_date):
+    """
+    Path of a dated snapshot file, creating its directory if needed.
+
+    Args:
+        dataset (str): Subdirectory of data/, e.g. 'ratio'
+        prefix (str): File name prefix, e.g. 'stock_list_metrics'
+        snapshot_date (str): YYYY-MM-DD
+
+    Returns:
+        str: data/<dataset>/<prefix>_<snapshot_date>.json
+    """
+    directory = data_path(dataset)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{prefix}_{snapshot_date}.json")
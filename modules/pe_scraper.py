@@ -1,29 +1,80 @@
 import re
 import requests
 import pandas as pd
-from bs4 import BeautifulSoup
 from io import StringIO
-import time, random
 from requests.exceptions import RequestException
 from tqdm import tqdm 
 import requests
-from bs4 import BeautifulSoup
 import numpy as np
-import time
 from typing import Dict, List, Optional, Tuple
 from requests.exceptions import RequestException, HTTPError
 import pandas as pd
-import random, json
+import random
 from datetime import datetime
 
 # custom imports
-from utils import fetch_url, parse_html, compute_iqr_statistics, filter_outliers
-from names import STOCK_LIST, PE_TICKER_TO_COMPANY
+from paths import snapshot_path
+from snapshot_schema import write_typed_snapshot
+from instrumentation import RECORDER, instrument_extractor, paced_sleep
+from utils import fetch_url, parse_html, compute_iqr_statistics, filter_outliers, MACROTRENDS_URL
+from names import STOCK_LIST
+from macrotrends_slugs import SlugResolver
+from parse_pool import run_parser
+from task_deadline import TASK_BUDGET_SECONDS, scrape_guarded
+from universe import unique_tickers
+
+
+def parse_pe_table(content):
+    """
+    PE ratios of a macrotrends PE chart page, newest first.
+
+    Pure function of the page text, so it can run in a ParsePool worker.
+    """
+    soup = parse_html(content)
+    table = soup.find("table", class_="table")
+
+    if not table:
+        print("PE ratio table not found in the HTML content.")
+        return []
+
+    rows = table.find("tbody").find_all("tr")
+    pe_ratios = []
+
+    for row in rows:
+        cells = row.find_all("td")
+        if len(cells) >= 4:
+            pe_ratio_str = cells[3].get_text(strip=True)
+            # Handle cases like 'N/A' or empty strings
+            try:
+                pe_ratio = float(pe_ratio_str.replace(",", ""))
+                pe_ratios.append(pe_ratio)
+            except ValueError:
+                # Skip invalid PE ratio values
+                continue
+    return pe_ratios
+
 
 class PERatioScraper:
-    def __init__(self):
+    def __init__(self, base_url=MACROTRENDS_URL, rate_limiter=None, delay_range=(0, 0), slug_resolver=None,
+                 parse_pool=None):
+        """
+        Args:
+            base_url (str): Site root, replaced by a local mock server in benchmarks
+            rate_limiter (optional): Per-host pacing passed to fetch_url, defaults to RATE_BUDGET
+            delay_range (tuple): Seconds (min, max) slept around each ticker in get_company_metrics on top of
+                the adaptive per-host rate of RATE_BUDGET (none by default)
+            slug_resolver (SlugResolver, optional): Ticker -> URL slug lookup, defaults to the
+                persistent cache in data/macrotrends_slugs.json
+            parse_pool (ParsePool, optional): Parse pages in worker processes instead of this thread
+        """
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.delay_range = delay_range
+        self.slugs = slug_resolver or SlugResolver(base_url, rate_limiter)
+        self.parse_pool = parse_pool
         self.current_date = datetime.now().strftime('%Y-%m-%d')
 
+    @instrument_extractor('pe')
     def parse_pe_ratios(self, ticker: str) -> List[float]:
         """
         Parse PE ratios from the given HTML content.
@@ -34,40 +85,22 @@ class PERatioScraper:
         Returns:
             List[float]: List of PE ratios extracted.
         """
-        company = PE_TICKER_TO_COMPANY.get(ticker.lower())
-        url = f"https://www.macrotrends.net/stocks/charts/{ticker.upper()}/{company}/pe-ratio"
+        company = self.slugs.slug(ticker)
+        if company is None:
+            print(f"No macrotrends slug for {ticker}, skipping its PE history")
+            return None
+        url = f"{self.base_url}/stocks/charts/{ticker.upper()}/{company}/pe-ratio"
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8'
         }
         
         try:
-            response = fetch_url(url, headers)
+            response = fetch_url(url, headers, rate_limiter=self.rate_limiter)
             if not response:
                 return None
                 
-            soup = BeautifulSoup(response.text, 'html.parser')
-            table = soup.find("table", class_="table")
-
-            if not table:
-                print("PE ratio table not found in the HTML content.")
-                return []
-
-            rows = table.find("tbody").find_all("tr")
-            pe_ratios = []
-
-            for row in rows:
-                cells = row.find_all("td")
-                if len(cells) >= 4:
-                    pe_ratio_str = cells[3].get_text(strip=True)
-                    # Handle cases like 'N/A' or empty strings
-                    try:
-                        pe_ratio = float(pe_ratio_str.replace(",", ""))
-                        pe_ratios.append(pe_ratio)
-                    except ValueError:
-                        # Skip invalid PE ratio values
-                        continue
-            return pe_ratios
+            return run_parser(self.parse_pool, parse_pe_table, response.text)
         except Exception as e:
             print(f"Error extracting growth forecasts: {e}")
             return None
@@ -105,46 +138,57 @@ class PERatioScraper:
             return 0
         
 
-    def get_company_metrics(self):
+    def scrape_ticker(self, ticker, industry=None):
         """
-        Get financial metrics for a specific company ticker.
+        Fetch and analyze the PE history of one ticker.
+
+        Returns:
+            float or None: Median historical PE, None if it could not be fetched or analyzed
+        """
+        pe_ratios = self.parse_pe_ratios(ticker)
+        if not pe_ratios:
+            print(f"Failed to fetch PE ratios for {ticker}")
+            return None
+        # Analyze PE ratios
+        print("Analyzing PE ratios for:", ticker)
+        print(f"PE ratios fetched for {ticker}: {pe_ratios}")
+        pe_median = self.analyze_pe_ratios(pe_ratios)
+        if pe_median is None:
+            print(f"Failed to analyze PE ratios for {ticker}")
+            return None
+
+        print(f"Fetched and analyzed PE ratios for {ticker}: {pe_median}")
+        return pe_median
+
+    def get_company_metrics(self, stock_list=STOCK_LIST, task_budget=TASK_BUDGET_SECONDS):
+        """
+        Get the median historical PE of every company in the stock list.
         
         Args:
-            ticker (str): The stock ticker symbol.
+            stock_list (dict): Industry -> tickers mapping, defaults to names.STOCK_LIST
+            task_budget (float): Seconds each ticker attempt may take
         
         Returns:
-            dict: A dictionary containing the company's financial metrics.
+            dict: Ticker -> median PE.
         """
-        all_companies_metrics = {}
-        # with open("/Users/yankesswang/Projects/PE_valuation/data/stock_list_PE_2025-06-29.json", 'r') as f:
-        #     pe_dict = json.load(f)
-        for industry, companies in STOCK_LIST.items():
-            for company in companies:
-                # if company in pe_dict:
-                #     print(f"Skipping {company}, already processed.")
-                #     all_companies_metrics[company] = pe_dict[company]
-                #     continue
-                time.sleep(random.uniform(10, 30))
-                pe_ratios = self.parse_pe_ratios(company)
-                if not pe_ratios:
-                    print(f"Failed to fetch PE ratios for {company}")
-                    continue
-                # Analyze PE ratios
-                print("Analyzing PE ratios for:", company)
-                print(f"PE ratios fetched for {company}: {pe_ratios}")
-                pe_median = self.analyze_pe_ratios(pe_ratios)
-                if pe_median is None:
-                    print(f"Failed to analyze PE ratios for {company}")
-                    continue
-
-                # Store the metrics
-                print(f"Fetched and analyzed PE ratios for {company}: {pe_median}")
-
-                # Store the company metrics
-                all_companies_metrics[company] = pe_median
-
-                time.sleep(random.uniform(10, 30))
-        return all_companies_metrics
+        tickers = unique_tickers(stock_list)
+        # Resolve missing URL slugs for the whole universe before the first chart request
+        self.slugs.resolve(tickers)
+
+        def pause():
+            # Slept before and after every ticker
+            paced_sleep(random.uniform(*self.delay_range))
+            paced_sleep(random.uniform(*self.delay_range))
+
+        # Each ticker runs under a deadline, failed ones are retried after the rest
+        return scrape_guarded(tickers, self.scrape_ticker, 'pe', budget=task_budget, pause=pause)
+
+    def write_snapshot(self, data):
+        """Write the collected data as today's pe snapshot and return its path"""
+        path = snapshot_path('pe', 'stock_list_PE', self.current_date)
+        write_typed_snapshot('pe', path, data)
+        print(f"Saved {len(data)} tickers to {path}")
+        return path
 
 if __name__ == "__main__":
 
@@ -158,5 +202,5 @@ if __name__ == "__main__":
     # print(f"Median PE Ratio for {ticker}:", pe_median)
 
     pe_data = pe_scraper.get_company_metrics()
-    with open(f'../data/pe/stock_list_PE_{pe_scraper.current_date}.json', 'w') as f:
-        json.dump(pe_data, f, indent=2)
\ No newline at end of file
+    pe_scraper.write_snapshot(pe_data)
+    RECORDER.write('pe')
\ No newline at end of file
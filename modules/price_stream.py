@@ -0,0 +1,95 @@
+"""
+Intraday prices for the whole universe without re-scraping statistics pages.
+
+Quotes are fetched in batches with yfinance's multi-ticker download (one
+request per QUOTE_BATCH_SIZE tickers, paced against the yfinance host in
+RATE_BUDGET). PricePoller remembers the last price of every ticker and only
+reports the ones that moved, so consumers re-value just those rows: fair values
+do not depend on the price and stay as computed from the snapshots.
+"""
+
+import math
+import time
+
+from ratio_scraper import YFINANCE_QUOTE_URL
+from utils import RATE_BUDGET
+
+QUOTE_BATCH_SIZE = 200
+POLL_INTERVAL = 15.0
+
+
+def _last_prices(frame, tickers):
+    """Ticker -> last traded price in a yf.download result"""
+    close = frame['Close']
+    if getattr(close, 'ndim', 1) == 1:
+        # Older yfinance returns flat columns for a single ticker
+        close = close.to_frame(tickers[0])
+    last = close.ffill().iloc[-1] if len(close) else {}
+    prices = {}
+    for ticker in tickers:
+        price = last.get(ticker)
+        if price is not None and not math.isnan(price) and price > 0:
+            prices[ticker] = float(price)
+    return prices
+
+
+def fetch_quotes(tickers, batch_size=QUOTE_BATCH_SIZE):
+    """
+    Latest intraday prices of many tickers.
+
+    Args:
+        tickers (list): Ticker symbols
+        batch_size (int): Tickers per request
+
+    Returns:
+        dict: Ticker -> price, for the tickers with a quote
+    """
+    import yfinance as yf
+
+    tickers = list(tickers)
+    prices = {}
+    for start in range(0, len(tickers), batch_size):
+        batch = tickers[start:start + batch_size]
+        RATE_BUDGET.wait(YFINANCE_QUOTE_URL)
+        started = time.perf_counter()
+        try:
+            frame = yf.download(batch, period='1d', interval='1m', group_by='column', auto_adjust=False,
+                                progress=False, threads=False)
+        except Exception as e:
+            print(f"Warning: Could not get quotes for {len(batch)} tickers: {e}")
+            if type(e).__name__ == 'YFRateLimitError':
+                RATE_BUDGET.observe(YFINANCE_QUOTE_URL, 429, time.perf_counter() - started)
+            continue
+        RATE_BUDGET.observe(YFINANCE_QUOTE_URL, 200, time.perf_counter() - started)
+        if frame is not None and not frame.empty:
+            prices.update(_last_prices(frame, batch))
+    return prices
+
+
+class PricePoller:
+    """
+    Poll quotes for a fixed set of tickers and report what changed.
+
+    Args:
+        tickers (list): Ticker symbols
+        fetch (callable): tickers -> {ticker: price}, defaults to fetch_quotes
+    """
+
+    def __init__(self, tickers, fetch=fetch_quotes):
+        self.tickers = list(tickers)
+        self.fetch = fetch
+        self.prices = {}
+        self.polled_at = None
+
+    def poll(self):
+        """
+        Fetch quotes once.
+
+        Returns:
+            dict: Ticker -> new price, only for prices that differ from the last poll
+        """
+        quotes = self.fetch(self.tickers)
+        self.polled_at = time.time()
+        changed = {ticker: price for ticker, price in quotes.items() if self.prices.get(ticker) != price}
+        self.prices.update(changed)
+        return changed
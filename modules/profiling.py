@@ -0,0 +1,186 @@
+"""
+Opt-in profiling of scrape and analysis runs (`main.py ... --profile`).
+
+While a RunProfiler is active, one cProfile profile covers the run and every
+profile_stage() block records its call count, wall time and tracemalloc peak
+(the most memory allocated above the stage's starting point). Stages nest:
+fetch and parse run inside extract, calculate_valuations inside
+aggregate_company_data. The report lists the stages, then the cProfile call
+tree below each stage's function, and is written next to the run's output with
+the raw .prof file for snakeviz/pstats.
+"""
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Stage -> functions whose callees form the stage's call tree in the report
+STAGE_FUNCTIONS = {
+    'fetch': ['fetch_url'],
+    'parse': ['parse_html'],
+    'extract': ['extract_ticker_metrics', 'extract_forecast_data', 'parse_pe_ratios',
+                'extract_quarterly_data', 'get_current_price'],
+    'load_snapshots': ['_load_latest_snapshot'],
+    'calculate_valuations': ['calculate_valuations'],
+    'aggregate_company_data': ['aggregate_company_records'],
+    'build_valuation_table': ['build_valuation_table'],
+    'save_to_excel': ['write_industry_workbook', 'write_dataframes_workbook'],
+}
+
+CALL_TREE_LINES = 25
+
+_active = None
+
+
+class _StageFrame:
+    def __init__(self, name, start_memory):
+        self.name = name
+        self.start_memory = start_memory
+        self.started = time.perf_counter()
+        self.peak = start_memory
+
+
+class RunProfiler:
+    """
+    Profile one run on the calling thread.
+
+    Use as a context manager, then write(output_path). Stages entered on
+    other threads are timed but not memory-attributed, and their calls are
+    not in the cProfile tree; profiled runs should stay on one thread.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.profile = cProfile.Profile()
+        self._thread = None
+        self._stack = []
+        self._lock = threading.Lock()
+        self.started = None
+        self.elapsed = None
+        self.peak_memory = None
+
+    def __enter__(self):
+        global _active
+        self._thread = threading.get_ident()
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+        self.started = time.perf_counter()
+        _active = self
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        self.profile.disable()
+        _active = None
+        self.elapsed = time.perf_counter() - self.started
+        self.peak_memory = tracemalloc.get_traced_memory()[1]
+        if self._started_tracing:
+            tracemalloc.stop()
+        return False
+
+    def _raise_parent_peaks(self, peak):
+        for frame in self._stack:
+            frame.peak = max(frame.peak, peak)
+
+    @contextmanager
+    def stage(self, name):
+        on_run_thread = threading.get_ident() == self._thread
+        frame = None
+        if on_run_thread:
+            current, peak = tracemalloc.get_traced_memory()
+            self._raise_parent_peaks(peak)
+            tracemalloc.reset_peak()
+            frame = _StageFrame(name, current)
+            self._stack.append(frame)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            memory = 0
+            if frame is not None:
+                self._stack.pop()
+                peak = max(frame.peak, tracemalloc.get_traced_memory()[1])
+                self._raise_parent_peaks(peak)
+                tracemalloc.reset_peak()
+                memory = peak - frame.start_memory
+            with self._lock:
+                entry = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                                      'peak_bytes': 0})
+                entry['calls'] += 1
+                entry['seconds'] += elapsed
+                entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+                entry['peak_bytes'] = max(entry['peak_bytes'], memory)
+
+    def report(self):
+        """Text report: stage table, hottest functions and per-stage call trees"""
+        out = io.StringIO()
+        out.write(f"Run time {self.elapsed:.2f}s, tracemalloc peak {self.peak_memory / 1e6:.1f} MB\n\n")
+        out.write(f"{'stage':<24}{'calls':>8}{'total s':>10}{'max s':>9}{'peak MB':>10}\n")
+        for name, entry in sorted(self.stages.items(), key=lambda item: -item[1]['seconds']):
+            out.write(f"{name:<24}{entry['calls']:>8}{entry['seconds']:>10.3f}{entry['max_seconds']:>9.3f}"
+                      f"{entry['peak_bytes'] / 1e6:>10.2f}\n")
+
+        stats = pstats.Stats(self.profile, stream=out)
+        out.write("\nHottest functions by cumulative time\n")
+        stats.sort_stats('cumulative').print_stats(CALL_TREE_LINES)
+
+        called = {function_name for _, _, function_name in stats.stats}
+        for name in self.stages:
+            for function in STAGE_FUNCTIONS.get(name, []):
+                if function not in called:
+                    continue
+                out.write(f"\nCall tree of {name} ({function})\n")
+                stats.sort_stats('cumulative').print_callees(rf"\b{function}\b", CALL_TREE_LINES)
+        return out.getvalue()
+
+    def write(self, output_path):
+        """
+        Write <output stem>_profile.txt and .prof next to output_path.
+
+        Returns:
+            str: Path of the text report
+        """
+        stem = os.path.splitext(output_path)[0] + '_profile'
+        os.makedirs(os.path.dirname(stem), exist_ok=True)
+        self.profile.dump_stats(f"{stem}.prof")
+        with open(f"{stem}.txt", 'w') as f:
+            f.write(self.report())
+        print(f"Saved profile to {stem}.txt ({stem}.prof for pstats/snakeviz)")
+        return f"{stem}.txt"
+
+
+def profiling_this_thread():
+    """True on the thread of an active RunProfiler, whose work must stay on that thread to be profiled"""
+    return _active is not None and _active._thread == threading.get_ident()
+
+
+@contextmanager
+def profile_stage(name):
+    """Attribute the block to a pipeline stage when a RunProfiler is active"""
+    if _active is None:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+
+def profiled(name):
+    """Decorator form of profile_stage"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
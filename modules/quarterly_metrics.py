@@ -0,0 +1,49 @@
+import numpy as np
+
+from records import RecordTable
+
+
+def _right_aligned_matrix(series_list):
+    """Stack ragged per-ticker series into a float matrix aligned on the latest quarter"""
+    width = max((len(series) for series in series_list), default=0)
+    matrix = np.full((len(series_list), max(width, 1)), np.nan)
+    for row, series in enumerate(series_list):
+        if series:
+            matrix[row, width - len(series):] = [np.nan if value is None else value for value in series]
+    return matrix
+
+
+def _pct_change(latest, previous):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (latest - previous) / np.abs(previous) * 100
+    change[~np.isfinite(change)] = np.nan
+    return change
+
+
+def compute_quarterly_metrics(quarterly_data):
+    """
+    Compute TTM and quarter-over-quarter figures for every ticker at once.
+
+    Args:
+        quarterly_data (dict): Ticker -> {'eps': [...], 'revenue': [...]}, oldest quarter first
+
+    Returns:
+        RecordTable: Ticker -> {'ttm_eps', 'eps_qoq', 'ttm_revenue', 'revenue_qoq'} (None when unavailable)
+    """
+    tickers = list(quarterly_data)
+    columns = {}
+    for key in ('eps', 'revenue'):
+        matrix = _right_aligned_matrix([quarterly_data[ticker].get(key, []) for ticker in tickers])
+        if matrix.shape[1] >= 4:
+            ttm = matrix[:, -4:].sum(axis=1)
+        else:
+            ttm = np.full(len(tickers), np.nan)
+        if matrix.shape[1] >= 2:
+            qoq = _pct_change(matrix[:, -1], matrix[:, -2])
+        else:
+            qoq = np.full(len(tickers), np.nan)
+
+        columns[f'ttm_{key}'] = ttm
+        columns[f'{key}_qoq'] = qoq
+
+    return RecordTable.from_columns(tickers, columns)
@@ -0,0 +1,153 @@
+from utils import fetch_url, parse_html, STOCKANALYSIS_URL
+from paths import snapshot_path
+from snapshot_schema import write_typed_snapshot
+from instrumentation import RECORDER, instrument_extractor
+from parse_pool import run_parser
+from task_deadline import TASK_BUDGET_SECONDS, scrape_guarded
+import json
+from datetime import datetime
+
+from names import STOCK_LIST
+from universe import unique_tickers
+
+# Financials rows collected from the quarterly income statement, with the
+# multiplier applied to the page values (revenue is shown in millions)
+QUARTERLY_ROWS = {
+    'Revenue': ('revenue', 1e6),
+    'EPS (Diluted)': ('eps', 1),
+}
+
+
+def parse_value(value_str):
+    """Parse a financials table cell into a float, or None if it holds no number"""
+    if not value_str or value_str in ('-', 'n/a', 'N/A') or 'Upgrade' in value_str:
+        return None
+    try:
+        return float(value_str.replace('$', '').replace(',', '').strip())
+    except ValueError:
+        return None
+
+
+def parse_quarterly(content):
+    """
+    Quarterly EPS and revenue history of a quarterly income statement page.
+
+    Pure function of the page text, so it can run in a ParsePool worker.
+
+    Returns:
+        dict or None: {'periods', 'eps', 'revenue'}, oldest quarter first; None without a financials table
+    """
+    soup = parse_html(content)
+    table = soup.find('table')
+    if not table or not table.find('thead') or not table.find('tbody'):
+        return None
+
+    # First header cell is the row label column, the rest are quarters (newest first)
+    periods = [th.get_text(strip=True) for th in table.find('thead').find_all('th')][1:]
+    quarterly = {'periods': periods, 'eps': [], 'revenue': []}
+
+    for row in table.find('tbody').find_all('tr'):
+        cells = row.find_all(['th', 'td'])
+        if not cells:
+            continue
+        label = cells[0].get_text(strip=True)
+
+        if label == 'Period Ending':
+            quarterly['periods'] = [cell.get('title') or cell.get_text(strip=True)
+                                    for cell in cells[1:len(periods) + 1]]
+            continue
+
+        if label not in QUARTERLY_ROWS:
+            continue
+        key, multiplier = QUARTERLY_ROWS[label]
+        values = []
+        for cell in cells[1:len(periods) + 1]:
+            value = parse_value(cell.get('title') or cell.get_text(strip=True))
+            values.append(value * multiplier if value is not None else None)
+        quarterly[key] = values
+
+    # Store oldest first so new quarters are appended at the end
+    width = len(quarterly['periods'])
+    for key in ('periods', 'eps', 'revenue'):
+        values = quarterly[key] + [None] * (width - len(quarterly[key]))
+        quarterly[key] = values[:width][::-1]
+    return quarterly
+
+
+class Quarterly_Scraper():
+    def __init__(self, max_workers=4, base_url=STOCKANALYSIS_URL, rate_limiter=None, parse_pool=None):
+        """
+        Args:
+            max_workers (int): Tickers fetched concurrently
+            base_url (str): Site root, replaced by a local mock server in benchmarks
+            rate_limiter (optional): Per-host pacing passed to fetch_url instead of RATE_BUDGET
+            parse_pool (ParsePool, optional): Parse pages in worker processes instead of the fetch threads
+        """
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)'
+                          ' Chrome/91.0.4472.124 Safari/537.36'
+        }
+        self.current_date = datetime.now().strftime('%Y-%m-%d')
+        self.max_workers = max_workers
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.parse_pool = parse_pool
+
+    def parse_value(self, value_str):
+        """Parse a financials table cell into a float, or None if it holds no number"""
+        return parse_value(value_str)
+
+    @instrument_extractor('quarterly')
+    def extract_quarterly_data(self, ticker):
+        """
+        Extract quarterly EPS and revenue history from the quarterly income statement.
+
+        Args:
+            ticker (str): Stock ticker symbol
+
+        Returns:
+            dict or None: {'periods': [...], 'eps': [...], 'revenue': [...]}, oldest quarter first
+        """
+        url = f"{self.base_url}/stocks/{ticker}/financials/?p=quarterly"
+        response = fetch_url(url, self.headers, rate_limiter=self.rate_limiter)
+
+        if not response:
+            print(f"Failed to fetch quarterly data for {ticker}")
+            return None
+
+        quarterly = run_parser(self.parse_pool, parse_quarterly, response.text)
+        if quarterly is None:
+            print(f"Quarterly financials table not found for {ticker}")
+            return None
+
+        print(f"Extracted {len(quarterly['periods'])} quarters for {ticker}")
+        return quarterly
+
+    def scrape_ticker(self, ticker, industry=None):
+        """Quarterly history of one ticker as stored in the quarterly snapshot, or None"""
+        return self.extract_quarterly_data(ticker)
+
+    def get_company_metrics(self, stock_list=STOCK_LIST, task_budget=TASK_BUDGET_SECONDS):
+        """Get quarterly history for every ticker in the stock list concurrently, each under a task_budget deadline"""
+        return scrape_guarded(unique_tickers(stock_list), self.extract_quarterly_data, 'quarterly',
+                              budget=task_budget, workers=self.max_workers)
+
+    def write_snapshot(self, data):
+        """Write the collected data as today's quarterly snapshot and return its path"""
+        path = snapshot_path('quarterly', 'stock_list_quarterly', self.current_date)
+        write_typed_snapshot('quarterly', path, data)
+        print(f"Saved {len(data)} tickers to {path}")
+        return path
+
+
+if __name__ == "__main__":
+    scraper = Quarterly_Scraper()
+
+    # Test with a single stock first
+    print("Testing with NVDA...")
+    test_result = scraper.extract_quarterly_data("NVDA")
+    print(json.dumps(test_result, indent=2))
+
+    all_quarterly = scraper.get_company_metrics()
+    scraper.write_snapshot(all_quarterly)
+    RECORDER.write('quarterly')
@@ -1,11 +1,189 @@
-from utils import fetch_url, parse_html
-import re, json, time, random
+from utils import fetch_url, parse_html, RATE_BUDGET, STOCKANALYSIS_URL
+from paths import snapshot_path
+from snapshot_schema import write_typed_snapshot
+from instrumentation import RECORDER, instrument_extractor, paced_sleep
+from parse_pool import run_parser
+from task_deadline import TASK_BUDGET_SECONDS, checkpoint, scrape_guarded
+import re, time, random
 from datetime import datetime
 from names import STOCK_LIST
-import yfinance as yf
+from universe import unique_tickers
+
+# Host yfinance quotes are fetched from, used as the rate budget key
+YFINANCE_QUOTE_URL = "https://query2.finance.yahoo.com/"
+
+# Statistics page row label -> metric key stored in the ratio snapshot
+STATISTICS_LABELS = {
+    'Market Cap': 'marketcap',
+    'Enterprise Value': 'enterpriseValue',
+    'Earnings Date': 'earningsdate',
+    'Ex-Dividend Date': 'exdivdate',
+    'Current Share Class': 'sharesOutClass',
+    'Shares Outstanding': 'sharesout',
+    'Shares Change (YoY)': 'sharesgrowthyoy',
+    'Shares Change (QoQ)': 'sharesgrowthqoq',
+    'Shares Held by Insiders': 'sharesInsiders',
+    'Shares Held by Institutions': 'sharesInstitutions',
+    'Float': 'float',
+    'PE Ratio': 'pe',
+    'Forward PE': 'peForward',
+    'PS Ratio': 'ps',
+    'Forward PS': 'psForward',
+    'PB Ratio': 'pb',
+    'Price to Tangible Book': 'ptbvRatio',
+    'Price to Free Cash Flow': 'pfcf',
+    'Price to Operating Cash Flow': 'pocf',
+    'PEG Ratio': 'pegRatio',
+    'EV / Earnings': 'evEarnings',
+    'EV / Sales': 'evSales',
+    'EV / EBITDA': 'evEbitda',
+    'EV / EBIT': 'evEbit',
+    'EV / FCF': 'evFcf',
+    'Current Ratio': 'currentRatio',
+    'Quick Ratio': 'quickRatio',
+    'Debt / Equity': 'debtEquity',
+    'Debt / EBITDA': 'debtEbitda',
+    'Debt / FCF': 'debtFcf',
+    'Interest Coverage': 'interestCoverage',
+    'ROE': 'roe',
+    'ROA': 'roa',
+    'ROIC': 'roic',
+    'ROCE': 'roce',
+    'Revenue per Employee': 'revPerEmployee',
+    'Profit per Employee': 'profitPerEmployee',
+    'Employees': 'employees',
+    'Asset Turnover': 'assetturnover',
+    'Inventory Turnover': 'inventoryturnover',
+    'Tax Rate': 'taxrate',
+    'Beta': 'beta',
+    '52-Week Change': 'ch1y',
+    '50-Day MA': 'sma50',
+    '200-Day MA': 'sma200',
+    'RSI': 'rsi',
+    'Average Volume': 'averageVolume',
+    'Short Interest': 'shortInterest',
+    'Short Interest (Prior Month)': 'shortPriorMonth',
+    'Short % of Shares Out': 'shortShares',
+    'Short % of Float': 'shortFloat',
+    'Short Ratio': 'shortRatio',
+    'Revenue': 'revenue',
+    'Gross Profit': 'gp',
+    'Operating Income': 'opinc',
+    'Pretax Income': 'pretax',
+    'Net Income': 'netinc',
+    'EBITDA': 'ebitda',
+    'EBIT': 'ebit',
+    'EPS (Diluted)': 'eps',
+    'Total Cash': 'totalcash',
+    'Total Debt': 'debt',
+    'Net Cash / Debt': 'netcash',
+    'Book Value per Share': 'bvps',
+    'Working Capital': 'workingcapital',
+    'Operating Cash Flow': 'ncfo',
+    'Capital Expenditures': 'capex',
+    'Free Cash Flow': 'fcf',
+    'FCF per Share': 'fcfps',
+    'Gross Margin': 'grossMargin',
+    'Operating Margin': 'operatingMargin',
+    'Pretax Margin': 'pretaxMargin',
+    'Profit Margin': 'profitMargin',
+    'EBITDA Margin': 'ebitdaMargin',
+    'EBIT Margin': 'ebitMargin',
+    'FCF Margin': 'fcfMargin',
+    'Dividend per Share': 'dps',
+    'Dividend Yield': 'dividendYield',
+    'Dividend Growth': 'dividendGrowth',
+    'Years of Dividend Growth': 'dividendGrowthYears',
+    'Payout Ratio': 'payoutRatio',
+    'Buyback Yield': 'buybackYield',
+    'Total Shareholder Return': 'totalReturn',
+    'Earnings Yield': 'earningsYield',
+    'FCF Yield': 'fcfYield',
+    'Price Target': 'priceTarget',
+    'Analyst Ratings': 'analystRatings',
+    'Number of Analysts': 'analystCount',
+    'Revenue Growth Forecast (5Y)': 'revenue5y',
+    'EPS Growth Forecast (5Y)': 'eps5y',
+}
+
+
+def parse_value(value_str):
+    """Parse a value string from the website into a numeric value"""
+    if not value_str or value_str == 'n/a' or value_str == '-':
+        return None
+
+    # Remove currency symbols and commas
+    value_str = value_str.replace('$', '').replace(',', '').strip()
+
+    try:
+        # Handle percentage
+        if '%' in value_str:
+            return float(value_str.replace('%', ''))
+
+        # Handle billions/millions/trillions
+        multipliers = {'T': 1e12, 'B': 1e9, 'M': 1e6, 'K': 1e3}
+        for suffix, multiplier in multipliers.items():
+            if value_str.endswith(suffix):
+                return float(value_str[:-1]) * multiplier
+
+        # Try direct conversion
+        return float(value_str)
+    except (ValueError, AttributeError):
+        return value_str  # Return as string if can't convert
+
+
+def parse_statistics(content, industry=None):
+    """
+    Metrics of a statistics page, keyed by the names of STATISTICS_LABELS.
+
+    Pure function of the page text, so it can run in a ParsePool worker.
+    """
+    soup = parse_html(content)
+    metrics = {"industry": industry}
+
+    # Find all table rows
+    rows = soup.find_all('tr')
+
+    for row in rows:
+        cells = row.find_all('td')
+        if len(cells) < 2:
+            continue
+
+        # Get the label (first cell)
+        label_cell = cells[0]
+        label = label_cell.get_text(strip=True)
+
+        # Get the value (last cell, usually has title attribute with full value)
+        value_cell = cells[-1]
+        value = value_cell.get('title') or value_cell.get_text(strip=True)
+
+        # Parse the value
+        parsed_value = parse_value(value)
+
+        # Store the value if we have a mapping for this label
+        metric_key = STATISTICS_LABELS.get(label)
+        if metric_key:
+            metrics[metric_key] = parsed_value
+    return metrics
+
 
 class Ratio_Scraper_Fixed():
-    def __init__(self):
+    def __init__(self, base_url=STOCKANALYSIS_URL, rate_limiter=None, delay_range=(0, 0), fetch_prices=True,
+                 parse_pool=None):
+        """
+        Args:
+            base_url (str): Site root, replaced by a local mock server in benchmarks
+            rate_limiter (optional): Per-host pacing passed to fetch_url, defaults to RATE_BUDGET
+            delay_range (tuple): Seconds (min, max) slept between tickers in get_company_metrics on top of
+                the adaptive per-host rate of RATE_BUDGET (none by default)
+            fetch_prices (bool): Add the yfinance quote in get_company_metrics
+            parse_pool (ParsePool, optional): Parse pages in worker processes instead of this thread
+        """
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.delay_range = delay_range
+        self.parse_pool = parse_pool
+        self.fetch_prices = fetch_prices
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)'
                           ' Chrome/91.0.4472.124 Safari/537.36'
@@ -14,184 +192,73 @@ class Ratio_Scraper_Fixed():
 
     def parse_value(self, value_str):
         """Parse a value string from the website into a numeric value"""
-        if not value_str or value_str == 'n/a' or value_str == '-':
-            return None
-
-        # Remove currency symbols and commas
-        value_str = value_str.replace('$', '').replace(',', '').strip()
+        return parse_value(value_str)
 
-        try:
-            # Handle percentage
-            if '%' in value_str:
-                return float(value_str.replace('%', ''))
-
-            # Handle billions/millions/trillions
-            multipliers = {'T': 1e12, 'B': 1e9, 'M': 1e6, 'K': 1e3}
-            for suffix, multiplier in multipliers.items():
-                if value_str.endswith(suffix):
-                    return float(value_str[:-1]) * multiplier
-
-            # Try direct conversion
-            return float(value_str)
-        except (ValueError, AttributeError):
-            return value_str  # Return as string if can't convert
-
-    def extract_ticker_metrics(self, ticker, industry=None):
+    @instrument_extractor('statistics')
+    def extract_ticker_metrics(self, ticker, industry=None, include_price=True):
         """
         Extract financial metrics for a given ticker symbol by parsing HTML tables.
+
+        With include_price=False the yfinance quote is skipped, so callers can
+        fetch it concurrently with get_current_price.
         """
-        url = f"https://stockanalysis.com/stocks/{ticker}/statistics/"
-        response = fetch_url(url, self.headers)
+        url = f"{self.base_url}/stocks/{ticker}/statistics/"
+        response = fetch_url(url, self.headers, rate_limiter=self.rate_limiter)
 
         if not response:
             print(f"Failed to fetch data for {ticker}")
             return None
 
-        soup = parse_html(response.text)
-        metrics = {"industry": industry}
-
-        # Find all table rows
-        rows = soup.find_all('tr')
-
-        for row in rows:
-            cells = row.find_all('td')
-            if len(cells) < 2:
-                continue
-
-            # Get the label (first cell)
-            label_cell = cells[0]
-            label = label_cell.get_text(strip=True)
-
-            # Get the value (last cell, usually has title attribute with full value)
-            value_cell = cells[-1]
-            value = value_cell.get('title') or value_cell.get_text(strip=True)
-
-            # Parse the value
-            parsed_value = self.parse_value(value)
-
-            # Map common labels to metric keys (based on your original ratio_names)
-            label_mapping = {
-                'Market Cap': 'marketcap',
-                'Enterprise Value': 'enterpriseValue',
-                'Earnings Date': 'earningsdate',
-                'Ex-Dividend Date': 'exdivdate',
-                'Current Share Class': 'sharesOutClass',
-                'Shares Outstanding': 'sharesout',
-                'Shares Change (YoY)': 'sharesgrowthyoy',
-                'Shares Change (QoQ)': 'sharesgrowthqoq',
-                'Shares Held by Insiders': 'sharesInsiders',
-                'Shares Held by Institutions': 'sharesInstitutions',
-                'Float': 'float',
-                'PE Ratio': 'pe',
-                'Forward PE': 'peForward',
-                'PS Ratio': 'ps',
-                'Forward PS': 'psForward',
-                'PB Ratio': 'pb',
-                'Price to Tangible Book': 'ptbvRatio',
-                'Price to Free Cash Flow': 'pfcf',
-                'Price to Operating Cash Flow': 'pocf',
-                'PEG Ratio': 'pegRatio',
-                'EV / Earnings': 'evEarnings',
-                'EV / Sales': 'evSales',
-                'EV / EBITDA': 'evEbitda',
-                'EV / EBIT': 'evEbit',
-                'EV / FCF': 'evFcf',
-                'Current Ratio': 'currentRatio',
-                'Quick Ratio': 'quickRatio',
-                'Debt / Equity': 'debtEquity',
-                'Debt / EBITDA': 'debtEbitda',
-                'Debt / FCF': 'debtFcf',
-                'Interest Coverage': 'interestCoverage',
-                'ROE': 'roe',
-                'ROA': 'roa',
-                'ROIC': 'roic',
-                'ROCE': 'roce',
-                'Revenue per Employee': 'revPerEmployee',
-                'Profit per Employee': 'profitPerEmployee',
-                'Employees': 'employees',
-                'Asset Turnover': 'assetturnover',
-                'Inventory Turnover': 'inventoryturnover',
-                'Tax Rate': 'taxrate',
-                'Beta': 'beta',
-                '52-Week Change': 'ch1y',
-                '50-Day MA': 'sma50',
-                '200-Day MA': 'sma200',
-                'RSI': 'rsi',
-                'Average Volume': 'averageVolume',
-                'Short Interest': 'shortInterest',
-                'Short Interest (Prior Month)': 'shortPriorMonth',
-                'Short % of Shares Out': 'shortShares',
-                'Short % of Float': 'shortFloat',
-                'Short Ratio': 'shortRatio',
-                'Revenue': 'revenue',
-                'Gross Profit': 'gp',
-                'Operating Income': 'opinc',
-                'Pretax Income': 'pretax',
-                'Net Income': 'netinc',
-                'EBITDA': 'ebitda',
-                'EBIT': 'ebit',
-                'EPS (Diluted)': 'eps',
-                'Total Cash': 'totalcash',
-                'Total Debt': 'debt',
-                'Net Cash / Debt': 'netcash',
-                'Book Value per Share': 'bvps',
-                'Working Capital': 'workingcapital',
-                'Operating Cash Flow': 'ncfo',
-                'Capital Expenditures': 'capex',
-                'Free Cash Flow': 'fcf',
-                'FCF per Share': 'fcfps',
-                'Gross Margin': 'grossMargin',
-                'Operating Margin': 'operatingMargin',
-                'Pretax Margin': 'pretaxMargin',
-                'Profit Margin': 'profitMargin',
-                'EBITDA Margin': 'ebitdaMargin',
-                'EBIT Margin': 'ebitMargin',
-                'FCF Margin': 'fcfMargin',
-                'Dividend per Share': 'dps',
-                'Dividend Yield': 'dividendYield',
-                'Dividend Growth': 'dividendGrowth',
-                'Years of Dividend Growth': 'dividendGrowthYears',
-                'Payout Ratio': 'payoutRatio',
-                'Buyback Yield': 'buybackYield',
-                'Total Shareholder Return': 'totalReturn',
-                'Earnings Yield': 'earningsYield',
-                'FCF Yield': 'fcfYield',
-                'Price Target': 'priceTarget',
-                'Analyst Ratings': 'analystRatings',
-                'Number of Analysts': 'analystCount',
-                'Revenue Growth Forecast (5Y)': 'revenue5y',
-                'EPS Growth Forecast (5Y)': 'eps5y',
-            }
-
-            # Store the value if we have a mapping for this label
-            metric_key = label_mapping.get(label)
-            if metric_key:
-                metrics[metric_key] = parsed_value
+        metrics = run_parser(self.parse_pool, parse_statistics, response.text, industry)
 
         # Also get current stock price from yfinance
+        if include_price:
+            metrics['currentPrice'] = self.get_current_price(ticker)
+
+        print(f"Extracted {len(metrics)} metrics for {ticker}")
+        return metrics
+
+    @instrument_extractor('quote')
+    def get_current_price(self, ticker):
+        """Current stock price from yfinance, or None if the quote is unavailable"""
+        import yfinance as yf
+
+        # yfinance requests go through its own session, pace them against the shared budget
+        RATE_BUDGET.wait(YFINANCE_QUOTE_URL)
+        # .info cannot be interrupted, do not start it for a task already past its deadline
+        checkpoint()
+        started = time.perf_counter()
         try:
-            ticker_obj = yf.Ticker(ticker)
-            stock_info = ticker_obj.info
-            metrics['currentPrice'] = stock_info.get('regularMarketPrice') or stock_info.get('currentPrice')
+            stock_info = yf.Ticker(ticker).info
         except Exception as e:
             print(f"Warning: Could not get current price for {ticker}: {e}")
-            metrics['currentPrice'] = None
+            # Only yfinance's rate limit error says anything about the request rate
+            if type(e).__name__ == 'YFRateLimitError':
+                RATE_BUDGET.observe(YFINANCE_QUOTE_URL, 429, time.perf_counter() - started)
+            return None
+        RATE_BUDGET.observe(YFINANCE_QUOTE_URL, 200, time.perf_counter() - started)
+        return stock_info.get('regularMarketPrice') or stock_info.get('currentPrice')
 
-        print(f"Extracted {len(metrics)} metrics for {ticker}")
-        return metrics
+    def scrape_ticker(self, ticker, industry=None):
+        """Metrics of one ticker as stored in the ratio snapshot, or None"""
+        return self.extract_ticker_metrics(ticker, industry, self.fetch_prices)
+
+    def get_company_metrics(self, stock_list=STOCK_LIST, task_budget=TASK_BUDGET_SECONDS):
+        """Get financial metrics for all companies in the stock list, each ticker under a task_budget deadline"""
+        # A ticker listed under several industries is fetched once, tagged with the first
+        tickers = unique_tickers(stock_list)
+        return scrape_guarded(tickers, lambda ticker: self.scrape_ticker(ticker, tickers[ticker]), 'ratio',
+                              budget=task_budget,
+                              # Wait to avoid rate limiting
+                              pause=lambda: paced_sleep(random.uniform(*self.delay_range)))
+
+    def write_snapshot(self, data):
+        """Write the collected data as today's ratio snapshot and return its path"""
+        path = snapshot_path('ratio', 'stock_list_metrics', self.current_date)
+        write_typed_snapshot('ratio', path, data)
+        print(f"Saved {len(data)} tickers to {path}")
+        return path
 
-    def get_company_metrics(self):
-        """Get financial metrics for all companies in STOCK_LIST"""
-        all_companies_metrics = {}
-        for industry, companies in STOCK_LIST.items():
-            for company in companies:
-                print(f"Fetching data for {company}...")
-                metrics = self.extract_ticker_metrics(company, industry)
-                if metrics:
-                    all_companies_metrics[company] = metrics
-                # Wait to avoid rate limiting
-                time.sleep(random.uniform(10, 30))
-        return all_companies_metrics
 
 if __name__ == "__main__":
     scraper = Ratio_Scraper_Fixed()
@@ -205,5 +272,5 @@ if __name__ == "__main__":
 
     # Uncomment below to run for all stocks
     all_metrics = scraper.get_company_metrics()
-    with open(f'../data/ratio/stock_list_metrics_{scraper.current_date}.json', 'w') as f:
-        json.dump(all_metrics, f, indent=2)
+    scraper.write_snapshot(all_metrics)
+    RECORDER.write('ratio')
@@ -0,0 +1,322 @@
+"""
+Compact resident storage of the loaded snapshots.
+
+Loaded as plain JSON, every ratio record is a dict of ~100 string keys with a
+float object per value, and every forecast record a tree of dicts and mostly
+empty lists. At 10k+ tickers that is millions of small objects for the garbage
+collector to walk. The analyzer keeps them in these types instead:
+
+    RecordTable      ratio data, struct-of-arrays: one array('d') per float
+                     field of the schema (NaN for None), a list per text/date
+                     field; tickers map to a row and read through RatioRecord
+    ForecastRecord   __slots__ record of one forecast, its annual values and
+                     per-year metrics packed in one float array
+
+Both read like the dicts they replace (record.get('pe'), forecast.get('annual'),
+ticker in table, table[ticker] = record for overlays), so code written against
+snapshot dicts keeps working; to_dict() gives the snapshot record back.
+"""
+
+import math
+import sys
+from array import array
+from collections.abc import Mapping, MutableMapping
+
+from snapshot_schema import FORECAST_ANNUAL_SCHEMA, FORECAST_METRIC_SCHEMA, RATIO_SCHEMA
+
+RATIO_FLOAT_FIELDS = frozenset(name for name, field in RATIO_SCHEMA.items() if field.kind == 'float')
+ANNUAL_FIELDS = tuple(FORECAST_ANNUAL_SCHEMA)
+ANNUAL_INDEX = {field: index for index, field in enumerate(ANNUAL_FIELDS)}
+YEAR_METRICS = tuple(FORECAST_METRIC_SCHEMA)
+
+
+def _pack(value):
+    return math.nan if value is None else value
+
+
+def _unpack(value):
+    # Coerced snapshots store missing floats as None, never NaN
+    return None if value != value else value
+
+
+def _float_array(values):
+    """array('d') of the values, None when one of them is not a number"""
+    packed = [_pack(value) for value in values]
+    if any(isinstance(value, bool) or not isinstance(value, (int, float)) for value in packed):
+        return None
+    return array('d', packed)
+
+
+def _intern(value):
+    # Industry names, dates and ratings repeat across thousands of tickers
+    return sys.intern(value) if type(value) is str else value
+
+
+class RatioRecord(Mapping):
+    """Read-only view of one ticker's row in a RecordTable"""
+
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __getitem__(self, key):
+        value = self.table.columns[key][self.row]
+        return _unpack(value) if key in self.table.float_columns else value
+
+    def get(self, key, default=None):
+        column = self.table.columns.get(key)
+        if column is None:
+            return default
+        value = column[self.row]
+        return _unpack(value) if key in self.table.float_columns else value
+
+    def __iter__(self):
+        return iter(self.table.columns)
+
+    def __len__(self):
+        return len(self.table.columns)
+
+    def to_dict(self):
+        return {key: self[key] for key in self.table.columns}
+
+    def __repr__(self):
+        return f"RatioRecord({self.to_dict()!r})"
+
+
+class RecordTable(MutableMapping):
+    """
+    Ticker -> flat record, stored column by column.
+
+    Every row has every column; a record missing a field reads it as None,
+    like a snapshot coerced through the schema.
+
+    Args:
+        float_fields (iterable): Fields stored as array('d') while all their values are numbers
+    """
+
+    def __init__(self, float_fields=RATIO_FLOAT_FIELDS):
+        self.float_fields = frozenset(float_fields)
+        self.float_columns = set()
+        self.columns = {}
+        self.rows = {}
+        self.tickers = []
+
+    @classmethod
+    def from_records(cls, data, float_fields=RATIO_FLOAT_FIELDS):
+        """Table of a loaded snapshot (ticker -> record dict)"""
+        table = cls(float_fields)
+        table.tickers = list(data)
+        table.rows = {ticker: row for row, ticker in enumerate(table.tickers)}
+        fields = dict.fromkeys(key for record in data.values() for key in record)
+        for field in fields:
+            values = [record.get(field) for record in data.values()]
+            table._add_column(field, values)
+        return table
+
+    @classmethod
+    def from_columns(cls, tickers, columns):
+        """Table of numeric columns (field -> float sequence, NaN for None), one value per ticker"""
+        import numpy as np
+
+        table = cls(columns)
+        table.tickers = list(tickers)
+        table.rows = {ticker: row for row, ticker in enumerate(table.tickers)}
+        for field, values in columns.items():
+            table.columns[field] = array('d', np.ascontiguousarray(values, dtype='float64').tobytes())
+            table.float_columns.add(field)
+        return table
+
+    def _add_column(self, field, values):
+        column = _float_array(values) if field in self.float_fields else None
+        if column is None:
+            self.float_columns.discard(field)
+            column = [_intern(value) for value in values]
+        else:
+            self.float_columns.add(field)
+        self.columns[field] = column
+
+    def _set_value(self, field, row, value):
+        column = self.columns[field]
+        if field in self.float_columns:
+            if isinstance(value, bool) or not isinstance(_pack(value), (int, float)):
+                # A value the schema could not coerce: keep the column as objects
+                self._add_column(field, [_unpack(stored) for stored in column])
+                column = self.columns[field]
+            else:
+                value = _pack(value)
+        column[row] = _intern(value)
+
+    def __getitem__(self, ticker):
+        return RatioRecord(self, self.rows[ticker])
+
+    def __setitem__(self, ticker, record):
+        row = self.rows.get(ticker)
+        if row is None:
+            row = self.rows[ticker] = len(self.tickers)
+            self.tickers.append(ticker)
+            for field, column in self.columns.items():
+                column.append(math.nan if field in self.float_columns else None)
+        for field in record:
+            if field not in self.columns:
+                self._add_column(field, [None] * len(self.tickers))
+        for field in self.columns:
+            self._set_value(field, row, record.get(field))
+
+    def __delitem__(self, ticker):
+        # The row stays allocated, unreachable
+        row = self.rows.pop(ticker)
+        self.tickers[row] = None
+
+    def __contains__(self, ticker):
+        return ticker in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def frame(self):
+        """
+        DataFrame indexed by ticker, float64 for the float columns and object
+        for the others, as pd.DataFrame.from_dict would build from the records.
+        """
+        import numpy as np
+        import pandas as pd
+
+        rows = list(self.rows.values())
+        columns = {}
+        for field, column in self.columns.items():
+            if field in self.float_columns:
+                columns[field] = np.array(column, dtype='float64')[rows]
+            else:
+                columns[field] = [column[row] for row in rows]
+        return pd.DataFrame(columns, index=list(self.rows))
+
+
+class ForecastRecord:
+    """
+    One ticker's forecast, as stored in a forecast snapshot.
+
+    values holds ANNUAL_FIELDS, then YEAR_METRICS for each fiscal year in
+    years, NaN for None. quarterly is (((metric, length), ...), values) with
+    the series concatenated; the all-empty one the scraper writes is shared.
+    """
+
+    __slots__ = ('values', 'years', 'quarterly')
+
+    _empty_quarterly = {}
+
+    def __init__(self, values, years, quarterly):
+        self.values = values
+        self.years = years
+        self.quarterly = quarterly
+
+    @classmethod
+    def from_dict(cls, record):
+        """Compact record, or None when the record has fields this layout does not hold"""
+        if not isinstance(record, dict) or not set(record) <= {'annual', 'annual_by_year', 'quarterly'}:
+            return None
+        annual = record.get('annual')
+        if annual is None or set(annual) - set(ANNUAL_FIELDS):
+            return None
+        values = [annual.get(field) for field in ANNUAL_FIELDS]
+
+        years = None
+        if 'annual_by_year' in record:
+            by_year = record['annual_by_year']
+            if any(set(metrics) - set(YEAR_METRICS) for metrics in by_year.values()):
+                return None
+            years = tuple(sys.intern(year) for year in by_year)
+            # A metric missing from a year reads back as None
+            values += [metrics.get(metric) for metrics in by_year.values() for metric in YEAR_METRICS]
+        values = _float_array(values)
+
+        quarterly = None
+        if 'quarterly' in record:
+            series = record['quarterly']
+            layout = tuple((sys.intern(metric), len(points)) for metric, points in series.items())
+            if any(length for _, length in layout):
+                packed = _float_array(point for points in series.values() for point in points)
+                quarterly = None if packed is None else (layout, packed)
+            else:
+                quarterly = cls._empty_quarterly.setdefault(layout, (layout, array('d')))
+            if quarterly is None:
+                return None
+
+        if values is None:
+            return None
+        return cls(values, years, quarterly)
+
+    def for_year(self, year):
+        """YEAR_METRICS of one fiscal year, empty if the year is not stored"""
+        if self.years is None:
+            return {}
+        try:
+            index = self.years.index(str(year))
+        except ValueError:
+            return {}
+        start = len(ANNUAL_FIELDS) + index * len(YEAR_METRICS)
+        return dict(zip(YEAR_METRICS, map(_unpack, self.values[start:start + len(YEAR_METRICS)])))
+
+    def annual_get(self, field, default=None):
+        """One value of the annual record, like get('annual').get(field)"""
+        index = ANNUAL_INDEX.get(field)
+        return default if index is None else _unpack(self.values[index])
+
+    def get(self, key, default=None):
+        if key == 'annual':
+            return dict(zip(ANNUAL_FIELDS, map(_unpack, self.values[:len(ANNUAL_FIELDS)])))
+        if key == 'annual_by_year' and self.years is not None:
+            return {year: self.for_year(year) for year in self.years}
+        if key == 'quarterly' and self.quarterly is not None:
+            layout, packed = self.quarterly
+            series, start = {}, 0
+            for metric, length in layout:
+                series[metric] = [_unpack(value) for value in packed[start:start + length]]
+                start += length
+            return series
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def to_dict(self):
+        return {key: self.get(key) for key in ('annual', 'annual_by_year', 'quarterly') if key in self}
+
+    def __repr__(self):
+        return f"ForecastRecord({self.to_dict()!r})"
+
+
+class ForecastTable(dict):
+    """Ticker -> ForecastRecord; records that do not fit the layout are kept as dicts"""
+
+    def __init__(self, data=None):
+        super().__init__()
+        for ticker, record in (data or {}).items():
+            self[ticker] = record
+
+    def __setitem__(self, ticker, record):
+        super().__setitem__(ticker, ForecastRecord.from_dict(record) or record)
+
+
+def compact_snapshot(kind, data):
+    """Resident form of a loaded snapshot: RecordTable for ratio, ForecastTable for forecast, data otherwise"""
+    if kind == 'ratio':
+        return RecordTable.from_records(data)
+    if kind == 'forecast':
+        return ForecastTable(data)
+    return data
+
+
+def plain(record):
+    """Snapshot form of a record, whichever way it is stored"""
+    return record.to_dict() if hasattr(record, 'to_dict') else record
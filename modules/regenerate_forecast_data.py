@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
 """Regenerate forecast data using the WORKING scraper"""
 
-from forecast_scraper_working import Forecast_Scraper_Working
-import json
+from forecast_scraper import Forecast_Scraper_Working
 
 print("="*70)
 print("Regenerating Forecast Data with Working Scraper")
@@ -21,10 +20,7 @@ scraper = Forecast_Scraper_Working()
 print("\nStarting data collection...")
 all_forecasts = scraper.get_company_metrics()
 
-output_file = f'../data/forecast/stock_list_forecasts_{scraper.current_date}.json'
-
-with open(output_file, 'w') as f:
-    json.dump(all_forecasts, f, indent=2)
+output_file = scraper.write_snapshot(all_forecasts)
 
 print(f"\n{'='*70}")
 print(f"✓ Data saved to: {output_file}")
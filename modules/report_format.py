@@ -0,0 +1,60 @@
+import math
+
+# Presentation formats for the typed valuation table. The analyzer produces
+# floats in natural units (percent values in percent, market cap in billions);
+# formatting for Excel, HTML or console output happens only here.
+DISPLAY_FORMATS = {
+    'number': '{:,.2f}',
+    'percent': '{:.2f}%',
+    'percent_int': '{:.0f}%',
+    'billions': '{:,.2f}B',
+}
+
+EXCEL_NUM_FORMATS = {
+    'number': '#,##0.##',
+    'percent': '0.##"%"',
+    'percent_int': '0"%"',
+    'billions': '#,##0.00"B"',
+}
+
+MISSING_DISPLAY = "N/A"
+
+
+def metric_format_key(metric):
+    """Pick the presentation format of a valuation metric from its name"""
+    if metric == '市值':
+        return 'billions'
+    if metric.endswith('估值') or metric in ('Industry', 'Company'):
+        return 'text'
+    if '相差百分比' in metric:
+        return 'percent_int'
+    if 'Revision' in metric:
+        # Revision velocity/momentum are changes in points, not growth rates
+        return 'number'
+    if any(token in metric for token in ('百分位', 'Growth', 'QoQ')):
+        return 'percent'
+    return 'number'
+
+
+def format_value(metric, value):
+    """
+    Format one typed value for display.
+
+    Args:
+        metric (str): Column name in the valuation table
+        value: Typed value (float, NaN, flag string or None)
+
+    Returns:
+        str: Display string, 'N/A' for missing values
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return MISSING_DISPLAY
+    format_key = metric_format_key(metric)
+    if format_key == 'text' or not isinstance(value, (int, float)):
+        return str(value)
+    return DISPLAY_FORMATS[format_key].format(value)
+
+
+def format_record(record):
+    """Format every value of a company record for display"""
+    return {metric: format_value(metric, value) for metric, value in record.items()}
@@ -0,0 +1,216 @@
+import glob
+import json
+import os
+import re
+from datetime import date
+
+from paths import data_path
+
+REVISION_STATE_PATH = data_path('revisions', 'revision_state.json')
+# Saved states of another version are rebuilt from the snapshots
+STATE_VERSION = 2
+
+# Snapshot glob and the estimate fields tracked from it.
+# 'relative' fields are revised in percent of the previous estimate,
+# 'points' fields are already percentages and are revised in percentage points.
+# Forecast fields are tracked per fiscal year of annual_by_year ('eps_2026'), so a
+# rollover of the current/next year columns never compares two different years.
+TRACKED_DATASETS = {
+    'forecast': {
+        'pattern': data_path('forecast', 'stock_list_forecasts_*.json'),
+        'fields': {
+            'eps': 'relative',
+            'revenue': 'relative',
+        },
+        'by_fiscal_year': True,
+    },
+    'ratio': {
+        'pattern': data_path('ratio', 'stock_list_metrics_*.json'),
+        'fields': {
+            'eps5y': 'points',
+            'revenue5y': 'points',
+        },
+    },
+}
+
+# Momentum halves every MOMENTUM_HALF_LIFE days without a new revision
+MOMENTUM_HALF_LIFE = 30.0
+
+
+def snapshot_date(path):
+    """Extract the snapshot date (YYYY-MM-DD) from a snapshot file name"""
+    match = re.search(r'(\d{4}-\d{2}-\d{2})', os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def _days_between(start, end):
+    return (date.fromisoformat(end) - date.fromisoformat(start)).days
+
+
+def fiscal_year_field(metric, year):
+    """Series name of a forecast metric for one fiscal year, e.g. 'eps_2026'"""
+    return f"{metric}_{year}"
+
+
+def _field_values(dataset, record):
+    """
+    (series name, kind, value) of the tracked fields of one snapshot record.
+
+    Forecast records without annual_by_year do not say which fiscal year their
+    values are for and are skipped.
+    """
+    config = TRACKED_DATASETS[dataset]
+    if config.get('by_fiscal_year'):
+        return [(fiscal_year_field(metric, year), kind, metrics.get(metric))
+                for year, metrics in (record.get('annual_by_year') or {}).items()
+                for metric, kind in config['fields'].items()]
+    return [(field, kind, record.get(field)) for field, kind in config['fields'].items()]
+
+
+class EstimateRevisionTracker:
+    """
+    Running per-ticker series of analyst estimates across snapshots.
+
+    Only snapshots that have not been seen before are read, and only tickers whose
+    estimate actually changed are touched, so landing a new snapshot costs
+    O(changed tickers) rather than a rescan of the whole history.
+    """
+
+    def __init__(self, state=None, state_path=REVISION_STATE_PATH):
+        if not state or state.get('version') != STATE_VERSION:
+            state = {}
+        self.state_path = state_path
+        self.snapshots = state.get('snapshots', {dataset: [] for dataset in TRACKED_DATASETS})
+        # ticker -> field -> [(date, value), ...]; tuples of atomic values are left alone by the GC
+        self.series = {ticker: {field: [tuple(point) for point in history] for field, history in fields.items()}
+                       for ticker, fields in state.get('series', {}).items()}
+        # ticker -> field -> {'date', 'revision', 'velocity', 'momentum'}
+        self.metrics = state.get('metrics', {})
+
+    @classmethod
+    def load(cls, state_path=REVISION_STATE_PATH):
+        """Load the tracker state, or start an empty tracker if none was saved yet"""
+        if os.path.exists(state_path):
+            with open(state_path, 'r') as f:
+                return cls(json.load(f), state_path)
+        return cls(state_path=state_path)
+
+    def save(self):
+        """Persist the tracker state"""
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': STATE_VERSION, 'snapshots': self.snapshots, 'series': self.series,
+                       'metrics': self.metrics}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def sync(self):
+        """
+        Apply every snapshot that has landed since the last sync, oldest first.
+
+        Returns:
+            set: Tickers whose estimates were revised.
+        """
+        changed = set()
+        applied = False
+        for dataset, config in TRACKED_DATASETS.items():
+            seen = set(self.snapshots.setdefault(dataset, []))
+            new_files = [path for path in glob.glob(config['pattern'])
+                         if os.path.basename(path) not in seen and snapshot_date(path)]
+            for path in sorted(new_files, key=snapshot_date):
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                changed |= self.update(dataset, snapshot_date(path), data)
+                self.snapshots[dataset].append(os.path.basename(path))
+                applied = True
+
+        if applied:
+            self.save()
+        return changed
+
+    def update(self, dataset, as_of, data):
+        """
+        Fold one snapshot into the running series.
+
+        Args:
+            dataset (str): 'forecast' or 'ratio'.
+            as_of (str): Snapshot date, YYYY-MM-DD.
+            data (dict): Ticker -> record, as stored in the snapshot file.
+
+        Returns:
+            set: Tickers with at least one revised estimate.
+        """
+        changed = set()
+
+        for ticker, record in data.items():
+            for field, kind, value in _field_values(dataset, record):
+                if not isinstance(value, (int, float)):
+                    continue
+
+                ticker_series = self.series.setdefault(ticker, {})
+                history = ticker_series.get(field)
+                if not history:
+                    ticker_series[field] = [(as_of, value)]
+                    continue
+
+                last_date, last_value = history[-1]
+                if value == last_value or as_of <= last_date:
+                    continue
+
+                history.append((as_of, value))
+                self._update_metrics(ticker, field, kind, last_date, last_value, as_of, value)
+                changed.add(ticker)
+
+        return changed
+
+    def _update_metrics(self, ticker, field, kind, last_date, last_value, as_of, value):
+        """Update revision, velocity and decayed momentum for one changed estimate"""
+        if kind == 'points':
+            revision = value - last_value
+        elif last_value:
+            revision = (value - last_value) / abs(last_value) * 100
+        else:
+            return
+
+        days = max(_days_between(last_date, as_of), 1)
+        previous = self.metrics.get(ticker, {}).get(field)
+        momentum = revision
+        if previous:
+            elapsed = _days_between(previous['date'], as_of)
+            momentum += previous['momentum'] * 0.5 ** (elapsed / MOMENTUM_HALF_LIFE)
+
+        self.metrics.setdefault(ticker, {})[field] = {
+            'date': as_of,
+            'revision': round(revision, 4),
+            'velocity': round(revision / days * 30, 4),
+            'momentum': round(momentum, 4),
+        }
+
+    @property
+    def latest_date(self):
+        """Date of the newest snapshot folded into the tracker"""
+        dates = [snapshot_date(name) for names in self.snapshots.values() for name in names]
+        return max(dates) if dates else date.today().isoformat()
+
+    def get_revision(self, ticker, field, as_of=None):
+        """
+        Latest revision statistics for a ticker's estimate.
+
+        Args:
+            ticker (str): The stock ticker symbol.
+            field (str): Tracked estimate field, e.g. 'eps5y' or fiscal_year_field('eps', 2026).
+            as_of (str, optional): Date the momentum is decayed to, defaults to the newest snapshot.
+
+        Returns:
+            dict or None: {'revision', 'velocity' (per 30 days), 'momentum', 'date'}
+        """
+        entry = self.metrics.get(ticker, {}).get(field)
+        if not entry:
+            return None
+
+        as_of = as_of or self.latest_date
+        elapsed = max(_days_between(entry['date'], as_of), 0)
+        return {
+            **entry,
+            'momentum': round(entry['momentum'] * 0.5 ** (elapsed / MOMENTUM_HALF_LIFE), 4),
+        }
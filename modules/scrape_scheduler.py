@@ -0,0 +1,288 @@
+"""
+Priority and deadline-aware scheduling of scrape tasks.
+
+Every (ticker, dataset) task gets a priority from
+
+    watchlist   held names (universes/watchlist.*, or --watchlist)     +WATCHLIST_PRIORITY
+    earnings    earningsdate of the latest ratio data within EARNINGS_WINDOW_DAYS,
+                scaled up as the date gets closer                       up to +EARNINGS_PRIORITY
+    data age    days since the ticker's record was last scraped or
+                refreshed, never scraped counts as the cap              up to +AGE_PRIORITY_CAP
+
+Watchlist names and names reporting within DEADLINE_EARNINGS_DAYS also get a
+deadline (by default the next US market open). Tasks run earliest deadline
+first, then by priority; low priority names take whatever is left of each
+host's RATE_BUDGET once the urgent ones are dispatched. Deadline results are
+written as overlays as soon as they arrive, so the analyzer sees them before
+the full snapshot is assembled.
+
+Every task runs under its own wall-clock budget (see task_deadline); a task that
+errors or runs out of time is recorded with the reason and queued again behind
+the rest of its host's tasks.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import date, datetime, timedelta
+from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
+
+from overlay import OVERLAY_DIR, write_overlay
+from snapshot_schema import coerce_snapshot, read_snapshot
+from task_deadline import TASK_BUDGET_SECONDS, FailureLog, run_guarded
+from universe import available_universes, load_universe, unique_tickers
+
+WATCHLIST_UNIVERSE = 'watchlist'
+WATCHLIST_PRIORITY = 100
+EARNINGS_PRIORITY = 60
+EARNINGS_WINDOW_DAYS = 7
+DEADLINE_EARNINGS_DAYS = 1
+AGE_PRIORITY_PER_DAY = 5
+AGE_PRIORITY_CAP = 50
+
+MARKET_TIMEZONE = 'America/New_York'
+MARKET_OPEN = '09:30'
+
+# Datasets the analyzer layers overlays for (see overlay.apply_overlays)
+OVERLAY_DATASETS = ('ratio', 'forecast', 'pe')
+
+ScheduledTask = namedtuple('ScheduledTask', ['ticker', 'dataset', 'industry', 'priority', 'deadline', 'reasons'])
+
+
+def next_deadline(clock_time=MARKET_OPEN, timezone=MARKET_TIMEZONE, now=None):
+    """
+    Next weekday occurrence of a wall clock time in a timezone.
+
+    Args:
+        clock_time (str): 'HH:MM'
+        timezone (str): IANA timezone name, US/Eastern by default
+        now (float, optional): Epoch seconds, defaults to the current time
+
+    Returns:
+        float: Deadline as epoch seconds
+    """
+    hour, minute = (int(part) for part in clock_time.split(':'))
+    zone = ZoneInfo(timezone)
+    current = datetime.fromtimestamp(time.time() if now is None else now, zone)
+    deadline = current.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    while deadline <= current or deadline.weekday() >= 5:
+        deadline = (deadline + timedelta(days=1)).replace(hour=hour, minute=minute)
+    return deadline.timestamp()
+
+
+def load_watchlist(sources=None):
+    """Tickers of the watchlist universe(s); empty when none is given and universes/ has no watchlist"""
+    if sources is None:
+        if WATCHLIST_UNIVERSE not in available_universes():
+            return set()
+        sources = [WATCHLIST_UNIVERSE]
+    return set(unique_tickers(load_universe(sources)))
+
+
+def _latest_snapshot(dataset):
+    """(path, data) of the newest snapshot of a dataset, (None, {}) if there is none"""
+    from valuation_analyzer import SNAPSHOT_PATTERNS
+
+    files = glob.glob(SNAPSHOT_PATTERNS[dataset])
+    if not files:
+        return None, {}
+    path = max(files, key=os.path.getmtime)
+    if dataset == 'ratio':
+        return path, read_snapshot('ratio', path)
+    with open(path, 'r') as f:
+        return path, json.load(f)
+
+
+def last_refreshed(datasets):
+    """
+    When each ticker's record of each dataset was last written.
+
+    Returns:
+        tuple: (dataset -> ticker -> epoch seconds, latest ratio snapshot data)
+    """
+    refreshed = {dataset: {} for dataset in datasets}
+    ratio_data = {}
+    for dataset in datasets:
+        path, data = _latest_snapshot(dataset)
+        if dataset == 'ratio':
+            ratio_data = data
+        if path:
+            mtime = os.path.getmtime(path)
+            refreshed[dataset] = dict.fromkeys(data, mtime)
+
+    for path in glob.glob(os.path.join(OVERLAY_DIR, '*.json')):
+        ticker = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'r') as f:
+            overlay = json.load(f)
+        for dataset, entry in overlay.items():
+            if dataset in refreshed and entry['refreshed_at'] > refreshed[dataset].get(ticker, 0):
+                refreshed[dataset][ticker] = entry['refreshed_at']
+
+    if 'ratio' not in datasets:
+        ratio_data = _latest_snapshot('ratio')[1]
+    return refreshed, ratio_data
+
+
+def earnings_days(record, today=None):
+    """Days from today to a ratio record's earnings date, None if unknown"""
+    value = (record or {}).get('earningsdate')
+    if not value:
+        return None
+    try:
+        earnings = date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+    return (earnings - (today or date.today())).days
+
+
+def build_schedule(datasets, stock_list, watchlist=(), deadline=None, now=None):
+    """
+    Prioritise every (ticker, dataset) task of a scrape.
+
+    Args:
+        datasets (list): Dataset names
+        stock_list (dict): Industry -> tickers mapping
+        watchlist (set): Held tickers, always first and due by the deadline
+        deadline (float, optional): Epoch seconds by which urgent tasks should be done
+        now (float, optional): Epoch seconds, defaults to the current time
+
+    Returns:
+        list: ScheduledTask, in the order they should run
+    """
+    now = time.time() if now is None else now
+    today = datetime.fromtimestamp(now).date()
+    refreshed, ratio_data = last_refreshed(datasets)
+
+    tasks = []
+    for ticker, industry in unique_tickers(stock_list).items():
+        base, reasons, urgent = 0.0, [], False
+        if ticker in watchlist:
+            base += WATCHLIST_PRIORITY
+            reasons.append('watchlist')
+            urgent = True
+        days = earnings_days(ratio_data.get(ticker), today)
+        if days is not None and -1 <= days <= EARNINGS_WINDOW_DAYS:
+            # Reported yesterday or today scores the full weight: estimates are being revised
+            base += EARNINGS_PRIORITY * (1 - max(days, 0) / (EARNINGS_WINDOW_DAYS + 1))
+            reasons.append(f"earnings in {days}d")
+            urgent = urgent or days <= DEADLINE_EARNINGS_DAYS
+
+        for dataset in datasets:
+            priority, task_reasons = base, list(reasons)
+            last = refreshed[dataset].get(ticker)
+            if last is None:
+                priority += AGE_PRIORITY_CAP
+                task_reasons.append('never scraped')
+            else:
+                age_days = max(now - last, 0) / 86400
+                priority += min(age_days * AGE_PRIORITY_PER_DAY, AGE_PRIORITY_CAP)
+                task_reasons.append(f"{age_days:.1f}d old")
+            tasks.append(ScheduledTask(ticker, dataset, industry, round(priority, 2),
+                                       deadline if urgent else None, task_reasons))
+
+    tasks.sort(key=lambda task: (task.deadline is None, task.deadline or 0, -task.priority, task.ticker))
+    return tasks
+
+
+class ScheduledScrape:
+    """
+    Run a schedule with a few workers per host, each taking the next task of its host.
+
+    Args:
+        scrapers (dict): Dataset -> scraper with scrape_ticker and write_snapshot
+        workers_per_host (int): Concurrent tasks per host; pacing still comes from RATE_BUDGET
+        options (dict, optional): Dataset -> keyword arguments of scrape_ticker
+        task_budget (float): Wall-clock seconds one attempt of a task may take
+    """
+
+    def __init__(self, scrapers, workers_per_host=2, options=None, task_budget=TASK_BUDGET_SECONDS):
+        self.scrapers = scrapers
+        self.workers_per_host = workers_per_host
+        self.options = options or {}
+        self.task_budget = task_budget
+        self.failures = FailureLog()
+        self._lock = threading.Lock()
+
+    def host(self, dataset):
+        return urlparse(self.scrapers[dataset].base_url).netloc
+
+    def check_feasibility(self, tasks, now=None):
+        """Warn when a host's current rate cannot get its deadline tasks done in time"""
+        from utils import RATE_BUDGET
+
+        now = time.time() if now is None else now
+        for host, host_tasks in self._by_host(tasks).items():
+            due = [task for task in host_tasks if task.deadline is not None]
+            if not due:
+                continue
+            rate = RATE_BUDGET.rate(f"https://{host}/")
+            needed = len(due) / rate
+            available = min(task.deadline for task in due) - now
+            print(f"{host}: {len(due)} deadline tasks need ~{needed / 60:.1f} min at {rate:.2f} req/s, "
+                  f"{available / 60:.1f} min left")
+            if needed > available:
+                print(f"Warning: {host} cannot finish its deadline tasks in time at the current rate")
+
+    def _by_host(self, tasks):
+        queues = {}
+        for task in tasks:
+            queues.setdefault(self.host(task.dataset), deque()).append(task)
+        return queues
+
+    def _work(self, queue, results, missed, attempts):
+        while True:
+            with self._lock:
+                if not queue:
+                    return
+                task = queue.popleft()
+                key = (task.dataset, task.ticker)
+                attempt = attempts[key] = attempts.get(key, 0) + 1
+            print(f"Fetching {task.dataset} data for {task.ticker} (priority {task.priority:g})...")
+            outcome = run_guarded(self.scrapers[task.dataset].scrape_ticker, task.ticker, task.industry,
+                                  budget=self.task_budget, name=f"{task.dataset}-{task.ticker}",
+                                  **self.options.get(task.dataset, {}))
+            record = outcome.result if outcome.reason is None else None
+            retry = outcome.reason is not None and self.failures.record(task.dataset, task.ticker, attempt, outcome)
+            finished = time.time()
+            with self._lock:
+                if retry:
+                    # Behind the rest of the host's tasks, so one bad symbol does not hold up the others
+                    queue.append(task)
+                    continue
+                if record is not None:
+                    results[task.dataset][task.ticker] = record
+                if task.deadline is not None and finished > task.deadline:
+                    missed.append(task)
+            if record is not None and task.deadline is not None and task.dataset in OVERLAY_DATASETS:
+                coerced = coerce_snapshot(task.dataset, {task.ticker: record})[0][task.ticker]
+                write_overlay(task.ticker, {task.dataset: coerced})
+
+    def run(self, tasks):
+        """
+        Scrape every task and write one snapshot per dataset.
+
+        Failed attempts are in self.failures.
+
+        Returns:
+            tuple: (dataset -> snapshot path, list of tasks finished after their deadline)
+        """
+        results = {dataset: {} for dataset in {task.dataset for task in tasks}}
+        missed, attempts = [], {}
+        for dataset, scraper in self.scrapers.items():
+            # The PE scraper resolves missing URL slugs for all its tickers in one go
+            if dataset in results and hasattr(scraper, 'slugs'):
+                scraper.slugs.resolve([task.ticker for task in tasks if task.dataset == dataset])
+        threads = [threading.Thread(target=self._work, args=(queue, results, missed, attempts),
+                                    name=f"{host}-{index}")
+                   for host, queue in self._by_host(tasks).items() for index in range(self.workers_per_host)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        paths = {dataset: self.scrapers[dataset].write_snapshot(data) for dataset, data in results.items()}
+        return paths, missed
@@ -0,0 +1,319 @@
+"""
+Publish the valuation table to named shared memory for other local processes.
+
+Notebooks and dashboards attach to the published table instead of reloading
+the snapshots or parsing the Excel report. Each version is written once into
+its own segment <name>_<generation> and never modified afterwards:
+
+    segment   magic, generation, JSON layout length, JSON layout, then buffers
+              in Arrow layout, 64-byte aligned: float64 columns back to back
+              (together the row x metric matrix, column-major) and text
+              columns as validity bitmap + int32 offsets + UTF-8 data
+    header    <name>: magic, sequence, generation and the current segment's
+              name, updated seqlock-style so readers never see a torn update
+
+Readers map the segment without copying (numpy views over the buffer, or an
+Arrow table when pyarrow is installed) and poll the header's generation to
+learn that a new version is available. The publisher keeps the previous
+segment until the next publish, so a reader that just read the header can
+still attach to it.
+"""
+
+import json
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+DEFAULT_NAME = 'pe_valuation'
+ALIGNMENT = 64
+
+HEADER_MAGIC = b'PEVHDR1\0'
+SEGMENT_MAGIC = b'PEVTBL1\0'
+# magic, sequence (odd while being written), generation, segment name
+HEADER = struct.Struct('8sQQ64s')
+SEQUENCE = struct.Struct('Q')
+SEQUENCE_OFFSET = 8
+# magic, generation, layout length, offset of the first buffer
+SEGMENT_HEADER = struct.Struct('8sQQQ')
+
+
+def _untrack(segment):
+    # The resource tracker would unlink segments when this process exits, while
+    # they should outlive the publisher until the next version replaces them
+    resource_tracker.unregister(segment._name, 'shared_memory')
+
+
+def _attach(name):
+    segment = shared_memory.SharedMemory(name=name)
+    _untrack(segment)
+    return segment
+
+
+def _unlink(name):
+    try:
+        # Attached tracked, so unlink() can unregister it again
+        segment = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _text_buffers(values):
+    """Arrow utf8 buffers of an object column: validity bitmap, int32 offsets, data"""
+    valid = np.array([value is not None and value == value for value in values], dtype=bool)
+    encoded = [str(value).encode('utf-8') if ok else b'' for value, ok in zip(values, valid)]
+    offsets = np.zeros(len(values) + 1, dtype='<i4')
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return {
+        'validity': np.packbits(valid, bitorder='little').tobytes(),
+        'offsets': offsets.tobytes(),
+        'data': b''.join(encoded),
+    }
+
+
+def split_table(table):
+    """(columns, numeric, text) of a typed valuation DataFrame, as ValuationState holds them"""
+    columns = list(table.columns)
+    numeric = {column: table[column].to_numpy(dtype='float64')
+               for column in columns if table[column].dtype == 'float64'}
+    text = {column: table[column].astype(object).to_numpy() for column in columns if column not in numeric}
+    return columns, numeric, text
+
+
+class SharedTablePublisher:
+    """
+    Writes successive versions of the valuation table under one name.
+
+    Args:
+        name (str): Header segment name; versions go to <name>_<generation>
+    """
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        try:
+            self.header = _attach(name)
+            # Continue the generation count of an earlier publisher
+            _, _, self.generation, current = HEADER.unpack_from(self.header.buf)
+            self.current = current.rstrip(b'\0').decode() or None
+            self.previous = f"{name}_{self.generation - 1}" if self.generation > 1 else None
+        except FileNotFoundError:
+            self.header = shared_memory.SharedMemory(name=name, create=True, size=HEADER.size)
+            _untrack(self.header)
+            HEADER.pack_into(self.header.buf, 0, HEADER_MAGIC, 0, 0, b'')
+            self.generation, self.current, self.previous = 0, None, None
+
+    def publish(self, columns, numeric, text, metadata=None):
+        """
+        Write a new version and make it current.
+
+        Args:
+            columns (list): Column order
+            numeric (dict): Column -> float64 array
+            text (dict): Column -> object array (str or None)
+            metadata (dict, optional): JSON-serialisable details stored with the version
+
+        Returns:
+            int: Generation of the published version
+        """
+        rows = len(numeric[columns[0]] if columns[0] in numeric else text[columns[0]]) if columns else 0
+        metrics = [column for column in columns if column in numeric]
+
+        # Buffer offsets are relative to the data start, which follows the layout JSON
+        buffers, offset = [], 0
+        for column in metrics:
+            buffers.append((offset, np.ascontiguousarray(numeric[column], dtype='<f8').tobytes()))
+            offset += rows * 8
+        entries = []
+        for column in columns:
+            if column in numeric:
+                start = metrics.index(column) * rows * 8
+                entries.append({'name': column, 'type': 'float64', 'buffers': {'data': [start, rows * 8]}})
+                continue
+            entry = {'name': column, 'type': 'utf8', 'buffers': {}}
+            for kind, data in _text_buffers(text[column]).items():
+                offset = _aligned(offset)
+                entry['buffers'][kind] = [offset, len(data)]
+                buffers.append((offset, data))
+                offset += len(data)
+            entries.append(entry)
+        layout = {'rows': rows, 'published_at': time.time(), 'metadata': metadata or {},
+                  'columns': entries, 'matrix': {'columns': metrics, 'offset': 0}}
+        encoded = json.dumps(layout, ensure_ascii=False).encode('utf-8')
+        data_start = _aligned(SEGMENT_HEADER.size + len(encoded))
+
+        generation = self.generation + 1
+        segment_name = f"{self.name}_{generation}"
+        _unlink(segment_name)
+        segment = shared_memory.SharedMemory(name=segment_name, create=True, size=max(data_start + offset, 1))
+        _untrack(segment)
+        SEGMENT_HEADER.pack_into(segment.buf, 0, SEGMENT_MAGIC, generation, len(encoded), data_start)
+        segment.buf[SEGMENT_HEADER.size:SEGMENT_HEADER.size + len(encoded)] = encoded
+        for start, data in buffers:
+            segment.buf[data_start + start:data_start + start + len(data)] = data
+        segment.close()
+
+        # Seqlock: the sequence is odd while the header is being rewritten
+        sequence = SEQUENCE.unpack_from(self.header.buf, SEQUENCE_OFFSET)[0]
+        SEQUENCE.pack_into(self.header.buf, SEQUENCE_OFFSET, sequence + 1)
+        HEADER.pack_into(self.header.buf, 0, HEADER_MAGIC, sequence + 1, generation, segment_name.encode())
+        SEQUENCE.pack_into(self.header.buf, SEQUENCE_OFFSET, sequence + 2)
+
+        # Readers may still be attaching to the version just replaced, drop the one before it
+        if self.previous:
+            _unlink(self.previous)
+        self.previous, self.current, self.generation = self.current, segment_name, generation
+        return generation
+
+    def publish_frame(self, table, metadata=None):
+        """Publish a typed valuation DataFrame (see build_valuation_table)"""
+        return self.publish(*split_table(table), metadata=metadata)
+
+    def close(self, unlink=False):
+        """Detach; with unlink, also remove the header and the published versions"""
+        self.header.close()
+        if unlink:
+            for name in (self.previous, self.current, self.name):
+                if name:
+                    _unlink(name)
+
+
+class SharedValuationTable:
+    """
+    Read-only, zero-copy view of the published valuation table.
+
+    Args:
+        name (str): Header segment name the publisher uses
+    """
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        self.header = _attach(name)
+        self.segment = None
+        self.layout = None
+        self.version = None
+        self.refresh()
+
+    def _read_header(self):
+        while True:
+            magic, before, generation, segment_name = HEADER.unpack_from(self.header.buf)
+            if magic != HEADER_MAGIC:
+                raise ValueError(f"{self.name} is not a published valuation table")
+            if before % 2 == 0 and SEQUENCE.unpack_from(self.header.buf, SEQUENCE_OFFSET)[0] == before:
+                return generation, segment_name.rstrip(b'\0').decode()
+            time.sleep(0.001)
+
+    @property
+    def generation(self):
+        """Generation currently published, may be newer than the attached version"""
+        return self._read_header()[0]
+
+    def refresh(self):
+        """
+        Attach to the current version if it is not the attached one.
+
+        Returns:
+            bool: True if a new version was attached
+        """
+        while True:
+            generation, segment_name = self._read_header()
+            if generation == self.version:
+                return False
+            if not segment_name:
+                raise FileNotFoundError(f"Nothing published under {self.name} yet")
+            try:
+                segment = _attach(segment_name)
+            except FileNotFoundError:
+                # Replaced twice since the header was read
+                continue
+            magic, segment_generation, length, data_start = SEGMENT_HEADER.unpack_from(segment.buf)
+            if magic != SEGMENT_MAGIC or segment_generation != generation:
+                segment.close()
+                continue
+            layout = json.loads(bytes(segment.buf[SEGMENT_HEADER.size:SEGMENT_HEADER.size + length]))
+            layout['data_start'] = data_start
+            if self.segment is not None:
+                self._release()
+            self.segment, self.layout, self.version = segment, layout, generation
+            return True
+
+    def _release(self):
+        try:
+            self.segment.close()
+        except BufferError:
+            # Views handed out still reference the mapping, it is unmapped once they are gone
+            pass
+
+    @property
+    def rows(self):
+        return self.layout['rows']
+
+    @property
+    def columns(self):
+        return [entry['name'] for entry in self.layout['columns']]
+
+    @property
+    def metadata(self):
+        return self.layout['metadata']
+
+    def _buffer(self, entry, kind):
+        start, length = entry['buffers'][kind]
+        start += self.layout['data_start']
+        return self.segment.buf[start:start + length]
+
+    def column(self, name):
+        """float64 column as a zero-copy array, text column decoded to a list (None when missing)"""
+        entry = next(entry for entry in self.layout['columns'] if entry['name'] == name)
+        if entry['type'] == 'float64':
+            return np.frombuffer(self._buffer(entry, 'data'), dtype='<f8')
+        valid = np.unpackbits(np.frombuffer(self._buffer(entry, 'validity'), dtype=np.uint8),
+                              count=self.rows, bitorder='little')
+        offsets = np.frombuffer(self._buffer(entry, 'offsets'), dtype='<i4')
+        data = bytes(self._buffer(entry, 'data'))
+        return [data[offsets[row]:offsets[row + 1]].decode('utf-8') if valid[row] else None
+                for row in range(self.rows)]
+
+    def matrix(self):
+        """
+        Ticker x metric matrix, zero-copy.
+
+        Returns:
+            tuple: (metric names, float64 array of shape (rows, metrics))
+        """
+        metrics = self.layout['matrix']['columns']
+        start = self.layout['data_start'] + self.layout['matrix']['offset']
+        matrix = np.ndarray((self.rows, len(metrics)), dtype='<f8', buffer=self.segment.buf,
+                            offset=start, order='F')
+        return metrics, matrix
+
+    def to_pandas(self):
+        """DataFrame of the attached version (text columns are decoded, floats copied by pandas)"""
+        import pandas as pd
+
+        return pd.DataFrame({name: self.column(name) for name in self.columns})
+
+    def to_arrow(self):
+        """pyarrow Table over the shared buffers without copying; needs pyarrow"""
+        import pyarrow as pa
+
+        arrays = []
+        for entry in self.layout['columns']:
+            if entry['type'] == 'float64':
+                arrays.append(pa.Array.from_buffers(pa.float64(), self.rows,
+                                                    [None, pa.py_buffer(self._buffer(entry, 'data'))]))
+            else:
+                arrays.append(pa.Array.from_buffers(pa.string(), self.rows,
+                                                    [pa.py_buffer(self._buffer(entry, kind))
+                                                     for kind in ('validity', 'offsets', 'data')]))
+        return pa.Table.from_arrays(arrays, names=self.columns)
+
+    def close(self):
+        if self.segment is not None:
+            self._release()
+        self.header.close()
@@ -0,0 +1,126 @@
+"""
+Per-ticker index of the snapshot history, for as-of lookups.
+
+A scrape that failed to fetch a ticker leaves it out of that day's snapshot.
+The index records which tickers each snapshot file of a dataset holds
+(data/index/<dataset>.json, updated incrementally: only new or rewritten files
+are read), so the analyzer can fill a ticker missing from the latest snapshot
+from the newest earlier snapshot that has it without rescanning the history.
+
+Snapshots are ordered by the date in their file names. mtimes only tell the
+index that a file was rewritten; after a clone, copy or rsync they no longer
+say which snapshot is older.
+"""
+
+import glob
+import json
+import os
+from datetime import date
+
+from paths import data_path
+from revision_tracker import snapshot_date
+
+INDEX_DIR = data_path('index')
+# Older records are not used to fill a missing ticker
+MAX_FALLBACK_AGE_DAYS = 90
+
+
+def snapshot_age(path, latest_path):
+    """Days between the dates in two snapshot names, None if either has no date"""
+    dates = snapshot_date(path), snapshot_date(latest_path)
+    if not all(dates):
+        return None
+    return (date.fromisoformat(dates[1]) - date.fromisoformat(dates[0])).days
+
+
+class SnapshotIndex:
+    """
+    Which tickers each snapshot file of one dataset holds.
+
+    Args:
+        dataset (str): 'pe', 'ratio', 'forecast' or 'quarterly'
+        pattern (str): Glob of the dataset's snapshot files
+        state (dict, optional): Saved index
+        index_dir (str): Directory the index is saved in
+    """
+
+    def __init__(self, dataset, pattern, state=None, index_dir=INDEX_DIR):
+        self.dataset = dataset
+        self.pattern = pattern
+        self.path = os.path.join(index_dir, f"{dataset}.json")
+        # file name -> {'size', 'mtime', 'tickers'}
+        self.files = (state or {}).get('files', {})
+
+    @classmethod
+    def load(cls, dataset, pattern, index_dir=INDEX_DIR):
+        """Load the saved index of a dataset, or start an empty one"""
+        path = os.path.join(index_dir, f"{dataset}.json")
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return cls(dataset, pattern, json.load(f), index_dir)
+        return cls(dataset, pattern, index_dir=index_dir)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'dataset': self.dataset, 'files': self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def sync(self):
+        """
+        Index snapshot files written since the last sync and forget deleted ones.
+
+        Returns:
+            bool: True if the index changed (and was saved)
+        """
+        current = {}
+        for path in glob.glob(self.pattern):
+            stat = os.stat(path)
+            current[os.path.basename(path)] = (path, stat.st_size, stat.st_mtime)
+
+        changed = set(self.files) - set(current)
+        for name in changed:
+            del self.files[name]
+        for name, (path, size, mtime) in current.items():
+            entry = self.files.get(name)
+            if entry and entry['size'] == size and entry['mtime'] == mtime:
+                continue
+            with open(path, 'r') as f:
+                tickers = list(json.load(f))
+            self.files[name] = {'size': size, 'mtime': mtime, 'tickers': tickers}
+            changed.add(name)
+
+        if changed:
+            self.save()
+        return bool(changed)
+
+    def resolve(self, tickers, latest_path, max_age_days=MAX_FALLBACK_AGE_DAYS):
+        """
+        Newest earlier snapshot holding each ticker.
+
+        Only snapshots dated strictly before latest_path are candidates;
+        snapshots without a date in their name are never used.
+
+        Args:
+            tickers (iterable): Tickers missing from the latest snapshot
+            latest_path (str): The snapshot the analyzer loaded
+            max_age_days (float): Skip snapshots older than this relative to latest_path
+
+        Returns:
+            dict: Snapshot path -> {ticker: age in days}, for the tickers found
+        """
+        directory = os.path.dirname(latest_path)
+        wanted = set(tickers)
+        resolved = {}
+        ages = {name: snapshot_age(name, latest_path) for name in self.files}
+        # Newest first by name date, so the first file holding a ticker wins
+        for name in sorted((name for name, age in ages.items() if age is not None and age > 0),
+                           key=lambda name: (ages[name], name)):
+            if not wanted or ages[name] > max_age_days:
+                break
+            found = wanted.intersection(self.files[name]['tickers'])
+            if found:
+                resolved[os.path.join(directory, name)] = dict.fromkeys(found, ages[name])
+                wanted -= found
+        return resolved
@@ -0,0 +1,386 @@
+"""
+Declarative schema of the snapshot datasets and the coercion applied to them.
+
+Scrapers store whatever a page yielded, so a float field can hold strings such
+as "n/a" or dates in page format. coerce_snapshot() applies the schema once,
+when a snapshot is written (write_typed_snapshot) or when a snapshot written
+before the schema existed is first loaded (read_snapshot, which keeps the
+result as a typed copy): float fields become float or None, date fields ISO
+dates, and every value that could not be coerced is listed in a per-snapshot
+report under data/coercion/. The flat datasets (ratio, pe) are coerced column
+by column with pandas; forecast and quarterly records are nested and coerced
+per record.
+"""
+
+import json
+import math
+import os
+from collections import namedtuple
+
+from paths import data_path
+
+SCHEMA_VERSION = 1
+COERCION_REPORT_DIR = data_path('coercion')
+REPORT_EXAMPLES = 5
+
+# kind: 'float', 'date' (ISO YYYY-MM-DD) or 'text'; unit is descriptive
+Field = namedtuple('Field', ['kind', 'unit', 'nullable'])
+
+
+def _fields(kind, unit, names, nullable=True):
+    return {name: Field(kind, unit, nullable) for name in names}
+
+
+RATIO_SCHEMA = {
+    'industry': Field('text', None, False),
+    'analystRatings': Field('text', None, True),
+    **_fields('date', None, ['earningsdate', 'exdivdate']),
+    **_fields('float', 'usd', [
+        'marketcap', 'enterpriseValue', 'revenue', 'gp', 'opinc', 'pretax', 'netinc', 'ebitda', 'ebit',
+        'totalcash', 'debt', 'netcash', 'workingcapital', 'ncfo', 'capex', 'fcf',
+        'revPerEmployee', 'profitPerEmployee']),
+    **_fields('float', 'usd_per_share', [
+        'eps', 'bvps', 'fcfps', 'dps', 'priceTarget', 'currentPrice', 'sma50', 'sma200']),
+    **_fields('float', 'shares', [
+        'sharesOutClass', 'sharesout', 'float', 'averageVolume', 'shortInterest', 'shortPriorMonth']),
+    **_fields('float', 'percent', [
+        'sharesgrowthyoy', 'sharesgrowthqoq', 'sharesInsiders', 'sharesInstitutions', 'roe', 'roa', 'roic',
+        'roce', 'taxrate', 'ch1y', 'shortShares', 'shortFloat', 'grossMargin', 'operatingMargin',
+        'pretaxMargin', 'profitMargin', 'ebitdaMargin', 'ebitMargin', 'fcfMargin', 'dividendYield',
+        'dividendGrowth', 'payoutRatio', 'buybackYield', 'totalReturn', 'earningsYield', 'fcfYield',
+        'revenue5y', 'eps5y']),
+    **_fields('float', 'ratio', [
+        'pe', 'peForward', 'ps', 'psForward', 'pb', 'ptbvRatio', 'pfcf', 'pocf', 'pegRatio', 'evEarnings',
+        'evSales', 'evEbitda', 'evEbit', 'evFcf', 'currentRatio', 'quickRatio', 'debtEquity', 'debtEbitda',
+        'debtFcf', 'interestCoverage', 'assetturnover', 'inventoryturnover', 'beta', 'rsi', 'shortRatio']),
+    **_fields('float', 'count', ['employees', 'dividendGrowthYears', 'analystCount']),
+}
+
+FORECAST_ANNUAL_SCHEMA = {
+    **_fields('float', 'usd_per_share', ['current_eps', 'next_year_eps']),
+    **_fields('float', 'usd', ['current_revenue', 'next_year_revenue']),
+    **_fields('float', 'percent', ['current_growth', 'next_year_growth',
+                                   'current_revenue_growth', 'next_year_revenue_growth']),
+}
+
+# annual_by_year[year][metric] and quarterly[metric] lists
+FORECAST_METRIC_SCHEMA = {
+    'eps': Field('float', 'usd_per_share', True),
+    'revenue': Field('float', 'usd', True),
+    'eps_growth': Field('float', 'percent', True),
+    'revenue_growth': Field('float', 'percent', True),
+}
+
+QUARTERLY_SCHEMA = {
+    'periods': Field('text', None, False),
+    'eps': Field('float', 'usd_per_share', True),
+    'revenue': Field('float', 'usd', True),
+}
+
+# A PE snapshot maps each ticker straight to its median PE
+PE_SCHEMA = Field('float', 'ratio', True)
+
+SCHEMAS = {
+    'ratio': RATIO_SCHEMA,
+    'forecast': {'annual': FORECAST_ANNUAL_SCHEMA, 'metrics': FORECAST_METRIC_SCHEMA},
+    'quarterly': QUARTERLY_SCHEMA,
+    'pe': PE_SCHEMA,
+}
+
+
+class CoercionReport:
+    """Values that did not fit the schema while coercing one snapshot"""
+
+    def __init__(self, dataset, records):
+        self.dataset = dataset
+        self.records = records
+        self.failures = {}
+        self.null_violations = {}
+        self.unknown_fields = set()
+        self.changed = 0
+
+    def add_failure(self, field, ticker, raw):
+        entry = self.failures.setdefault(field, {'count': 0, 'examples': []})
+        entry['count'] += 1
+        if len(entry['examples']) < REPORT_EXAMPLES:
+            entry['examples'].append([ticker, raw])
+
+    def add_null(self, field, count=1):
+        self.null_violations[field] = self.null_violations.get(field, 0) + count
+
+    @property
+    def failure_count(self):
+        return sum(entry['count'] for entry in self.failures.values())
+
+    def to_dict(self):
+        return {
+            'dataset': self.dataset,
+            'schema_version': SCHEMA_VERSION,
+            'records': self.records,
+            'changed_values': self.changed,
+            'failures': self.failures,
+            'null_violations': self.null_violations,
+            'unknown_fields': sorted(self.unknown_fields),
+        }
+
+
+def _coerce_float(value, field, ticker, report):
+    """Scalar float coercion for the nested datasets"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if isinstance(value, float) and math.isnan(value):
+            report.changed += 1
+            return None
+        return value
+    try:
+        coerced = float(str(value).replace(',', '').replace('$', '').replace('%', '').strip())
+    except ValueError:
+        report.add_failure(field, ticker, value)
+        report.changed += 1
+        return None
+    report.changed += 1
+    return coerced
+
+
+def _coerce_float_list(values, field, ticker, report):
+    if not isinstance(values, list):
+        report.add_failure(field, ticker, values)
+        return []
+    return [_coerce_float(value, field, ticker, report) for value in values]
+
+
+def _coerce_columns(frame, schema, report):
+    """
+    Coerce DataFrame columns to the schema in place of the original objects.
+
+    Returns:
+        dict: column -> coerced Series (float64, ISO date strings or text)
+    """
+    import pandas as pd
+
+    columns = {}
+    for column in frame.columns:
+        field = schema.get(column)
+        original = frame[column]
+        present = original.notna()
+        if field is None:
+            report.unknown_fields.add(column)
+            columns[column] = original
+            continue
+
+        if field.kind == 'float':
+            coerced = pd.to_numeric(original, errors='coerce').astype('float64')
+        elif field.kind == 'date':
+            coerced = pd.to_datetime(original, errors='coerce', format='mixed').dt.strftime('%Y-%m-%d')
+        else:
+            coerced = original
+
+        failed = present & coerced.isna()
+        for ticker, raw in original[failed].items():
+            report.add_failure(column, ticker, raw)
+        if field.kind != 'text':
+            unchanged = original.where(present).astype(object) == coerced.where(coerced.notna()).astype(object)
+            report.changed += int((present & ~unchanged).sum())
+        if not field.nullable:
+            missing = int(coerced.isna().sum())
+            if missing:
+                report.add_null(column, missing)
+        columns[column] = coerced
+    return columns
+
+
+def _frame_to_records(columns, index):
+    """Column Series back to JSON-ready {ticker: {field: value}}, NaN as None"""
+    records = {ticker: {} for ticker in index}
+    for column, series in columns.items():
+        values = series.astype(object).where(series.notna(), None)
+        for ticker, value in zip(index, values.tolist()):
+            records[ticker][column] = value
+    return records
+
+
+def coerce_snapshot(dataset, data):
+    """
+    Apply the dataset schema to a snapshot.
+
+    Args:
+        dataset (str): 'ratio', 'forecast', 'pe' or 'quarterly'
+        data (dict): Ticker -> record, as stored in the snapshot
+
+    Returns:
+        tuple: (coerced data with the same structure, CoercionReport)
+    """
+    report = CoercionReport(dataset, len(data))
+    if not data:
+        return data, report
+
+    if dataset == 'ratio':
+        import pandas as pd
+
+        frame = pd.DataFrame.from_dict(data, orient='index')
+        return _frame_to_records(_coerce_columns(frame, RATIO_SCHEMA, report), frame.index), report
+
+    if dataset == 'pe':
+        import pandas as pd
+
+        frame = pd.DataFrame({'pe': pd.Series(data, dtype=object)})
+        coerced = _coerce_columns(frame, {'pe': PE_SCHEMA}, report)['pe']
+        return dict(zip(coerced.index, coerced.astype(object).where(coerced.notna(), None).tolist())), report
+
+    coerced_data = {}
+    for ticker, record in data.items():
+        if not isinstance(record, dict):
+            report.add_failure('<record>', ticker, record)
+            continue
+        record = dict(record)
+        if dataset == 'forecast':
+            annual = dict(record.get('annual') or {})
+            for field in FORECAST_ANNUAL_SCHEMA:
+                annual[field] = _coerce_float(annual.get(field), field, ticker, report)
+            record['annual'] = annual
+            if 'annual_by_year' in record:
+                record['annual_by_year'] = {
+                    year: {metric: _coerce_float(value, metric, ticker, report) for metric, value in metrics.items()}
+                    for year, metrics in record['annual_by_year'].items()}
+            if 'quarterly' in record:
+                record['quarterly'] = {metric: _coerce_float_list(values, metric, ticker, report)
+                                       for metric, values in record['quarterly'].items()}
+        elif dataset == 'quarterly':
+            for field in ('eps', 'revenue'):
+                record[field] = _coerce_float_list(record.get(field, []), field, ticker, report)
+            if not record.get('periods'):
+                report.add_null('periods')
+        coerced_data[ticker] = record
+    return coerced_data, report
+
+
+def typed_frame(ratio_data):
+    """
+    Ratio snapshot as a DataFrame indexed by ticker: float64 columns for float
+    fields, datetime64 for date fields, object for text. Fields outside the
+    schema are dropped. ratio_data is a snapshot dict or a records.RecordTable.
+    """
+    import pandas as pd
+
+    if hasattr(ratio_data, 'frame'):
+        frame = ratio_data.frame()
+    else:
+        frame = pd.DataFrame.from_dict(ratio_data, orient='index')
+    columns = {}
+    for column, field in RATIO_SCHEMA.items():
+        if column not in frame.columns:
+            continue
+        if field.kind == 'float':
+            columns[column] = pd.to_numeric(frame[column], errors='coerce').astype('float64')
+        elif field.kind == 'date':
+            columns[column] = pd.to_datetime(frame[column], errors='coerce', format='mixed')
+        else:
+            columns[column] = frame[column]
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def coercion_report_path(snapshot_path):
+    """data/coercion/<snapshot file stem>.json"""
+    return os.path.join(COERCION_REPORT_DIR, os.path.splitext(os.path.basename(snapshot_path))[0] + '.json')
+
+
+def typed_copy_path(snapshot_path):
+    """data/coercion/<snapshot file stem>.typed.json, the coerced copy of a snapshot written before the schema"""
+    return os.path.join(COERCION_REPORT_DIR, os.path.splitext(os.path.basename(snapshot_path))[0] + '.typed.json')
+
+
+def read_coercion_report(snapshot_path):
+    try:
+        with open(coercion_report_path(snapshot_path), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_coercion_report(snapshot_path, report, coerced_on):
+    """
+    Save the report of a snapshot, with the snapshot's size and mtime so a
+    later load can tell whether the file still holds the coerced data.
+
+    Args:
+        coerced_on (str): 'write' if the snapshot file holds the coerced data, 'load' if its
+            typed copy does
+    """
+    stat = os.stat(snapshot_path)
+    payload = {**report.to_dict(), 'coerced_on': coerced_on,
+               'snapshot': {'size': stat.st_size, 'mtime': stat.st_mtime}}
+    os.makedirs(COERCION_REPORT_DIR, exist_ok=True)
+    tmp_path = coercion_report_path(snapshot_path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False, default=str)
+    os.replace(tmp_path, coercion_report_path(snapshot_path))
+
+
+def _coerced_on(snapshot_path):
+    """'write' or 'load' if the report describes the snapshot as it is now, else None"""
+    report = read_coercion_report(snapshot_path)
+    if not report or report.get('schema_version') != SCHEMA_VERSION:
+        return None
+    stat = os.stat(snapshot_path)
+    if report.get('snapshot') != {'size': stat.st_size, 'mtime': stat.st_mtime}:
+        return None
+    return report.get('coerced_on')
+
+
+def is_coerced(snapshot_path):
+    """True if the snapshot was written through write_typed_snapshot and not modified since"""
+    return _coerced_on(snapshot_path) == 'write'
+
+
+def read_snapshot(dataset, snapshot_path):
+    """
+    Load a snapshot coerced to the schema.
+
+    A snapshot written before the schema existed is coerced on its first load
+    and the result saved as its typed copy, which later loads read instead
+    until the snapshot file changes.
+
+    Returns:
+        dict: Ticker -> coerced record
+    """
+    coerced_on = _coerced_on(snapshot_path)
+    if coerced_on == 'load':
+        try:
+            with open(typed_copy_path(snapshot_path), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+    with open(snapshot_path, 'r') as f:
+        data = json.load(f)
+    if coerced_on == 'write':
+        return data
+
+    from utils import write_json_atomic
+
+    data, report = coerce_snapshot(dataset, data)
+    os.makedirs(COERCION_REPORT_DIR, exist_ok=True)
+    write_json_atomic(typed_copy_path(snapshot_path), data)
+    write_coercion_report(snapshot_path, report, coerced_on='load')
+    if report.failure_count:
+        print(f"Warning: {report.failure_count} {dataset} values did not match the schema, "
+              f"see {coercion_report_path(snapshot_path)}")
+    return data
+
+
+def write_typed_snapshot(dataset, path, data):
+    """
+    Coerce a freshly scraped snapshot, write it atomically and save its report.
+
+    Returns:
+        CoercionReport: What could not be coerced
+    """
+    from utils import write_json_atomic
+
+    coerced, report = coerce_snapshot(dataset, data)
+    write_json_atomic(path, coerced, indent=2)
+    write_coercion_report(path, report, coerced_on='write')
+    if report.failure_count:
+        print(f"Warning: {report.failure_count} {dataset} values did not match the schema, "
+              f"see {coercion_report_path(path)}")
+    return report
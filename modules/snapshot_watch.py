@@ -0,0 +1,232 @@
+"""
+Watch mode: re-value and regenerate the report whenever a new snapshot lands.
+
+The snapshot directories are watched with inotify (through libc, no extra
+dependency) and polled every POLL_INTERVAL seconds where inotify is not
+available. Events are debounced: a dataset is reloaded once its directory has
+been quiet for DEBOUNCE_SECONDS, and a snapshot that still fails to parse is
+retried every POLL_INTERVAL seconds, new writes or not, up to
+MAX_RELOAD_ATTEMPTS times. Only the changed dataset is reloaded and only the
+tickers whose inputs changed are re-valued before the report is rewritten.
+"""
+
+import ctypes
+import ctypes.util
+import fnmatch
+import glob
+import os
+import select
+import struct
+import time
+
+from valuation_analyzer import SNAPSHOT_PATTERNS
+
+WATCHED_DATASETS = ('pe', 'ratio', 'forecast', 'quarterly')
+DEBOUNCE_SECONDS = 2.0
+POLL_INTERVAL = 5.0
+# Reloads of a snapshot that fails to parse before it is left for the next write
+MAX_RELOAD_ATTEMPTS = 5
+
+# <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """Report files closed after writing or renamed into the watched directories"""
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self.directories[wd] = directory
+
+    def read(self, timeout):
+        """Paths written within timeout seconds, empty if none"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        buffer = os.read(self.fd, 64 * 1024)
+        paths, offset = [], 0
+        while offset < len(buffer):
+            wd, _, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if wd in self.directories and name:
+                paths.append(os.path.join(self.directories[wd], os.fsdecode(name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Report files whose mtime or size changed since the previous scan"""
+
+    def __init__(self, directories, interval=POLL_INTERVAL):
+        self.directories = list(directories)
+        self.interval = interval
+        self.files = self._scan()
+
+    def _scan(self):
+        files = {}
+        for directory in self.directories:
+            for path in glob.glob(os.path.join(directory, '*')):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files[path] = (stat.st_mtime, stat.st_size)
+        return files
+
+    def read(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        files = self._scan()
+        paths = [path for path, stat in files.items() if self.files.get(path) != stat]
+        self.files = files
+        return paths
+
+    def close(self):
+        pass
+
+
+def open_watcher(directories, polling=False):
+    """InotifyWatcher where the platform has it, PollingWatcher otherwise"""
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), polling every {POLL_INTERVAL:g}s")
+    return PollingWatcher(directories)
+
+
+def snapshot_dataset(path, datasets=WATCHED_DATASETS):
+    """Dataset whose snapshot pattern a path matches, None for temp files and anything else"""
+    for dataset in datasets:
+        if fnmatch.fnmatch(path, SNAPSHOT_PATTERNS[dataset]):
+            return dataset
+    return None
+
+
+def wait_for_snapshots(watcher, debounce=DEBOUNCE_SECONDS, datasets=WATCHED_DATASETS, timeout=None):
+    """
+    Block until snapshots were written and the directories have been quiet for debounce seconds.
+
+    Args:
+        timeout (float, optional): Give up after this many seconds without a snapshot write
+
+    Returns:
+        set: Datasets with a new or rewritten snapshot, empty on timeout
+    """
+    started = time.monotonic()
+    changed = set()
+    while True:
+        paths = watcher.read(debounce if changed else POLL_INTERVAL)
+        landed = {snapshot_dataset(path, datasets) for path in paths} - {None}
+        if changed and not paths:
+            return changed
+        changed |= landed
+        if not changed and timeout is not None and time.monotonic() - started >= timeout:
+            return changed
+
+
+class WatchedValuation:
+    """
+    Valuation records kept up to date across snapshot changes.
+
+    Args:
+        analyzer (Valuation_Analyzer_Pure): Loaded analyzer
+        stock_list (dict): Industry -> tickers mapping to value
+        output (str): Excel report rewritten after every update
+    """
+
+    def __init__(self, analyzer, stock_list, output):
+        self.analyzer = analyzer
+        self.stock_list = stock_list
+        self.output = output
+        # Tickers with reloaded inputs not yet re-valued, kept across a failed update
+        self.stale = set()
+        # Industry -> ticker -> record, in stock list order
+        self.records = {industry: {record['Company']: record for record in records}
+                        for industry, records in analyzer.aggregate_company_records(stock_list).items()}
+
+    def industry_records(self):
+        return {industry: list(records.values()) for industry, records in self.records.items() if records}
+
+    def write_report(self):
+        self.analyzer.save_to_excel_fast(self.industry_records(), self.output)
+
+    def update(self, datasets):
+        """
+        Reload the given datasets and re-value the tickers they affect.
+
+        Returns:
+            int: Number of records recomputed
+        """
+        for dataset in sorted(datasets):
+            reloaded = self.analyzer.reload_dataset(dataset)
+            if dataset == 'ratio':
+                # Industry medians and percentile ranks move for every peer of a changed ticker
+                reloaded |= {ticker for companies in self.stock_list.values()
+                             if reloaded.intersection(companies) for ticker in companies}
+            self.stale |= reloaded
+
+        recomputed = 0
+        for industry, companies in self.stock_list.items():
+            for company in companies:
+                if company not in self.stale:
+                    continue
+                company_data = self.analyzer.process_company(company, industry)
+                records = self.records.setdefault(industry, {})
+                if company_data:
+                    company_data['Industry'] = industry
+                    company_data['Company'] = company
+                    records[company] = company_data
+                else:
+                    records.pop(company, None)
+                recomputed += 1
+        # Keep stock list order for tickers that were missing before
+        self.records = {industry: {company: self.records[industry][company] for company in companies
+                                   if company in self.records.get(industry, {})}
+                        for industry, companies in self.stock_list.items()}
+        self.stale = set()
+        return recomputed
+
+    def run(self, watcher, debounce=DEBOUNCE_SECONDS):
+        """Update and rewrite the report after every batch of snapshots, until interrupted"""
+        self.write_report()
+        pending = set()
+        attempts = 0
+        while True:
+            # A failed reload is retried after POLL_INTERVAL even if nothing else is written
+            pending |= wait_for_snapshots(watcher, debounce, timeout=POLL_INTERVAL if pending else None)
+            started = time.perf_counter()
+            try:
+                recomputed = self.update(pending)
+            except ValueError as e:
+                # A snapshot written in place may still be incomplete
+                attempts += 1
+                if attempts < MAX_RELOAD_ATTEMPTS:
+                    print(f"Could not load {', '.join(sorted(pending))} yet, retrying: {e}")
+                else:
+                    print(f"Could not load {', '.join(sorted(pending))} after {attempts} attempts, "
+                          f"waiting for the next write: {e}")
+                    pending, attempts = set(), 0
+                continue
+            print(f"{', '.join(sorted(pending))} changed: {recomputed} records re-valued "
+                  f"in {time.perf_counter() - started:.2f}s")
+            pending, attempts = set(), 0
+            if recomputed:
+                self.write_report()
@@ -5,8 +5,8 @@ import os
 
 def run_script(script):
     os.system(f'python3 {script}')
-# 三個 Python 檔案
-scripts = ['ratio_scraper.py', 'pe_scraper.py', 'forecast_scarper.py']
+# 四個 Python 檔案
+scripts = ['ratio_scraper.py', 'pe_scraper.py', 'forecast_scarper.py', 'quarterly_scraper.py']
 
 # 同時啟動
 
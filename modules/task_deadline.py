@@ -0,0 +1,281 @@
+"""
+Per-ticker deadlines, cooperative cancellation and failure isolation for scrape loops.
+
+A pathological page, a yfinance .info call that never returns or a parser
+blowup must cost one ticker its own budget, not stall the universe. Every
+ticker task runs through run_guarded:
+
+    deadline      the task runs on its own thread with a CancelToken; the caller
+                  waits at most budget seconds and moves on, so a call that
+                  cannot be interrupted (socket read, C parser) is abandoned
+    cancellation  fetch_url, the rate budgets, ParsePool and the yfinance quote
+                  call checkpoint()/time_left(), which raise TaskCancelled once
+                  the task's token is cancelled or past its deadline, so an
+                  abandoned task stops at its next fetch instead of running on
+    isolation     exceptions, deadlines and empty results come back as a
+                  TaskOutcome with a reason instead of propagating
+
+Under `--profile` the task runs inline on the profiled thread instead, so
+cProfile and tracemalloc see it; the deadline then only applies at its
+checkpoints.
+
+Failures are recorded in a FailureLog ('task' events of the scrape metrics);
+loops queue RETRY_REASONS failures again behind the rest of the run, up to
+MAX_ATTEMPTS attempts per task.
+"""
+
+import contextvars
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from profiling import profiling_this_thread
+
+# Wall-clock seconds one ticker task may take, pacing waits and fetch retries included
+TASK_BUDGET_SECONDS = 90.0
+# Attempts per task in one run: the first plus retries after the rest of the run
+MAX_ATTEMPTS = 2
+# An empty result already had fetch_url's retries, it is recorded but not retried
+RETRY_REASONS = ('deadline', 'error')
+
+TaskOutcome = namedtuple('TaskOutcome', ['result', 'reason', 'detail', 'elapsed'])
+
+_current_token = contextvars.ContextVar('task_token', default=None)
+
+
+class TaskCancelled(BaseException):
+    """
+    Raised at a checkpoint of a task that was cancelled or ran past its deadline.
+
+    A BaseException like asyncio.CancelledError, so the extractors' broad
+    `except Exception` blocks do not turn a cancellation into an empty result.
+    """
+
+
+class CancelToken:
+    """
+    Cancellation state of one task.
+
+    Args:
+        deadline (float): time.monotonic() by which the task must be done
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.reason = None
+        self._cancelled = threading.Event()
+
+    def cancel(self, reason='cancelled'):
+        self.reason = self.reason or reason
+        self._cancelled.set()
+
+    def remaining(self):
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise TaskCancelled(self.reason)
+        if time.monotonic() >= self.deadline:
+            raise TaskCancelled('deadline')
+
+    def sleep(self, seconds):
+        """Sleep, waking up early to raise TaskCancelled when the task is cancelled"""
+        if self._cancelled.wait(min(seconds, self.remaining())):
+            raise TaskCancelled(self.reason)
+        self.check()
+
+
+def checkpoint():
+    """Raise TaskCancelled if the current task is cancelled or past its deadline"""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
+
+
+def time_left(default=None):
+    """
+    Seconds a blocking call of the current task may take.
+
+    Returns:
+        float or None: default, capped at the task's remaining budget
+            (default outside a task)
+    """
+    token = _current_token.get()
+    if token is None:
+        return default
+    token.check()
+    remaining = token.remaining()
+    return remaining if default is None else min(default, remaining)
+
+
+def cancellable_sleep(seconds):
+    """time.sleep that a task's cancellation or deadline cuts short"""
+    token = _current_token.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
+
+
+def run_guarded(function, *args, budget=TASK_BUDGET_SECONDS, name=None, **kwargs):
+    """
+    function(*args, **kwargs) with a hard wall-clock deadline.
+
+    Runs on a daemon thread; if it is not done after budget seconds its token
+    is cancelled and the caller gets a 'deadline' outcome right away. Nested
+    calls never get more than what is left of the enclosing task's budget.
+    On the thread of an active RunProfiler the task runs inline, cancelled
+    at its first checkpoint past the deadline.
+
+    Args:
+        function (callable): The task, typically scraper.scrape_ticker
+        budget (float): Seconds the task may take
+        name (str, optional): Thread name, for tracebacks
+
+    Returns:
+        TaskOutcome: result, reason (None on success, else 'deadline', 'error'
+            or 'empty'), detail and elapsed seconds
+    """
+    outer = _current_token.get()
+    if outer is not None:
+        budget = min(budget, outer.remaining())
+    started = time.monotonic()
+    token = CancelToken(started + budget)
+    done = threading.Event()
+    box = {}
+
+    def target():
+        reset = _current_token.set(token)
+        try:
+            box['result'] = function(*args, **kwargs)
+        except TaskCancelled as e:
+            box['cancelled'] = str(e)
+        except Exception as e:
+            box['error'] = e
+        finally:
+            _current_token.reset(reset)
+            done.set()
+
+    if profiling_this_thread():
+        target()
+    else:
+        threading.Thread(target=target, name=name or f"task-{getattr(function, '__name__', 'guarded')}",
+                         daemon=True).start()
+    finished = done.wait(budget)
+    elapsed = time.monotonic() - started
+    if not finished or 'cancelled' in box:
+        token.cancel('deadline')
+        return TaskOutcome(None, 'deadline', f"exceeded {budget:g}s budget", elapsed)
+    if 'error' in box:
+        error = box['error']
+        return TaskOutcome(None, 'error', f"{type(error).__name__}: {error}", elapsed)
+    result = box['result']
+    if result is None or (isinstance(result, (list, dict)) and not result):
+        return TaskOutcome(result, 'empty', "no data extracted", elapsed)
+    return TaskOutcome(result, None, None, elapsed)
+
+
+class FailureLog:
+    """Thread-safe record of failed task attempts of one run"""
+
+    def __init__(self):
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def record(self, dataset, ticker, attempt, outcome):
+        """
+        Record a failed attempt as a 'task' event of the scrape metrics.
+
+        Returns:
+            bool: True if the task should be retried later in the run
+        """
+        # instrumentation sleeps through cancellable_sleep, import it at call time
+        from instrumentation import RECORDER
+
+        retry = outcome.reason in RETRY_REASONS and attempt < MAX_ATTEMPTS
+        entry = {'dataset': dataset, 'ticker': ticker, 'attempt': attempt, 'reason': outcome.reason,
+                 'detail': outcome.detail, 'elapsed': round(outcome.elapsed, 3), 'retry': retry}
+        with self._lock:
+            self.entries.append(entry)
+        RECORDER.record('task', outcome.elapsed, ticker=ticker, endpoint=dataset, ok=False,
+                        reason=outcome.reason, detail=outcome.detail, attempt=attempt, retry=retry)
+        print(f"{dataset}/{ticker} attempt {attempt} failed ({outcome.reason}: {outcome.detail})"
+              + (", retrying later in the run" if retry else ""))
+        return retry
+
+    def _latest(self):
+        with self._lock:
+            entries = list(self.entries)
+        return {(entry['dataset'], entry['ticker']): entry for entry in entries}
+
+    def final(self):
+        """(dataset, ticker) -> last failed attempt, for tasks that were not retried again"""
+        return {key: entry for key, entry in self._latest().items() if not entry['retry']}
+
+    def print_summary(self):
+        """Print how many failed tasks recovered on retry and the ones that failed for good, by reason"""
+        latest = self._latest()
+        recovered = sum(1 for entry in latest.values() if entry['retry'])
+        if recovered:
+            print(f"{recovered} failed tasks succeeded on retry")
+        by_reason = {}
+        for (dataset, ticker), entry in sorted(latest.items()):
+            if not entry['retry']:
+                by_reason.setdefault(entry['reason'], []).append(f"{dataset}/{ticker}")
+        for reason, tasks in sorted(by_reason.items()):
+            print(f"Failed ({reason}): {', '.join(tasks)}")
+
+
+def scrape_guarded(tickers, scrape, dataset, failures=None, budget=TASK_BUDGET_SECONDS, pause=None, workers=1):
+    """
+    Scrape loop with a deadline per ticker and failed tickers retried after the first pass.
+
+    Args:
+        tickers (iterable): Tickers in scrape order
+        scrape (callable): scrape(ticker) -> record or None
+        dataset (str): Dataset name for the failure log
+        failures (FailureLog, optional): Log to record into, a new one by default; its
+            summary is printed at the end
+        budget (float): Seconds per ticker attempt
+        pause (callable, optional): Called after every attempt, e.g. a paced sleep
+        workers (int): Tickers scraped concurrently
+
+    Returns:
+        dict: Ticker -> record, for the tickers that succeeded
+    """
+    failures = failures if failures is not None else FailureLog()
+
+    def attempt_ticker(ticker):
+        print(f"Fetching {dataset} data for {ticker}...")
+        outcome = run_guarded(scrape, ticker, budget=budget, name=f"{dataset}-{ticker}")
+        if pause:
+            pause()
+        return outcome
+
+    results = {}
+    pending = list(tickers)
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                outcomes = zip(pending, executor.map(attempt_ticker, pending))
+                retry = _collect(outcomes, results, failures, dataset, attempt)
+        else:
+            retry = _collect(((ticker, attempt_ticker(ticker)) for ticker in pending),
+                             results, failures, dataset, attempt)
+        if not retry:
+            break
+        pending = retry
+    failures.print_summary()
+    return results
+
+
+def _collect(outcomes, results, failures, dataset, attempt):
+    """Store successful outcomes in results, return the tickers to retry"""
+    retry = []
+    for ticker, outcome in outcomes:
+        if outcome.reason is None:
+            results[ticker] = outcome.result
+        elif failures.record(dataset, ticker, attempt, outcome):
+            retry.append(ticker)
+    return retry
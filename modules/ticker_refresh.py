@@ -0,0 +1,111 @@
+"""
+On-demand refresh of a single ticker.
+
+The statistics page, forecast page, PE history and yfinance quote are fetched
+concurrently while the latest snapshots load, the ticker is valued with the
+fresh data and the fetched records are stored as an overlay over the current
+snapshots (see overlay.py). Requests draw from the same per-host RATE_BUDGET
+as the background scrapers, so a refresh never bursts past their pacing.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from forecast_scraper import Forecast_Scraper_Working
+from overlay import write_overlay
+from snapshot_schema import coerce_snapshot
+from pe_scraper import PERatioScraper
+from ratio_scraper import Ratio_Scraper_Fixed
+from valuation_analyzer import Valuation_Analyzer_Pure
+
+
+class TickerRefresher:
+    def __init__(self, current_year=2025, horizon=2, stock_list=None):
+        self.current_year = current_year
+        self.horizon = horizon
+        self.stock_list = stock_list
+        self.ratio_scraper = Ratio_Scraper_Fixed()
+        self.forecast_scraper = Forecast_Scraper_Working()
+        self.pe_scraper = PERatioScraper()
+
+    def fetch_pe_median(self, ticker):
+        """Median historical PE of a ticker, or None if its history is unavailable"""
+        pe_ratios = self.pe_scraper.parse_pe_ratios(ticker)
+        if not pe_ratios:
+            return None
+        return self.pe_scraper.analyze_pe_ratios(pe_ratios)
+
+    def fetch(self, ticker, industry, executor):
+        """
+        Submit the four fetches of one ticker.
+
+        Returns:
+            dict: 'statistics', 'price', 'forecast', 'pe' -> Future
+        """
+        return {
+            'statistics': executor.submit(self.ratio_scraper.extract_ticker_metrics, ticker, industry, False),
+            'price': executor.submit(self.ratio_scraper.get_current_price, ticker),
+            'forecast': executor.submit(self.forecast_scraper.extract_forecast_data, ticker, self.current_year),
+            'pe': executor.submit(self.fetch_pe_median, ticker),
+        }
+
+    def merge(self, analyzer, ticker, fetched):
+        """
+        Merge fetched data into the analyzer's snapshot data.
+
+        A failed fetch keeps the snapshot value; a quote without a statistics
+        page updates the price of the snapshot's ratio record.
+
+        Returns:
+            dict: Dataset -> record that was refreshed, for the overlay
+        """
+        records = {}
+        ratio = fetched['statistics']
+        if ratio is not None:
+            ratio = coerce_snapshot('ratio', {ticker: ratio})[0][ticker]
+        if fetched['forecast']:
+            fetched['forecast'] = coerce_snapshot('forecast', {ticker: fetched['forecast']})[0][ticker]
+        if ratio is None and ticker in analyzer.ratio_data and fetched['price'] is not None:
+            ratio = dict(analyzer.ratio_data[ticker])
+        if ratio is not None:
+            if fetched['price'] is not None or 'currentPrice' not in ratio:
+                ratio['currentPrice'] = fetched['price']
+            records['ratio'] = analyzer.ratio_data[ticker] = ratio
+        if fetched['forecast']:
+            records['forecast'] = analyzer.forecast_data[ticker] = fetched['forecast']
+        if fetched['pe'] is not None:
+            records['pe'] = analyzer.pe_data[ticker] = fetched['pe']
+        return records
+
+    def refresh(self, ticker, industries=(None,)):
+        """
+        Fetch, value and overlay one ticker.
+
+        Args:
+            ticker (str): Stock ticker symbol
+            industries (iterable): Industries to value the ticker under (None for no peer columns)
+
+        Returns:
+            tuple: ({industry: company record or None}, list of refreshed datasets, seconds taken)
+        """
+        ticker = ticker.upper()
+        industry = next(iter(industries))
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = self.fetch(ticker, industry, executor)
+            # Snapshot loading overlaps with the network requests
+            analyzer_future = executor.submit(
+                Valuation_Analyzer_Pure, self.current_year, self.stock_list, self.horizon)
+            fetched = {name: future.result() for name, future in futures.items()}
+            analyzer = analyzer_future.result()
+
+        records = self.merge(analyzer, ticker, fetched)
+        if records:
+            path = write_overlay(ticker, records)
+            print(f"Saved refreshed {', '.join(records)} data for {ticker} to {path}")
+        else:
+            print(f"Warning: No fresh data fetched for {ticker}, valuing from snapshots")
+
+        results = {industry: analyzer.process_company(ticker, industry) for industry in industries}
+        return results, list(records), time.perf_counter() - started
@@ -0,0 +1,135 @@
+"""
+Stock universes loaded from data files instead of a hand-edited dict.
+
+A universe is an industry -> tickers mapping. Sources live in universes/ (or
+anywhere, given as a path) and can be:
+
+    .json   {"industry": ["TICKER", ...]} or a list of tickers
+    .csv    index constituents / industry tags with a ticker (or symbol) column
+            and an optional industry (or sector) column
+    .txt    a watchlist, one ticker per line, '#' starts a comment
+
+Tickers without an industry are grouped under the file's name. Several sources
+merge into one universe; a ticker may appear in more than one industry, as in
+the original stock list. PE_VALUATION_UNIVERSE (comma separated names or paths)
+selects the universe used when none is given.
+"""
+
+import csv
+import json
+import os
+
+from paths import PROJECT_ROOT
+
+UNIVERSE_DIR = os.path.join(PROJECT_ROOT, 'universes')
+DEFAULT_UNIVERSE = 'default'
+UNIVERSE_EXTENSIONS = ('.json', '.csv', '.txt')
+
+TICKER_COLUMNS = ('ticker', 'symbol')
+INDUSTRY_COLUMNS = ('industry', 'sector')
+
+
+def universe_file(source):
+    """Path of a universe given as a path or as a file name in universes/ (extension optional)"""
+    if os.path.isfile(source):
+        return source
+    candidates = [os.path.join(UNIVERSE_DIR, source)]
+    candidates += [os.path.join(UNIVERSE_DIR, source + extension) for extension in UNIVERSE_EXTENSIONS]
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return candidate
+    raise FileNotFoundError(f"Universe {source!r} not found (looked in {UNIVERSE_DIR})")
+
+
+def available_universes():
+    """Names of the universe files in universes/"""
+    if not os.path.isdir(UNIVERSE_DIR):
+        return []
+    return sorted(os.path.splitext(name)[0] for name in os.listdir(UNIVERSE_DIR)
+                  if name.endswith(UNIVERSE_EXTENSIONS))
+
+
+def _normalise(ticker):
+    return str(ticker).strip().upper()
+
+
+def _column(fieldnames, names):
+    for field in fieldnames:
+        if field.strip().lower() in names:
+            return field
+    return None
+
+
+def _read_pairs(path):
+    """(industry, ticker) pairs of one universe file; industry is None when untagged"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            return [(industry, ticker) for industry, tickers in data.items() for ticker in tickers]
+        return [(None, ticker) for ticker in data]
+
+    if extension == '.csv':
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            ticker_column = _column(reader.fieldnames or [], TICKER_COLUMNS)
+            if ticker_column is None:
+                raise ValueError(f"{path} has no ticker or symbol column")
+            industry_column = _column(reader.fieldnames, INDUSTRY_COLUMNS)
+            return [((row.get(industry_column) or '').strip() or None if industry_column else None,
+                     row[ticker_column])
+                    for row in reader if (row.get(ticker_column) or '').strip()]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = (line.split('#', 1)[0].strip() for line in f)
+        return [(None, line) for line in lines if line]
+
+
+def load_universe(sources=None):
+    """
+    Load and merge universe files.
+
+    Args:
+        sources (list or str, optional): Universe names or paths, defaults to
+            PE_VALUATION_UNIVERSE or 'default'
+
+    Returns:
+        dict: Industry -> sorted list of unique upper-case tickers
+    """
+    if sources is None:
+        sources = os.environ.get('PE_VALUATION_UNIVERSE') or DEFAULT_UNIVERSE
+    if isinstance(sources, str):
+        sources = [source.strip() for source in sources.split(',') if source.strip()]
+
+    universe = {}
+    for source in sources:
+        path = universe_file(source)
+        default_industry = os.path.splitext(os.path.basename(path))[0]
+        for industry, ticker in _read_pairs(path):
+            ticker = _normalise(ticker)
+            if ticker:
+                universe.setdefault(industry or default_industry, set()).add(ticker)
+    return {industry: sorted(tickers) for industry, tickers in universe.items()}
+
+
+def unique_tickers(stock_list):
+    """
+    Every ticker of a stock list once, with the first industry it appears in.
+
+    Returns:
+        dict: Ticker -> industry, in stock list order
+    """
+    tickers = {}
+    for industry, companies in stock_list.items():
+        for company in companies:
+            tickers.setdefault(company, industry)
+    return tickers
+
+
+def write_universe(path, stock_list):
+    """Write a stock list as a JSON universe file"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({industry: sorted(tickers) for industry, tickers in stock_list.items()}, f,
+                  ensure_ascii=False, indent=2)
+        f.write('\n')
@@ -1,15 +1,37 @@
+import json
+import os
 import random
 import re
+import threading
 import time
-from io import StringIO
+from contextlib import contextmanager
 from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
 
 import numpy as np
-import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 from requests.exceptions import HTTPError, RequestException
-from tqdm import tqdm  # Optional: For progress bars
+
+from instrumentation import RECORDER, paced_sleep
+from paths import data_path
+from profiling import profile_stage
+from task_deadline import cancellable_sleep, checkpoint, time_left
+
+try:
+    import fcntl
+except ImportError:  # Windows: pacing falls back to per-process
+    fcntl = None
+
+# Site roots the scrapers fetch from; overridable per scraper (e.g. benchmarks/mock_server.py)
+STOCKANALYSIS_URL = "https://stockanalysis.com"
+MACROTRENDS_URL = "https://www.macrotrends.net"
+
+# Next-slot files and learned request rates shared by every scraper process on this machine
+RATE_BUDGET_DIR = data_path('.rate')
+
+# Responses that mean the host wants us to slow down
+THROTTLE_STATUSES = {429, 503}
 
 def clean_json_data(data_string):
     """Clean and prepare string data for JSON parsing in getting quarterly forecast data."""
@@ -41,7 +63,154 @@ def clean_soup_value(soup):
     # print(data_string)
     return data_string
 
-def fetch_url(url, headers, max_retries=3, timeout=10, sleep_between_retries=2):
+class HostRateLimiter:
+    """
+    Thread-safe per-host request pacing shared by concurrent fetches.
+
+    Every request to the same host is spaced at least min_interval seconds
+    (plus up to jitter seconds) after the previous one, however many threads
+    are fetching.
+    """
+
+    def __init__(self, min_interval=3.0, jitter=1.0):
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """Block until the next request slot for the URL's host"""
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval + random.uniform(0, self.jitter)
+        if slot > now:
+            cancellable_sleep(slot - now)
+
+
+class AdaptiveHostBudget:
+    """
+    Per-host request rate learned with AIMD (additive increase, multiplicative
+    decrease) and shared across processes.
+
+    Requests to a host are spaced 1/rate seconds apart (plus up to jitter of
+    that interval). fetch_url reports every attempt to observe(): while
+    responses come back healthy the rate grows by `increase` requests/second
+    per second of traffic, and a 429/503, a connection error or a latency EWMA
+    above latency_factor times the host's baseline cuts it by `decrease`, at
+    most once per cooldown seconds. Retry-After pushes the next slot back.
+
+    The rate, latency baseline and next slot of each host live in
+    <state_dir>/<host>.json under an exclusive flock, so concurrent scraper
+    processes pace and learn together, and the next run starts from the rate
+    the last one found sustainable. Without fcntl the state is per process.
+    """
+
+    def __init__(self, state_dir=RATE_BUDGET_DIR, initial_rate=0.5, min_rate=0.05, max_rate=4.0, increase=0.02,
+                 decrease=0.5, latency_factor=2.0, cooldown=5.0, jitter=0.25):
+        self.state_dir = state_dir
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown
+        self.jitter = jitter
+        self._memory = {} if fcntl is None else None
+        self._lock = threading.Lock()
+
+    def _initial_state(self):
+        return {'rate': self.initial_rate, 'next_slot': 0.0, 'latency': None, 'baseline': None,
+                'last_decrease': 0.0}
+
+    @contextmanager
+    def _host_state(self, host):
+        """Read-modify-write the state of one host under the budget's lock"""
+        if self._memory is not None:
+            with self._lock:
+                yield self._memory.setdefault(host, self._initial_state())
+            return
+
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(os.path.join(self.state_dir, f"{host}.json"), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = {**self._initial_state(), **json.loads(f.read())}
+                except ValueError:
+                    state = self._initial_state()
+                yield state
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def rate(self, url):
+        """Current requests/second allowed for the URL's host"""
+        with self._host_state(urlparse(url).netloc) as state:
+            return state['rate']
+
+    def wait(self, url):
+        """Block until the next request slot for the URL's host"""
+        with self._host_state(urlparse(url).netloc) as state:
+            now = time.time()
+            slot = max(now, state['next_slot'])
+            state['next_slot'] = slot + (1 + random.uniform(0, self.jitter)) / state['rate']
+        if slot > now:
+            cancellable_sleep(slot - now)
+
+    def _cut(self, state, now):
+        if now - state['last_decrease'] >= self.cooldown:
+            state['rate'] = max(self.min_rate, state['rate'] * self.decrease)
+            state['last_decrease'] = now
+
+    def observe(self, url, status, latency, retry_after=None):
+        """
+        Adjust the host's rate after one request attempt.
+
+        Args:
+            url (str): Requested URL
+            status (int or None): HTTP status, None if no response arrived
+            latency (float): Seconds the attempt took
+            retry_after (str, optional): Retry-After header of the response
+
+        Returns:
+            float: The host's rate after the update
+        """
+        with self._host_state(urlparse(url).netloc) as state:
+            now = time.time()
+            if status is None or status in THROTTLE_STATUSES:
+                self._cut(state, now)
+                try:
+                    state['next_slot'] = max(state['next_slot'], now + float(retry_after))
+                except (TypeError, ValueError):
+                    pass
+                return state['rate']
+
+            state['latency'] = latency if state['latency'] is None else 0.8 * state['latency'] + 0.2 * latency
+            # Baseline follows the fastest latencies seen and drifts up slowly when the site gets slower for good
+            baseline = state['baseline']
+            state['baseline'] = state['latency'] if baseline is None or state['latency'] < baseline \
+                else baseline + 0.01 * (state['latency'] - baseline)
+
+            if state['latency'] > self.latency_factor * state['baseline']:
+                self._cut(state, now)
+            elif status < 500:
+                # One increment per request at `rate` requests/second adds `increase` per second
+                state['rate'] = min(self.max_rate, state['rate'] + self.increase / state['rate'])
+            return state['rate']
+
+
+# Default pacing of fetch_url, shared with every other scraper process
+RATE_BUDGET = AdaptiveHostBudget()
+
+
+def fetch_url(url, headers, max_retries=3, timeout=10, sleep_between_retries=2, rate_limiter=None):
     """
     Fetches the content of a URL with retries.
 
@@ -51,23 +220,72 @@ def fetch_url(url, headers, max_retries=3, timeout=10, sleep_between_retries=2):
         max_retries (int): Maximum number of retry attempts.
         timeout (int): Timeout for the HTTP request.
         sleep_between_retries (int): Seconds to wait between retries.
+        rate_limiter (HostRateLimiter or AdaptiveHostBudget, optional): Pacing
+            applied before every attempt, defaults to the machine-wide adaptive RATE_BUDGET.
+            Limiters with an observe() method are told the status and latency of every attempt.
 
     Returns:
         requests.Response or None: The HTTP response if successful, else None.
+
+    Each call is recorded as one 'fetch' event (network time over all attempts,
+    final status, bytes, retries, host rate afterwards) plus 'wait'/'sleep'
+    events for pacing.
+
+    Inside a guarded task (see task_deadline) the request timeout is capped at
+    the task's remaining budget and TaskCancelled is raised before any further
+    attempt once the task is cancelled.
     """
+    limiter = rate_limiter or RATE_BUDGET
+    observe = getattr(limiter, 'observe', None)
+    status, network_time, rate = None, 0.0, None
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=headers, timeout=timeout)
-            response.raise_for_status()
+            checkpoint()
+            with RECORDER.timed('wait'):
+                limiter.wait(url)
+            request_timeout = time_left(timeout)
+            started = time.perf_counter()
+            status, retry_after = None, None
+            try:
+                with profile_stage('fetch'):
+                    response = requests.get(url, headers=headers, timeout=request_timeout)
+                status = response.status_code
+                retry_after = response.headers.get('Retry-After')
+                response.raise_for_status()
+            finally:
+                latency = time.perf_counter() - started
+                network_time += latency
+                if observe:
+                    rate = observe(url, status, latency, retry_after)
+            RECORDER.record('fetch', network_time, url=url, status=status, bytes=len(response.content),
+                            retries=attempt, ok=True, rate=rate)
             return response
         except RequestException as e:
             print(f"Attempt {attempt + 1} failed for URL: {url}. Error: {e}")
             if attempt < max_retries - 1:
-                time.sleep(sleep_between_retries)
+                paced_sleep(sleep_between_retries)
             else:
                 print(f"Failed to fetch data for {url} after {max_retries} attempts.")
+                RECORDER.record('fetch', network_time, url=url, status=status, bytes=0,
+                                retries=attempt, ok=False, rate=rate)
                 return None
-            
+
+def write_json_atomic(path, data, **kwargs):
+    """
+    Write JSON so readers never see a partially written file.
+
+    The data is written to a temporary file next to path and then renamed over it.
+
+    Args:
+        path (str): Destination file path.
+        data: JSON-serialisable data.
+        **kwargs: Passed through to json.dump (e.g. indent).
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **kwargs)
+    os.replace(tmp_path, path)
+
 def parse_html(content):
     """
     Parses HTML content using BeautifulSoup.
@@ -78,7 +296,8 @@ def parse_html(content):
     Returns:
         BeautifulSoup: Parsed HTML.
     """
-    return BeautifulSoup(content, 'html.parser')
+    with RECORDER.timed('parse', bytes=len(content)):
+        return BeautifulSoup(content, 'html.parser')
 
 def extract_percentage(text):
     """
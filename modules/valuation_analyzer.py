@@ -1,83 +1,364 @@
-import time
-import random
-from tqdm import tqdm
-import pandas as pd
 from datetime import date
 import json
 import glob
+import math
 import os
 
+# pandas, tqdm and the Excel writers are imported where they are used, so
+# single-ticker lookups start without loading them
+from industry_stats import IndustryStats
+from overlay import apply_overlays, overlay_signature
+from snapshot_schema import coerce_snapshot, is_coerced, read_snapshot
+from revision_tracker import EstimateRevisionTracker, fiscal_year_field
+from quarterly_metrics import compute_quarterly_metrics
+from records import ForecastRecord, compact_snapshot, plain
+from snapshot_index import SnapshotIndex
+from universe import unique_tickers
+from report_format import format_record
+from profiling import profile_stage, profiled
+from paths import data_path, VALUATION_DIR
+
+# Forecast snapshots written before the full horizon was stored only hold
+# current/next year values, scraped with this fiscal year as current year
+LEGACY_FORECAST_YEAR = 2025
+
+# Snapshot files written by the scrapers, the newest (by mtime) of each is loaded
+SNAPSHOT_PATTERNS = {
+    'pe': data_path('pe', 'stock_list_PE_*.json'),
+    'ratio': data_path('ratio', 'stock_list_metrics_*.json'),
+    'forecast': data_path('forecast', 'stock_list_forecasts_*.json'),
+    'quarterly': data_path('quarterly', 'stock_list_quarterly_*.json'),
+}
+
+# Categories of the valuation flag columns (年估值)
+VALUATION_FLAGS = ["高估", "低估"]
+
+# A ticker missing from the latest snapshot of one of these is filled from an earlier one
+FALLBACK_DATASETS = ('pe', 'ratio', 'forecast')
+
+
+def latest_snapshot_signature():
+    """
+    Identify the snapshot files the analyzer would load right now.
+
+    Returns:
+        dict: Dataset -> (file name, mtime, size) of its newest snapshot, or None,
+              plus 'overlay' -> (file count, newest mtime) of refreshed tickers, or None
+    """
+    signature = {}
+    for kind, pattern in SNAPSHOT_PATTERNS.items():
+        files = glob.glob(pattern)
+        if not files:
+            signature[kind] = None
+            continue
+        latest = max(files, key=os.path.getmtime)
+        stat = os.stat(latest)
+        signature[kind] = (os.path.basename(latest), stat.st_mtime, stat.st_size)
+    signature['overlay'] = overlay_signature()
+    return signature
+
+
+def to_float(value):
+    """Convert a stored value to float, NaN when missing or not numeric"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+def compare_to_price(fair_price, current_price):
+    """
+    Compare the current price with a fair price.
+
+    Returns:
+        tuple: (flag, diff_pct) - '高估'/'低估' or None, and the percentage the fair
+               price is above (+) or below (-) the current price, NaN if not comparable
+    """
+    if not fair_price or not current_price or math.isnan(fair_price) or math.isnan(current_price):
+        return None, math.nan
+    flag = "高估" if current_price > fair_price else "低估"
+    return flag, (fair_price - current_price) / fair_price * 100
+
+
+def compare_to_prices(fair_prices, current_prices):
+    """
+    compare_to_price over arrays of fair and current prices.
+
+    Returns:
+        tuple: (object array of '高估'/'低估'/None, float array of diff_pct with NaN)
+    """
+    import numpy as np
+
+    fair_prices = np.asarray(fair_prices, dtype='float64')
+    current_prices = np.asarray(current_prices, dtype='float64')
+    # NaN and 0 are both "no price", as in compare_to_price
+    comparable = (np.nan_to_num(fair_prices) != 0) & (np.nan_to_num(current_prices) != 0)
+    flags = np.full(fair_prices.shape, None, dtype=object)
+    flags[comparable] = np.where(current_prices[comparable] > fair_prices[comparable], "高估", "低估")
+    diff_pct = np.full(fair_prices.shape, np.nan)
+    diff_pct[comparable] = (fair_prices[comparable] - current_prices[comparable]) / fair_prices[comparable] * 100
+    return flags, diff_pct
+
+
+def price_comparison_columns(columns):
+    """
+    The price-dependent columns of a valuation table.
+
+    Returns:
+        list: (PE median price column, 年估值 column, 年相差百分比 column) per valuation year
+    """
+    comparisons = []
+    for column in columns:
+        if not column.endswith('年估值'):
+            continue
+        suffix = column[:-len('年估值')]
+        # The first valuation year's PE median price is reported as 五年PE中位價
+        median_price = f"{suffix}年PE中位價" if f"{suffix}年PE中位價" in columns else "五年PE中位價"
+        comparisons.append((median_price, column, f"{suffix}年相差百分比"))
+    return comparisons
+
+
+def changed_tickers(old, new):
+    """Tickers added, removed or with a different record between two ticker -> record mappings"""
+    def encode(record):
+        # NaN encodes equal to NaN, nested records compare by value. A field
+        # stored as None reads like a missing one: a RecordTable has every
+        # column in every row
+        record = plain(record)
+        if isinstance(record, dict):
+            record = {key: value for key, value in record.items() if value is not None}
+        return json.dumps(record, sort_keys=True, default=str)
+
+    return {ticker for ticker in old.keys() | new.keys()
+            if ticker not in old or ticker not in new or encode(old[ticker]) != encode(new[ticker])}
+
+
+def apply_prices(industry_records, prices):
+    """
+    Re-value company records at new prices, in place.
+
+    Only 股價 and the 年估值/年相差百分比 columns depend on the price; fair
+    values and PE median prices are kept as computed.
+
+    Args:
+        industry_records (dict): Industry -> list of company_data dicts
+        prices (dict): Ticker -> current price
+
+    Returns:
+        int: Number of records repriced
+    """
+    records = [record for industry in industry_records.values() for record in industry if record['Company'] in prices]
+    if not records:
+        return 0
+    current_prices = [prices[record['Company']] for record in records]
+    for median_price, flag_column, diff_column in price_comparison_columns(list(records[0])):
+        flags, diff_pct = compare_to_prices([record[median_price] for record in records], current_prices)
+        for record, flag, diff in zip(records, flags, diff_pct):
+            record[flag_column] = flag
+            record[diff_column] = float(diff)
+    for record, price in zip(records, current_prices):
+        record['股價'] = float(price)
+    return len(records)
+
 class Valuation_Analyzer_Pure:
     """Pure calculation valuation analyzer - NO web scraping, only uses pre-collected data"""
 
-    def __init__(self, current_year=2025):
+    def __init__(self, current_year=2025, stock_list=None, horizon=2):
+        """
+        Args:
+            current_year (int): First fiscal year to value
+            stock_list (dict, optional): Industry -> tickers mapping, defaults to names.STOCK_LIST
+            horizon (int): Number of fiscal years valued, starting at current_year
+        """
         self.current_year = current_year
-
-        # Load all data files at initialization
-        self.pe_data = self._load_latest_pe_data()
-        self.ratio_data = self._load_latest_ratio_data()
-        self.forecast_data = self._load_latest_forecast_data()
-
-    def _load_latest_pe_data(self):
-        """Load the latest PE data file"""
-        pe_files = glob.glob("../data/pe/stock_list_PE_*.json")
-        if not pe_files:
-            print("Warning: No PE data files found")
+        self.valuation_years = [current_year + offset for offset in range(horizon)]
+
+        if stock_list is None:
+            from names import STOCK_LIST
+            stock_list = STOCK_LIST
+        self.stock_list = stock_list
+
+        with profile_stage('load_snapshots'):
+            # Load all data files at initialization
+            self.snapshot_files = {}
+            # Ratio and forecast records stay resident in compact form (see records)
+            self.pe_data = self._load_latest_snapshot('pe')
+            self.ratio_data = compact_snapshot('ratio', self._load_latest_snapshot('ratio'))
+            self.ratio_file = self.snapshot_files.get('ratio')
+            self.forecast_data = compact_snapshot('forecast', self._load_latest_snapshot('forecast'))
+
+            # TTM and quarter-over-quarter figures are computed once for the whole universe
+            self.quarterly_metrics = compute_quarterly_metrics(self._load_latest_snapshot('quarterly'))
+
+            # Industry-relative statistics are cached per ratio snapshot, so they
+            # are computed before refreshed ticker overlays are applied
+            self.industry_stats = self._load_industry_stats()
+            self._apply_overlays()
+            # Ticker -> dataset -> age in days of a record taken from an earlier snapshot
+            self.data_age = {}
+            self._fill_from_history()
+
+            # Estimate revisions are folded in incrementally as new snapshots land
+            self.revisions = EstimateRevisionTracker.load()
+            self.revisions.sync()
+
+    def _load_latest_snapshot(self, kind):
+        """Load the newest snapshot of a dataset ('pe', 'ratio', 'forecast' or 'quarterly')"""
+        files = glob.glob(SNAPSHOT_PATTERNS[kind])
+        if not files:
+            print(f"Warning: No {kind} data files found")
             return {}
 
-        latest_pe_file = max(pe_files, key=os.path.getmtime)
-        print(f"Loading PE data: {os.path.basename(latest_pe_file)}")
+        latest_file = max(files, key=os.path.getmtime)
+        print(f"Loading {kind} data: {os.path.basename(latest_file)}")
+        self.snapshot_files[kind] = latest_file
 
-        with open(latest_pe_file, 'r') as f:
-            return json.load(f)
+        # Snapshots written before the schema existed are coerced once, later loads read their typed copy
+        return read_snapshot(kind, latest_file)
 
-    def _load_latest_ratio_data(self):
-        """Load the latest ratio/metrics data file"""
-        ratio_files = glob.glob("../data/ratio/stock_list_metrics_*.json")
-        if not ratio_files:
-            print("Warning: No ratio data files found")
-            return {}
+    def _apply_overlays(self, kinds=('pe', 'ratio', 'forecast')):
+        """Layer on-demand refreshed ticker records over the loaded snapshots"""
+        datasets = {'pe': self.pe_data, 'ratio': self.ratio_data, 'forecast': self.forecast_data}
+        datasets = {kind: datasets[kind] for kind in kinds}
+        mtimes = {kind: os.path.getmtime(path) for kind, path in self.snapshot_files.items()}
+        refreshed = apply_overlays(datasets, mtimes)
+        if refreshed:
+            print(f"Applied refreshed data for {len(refreshed)} tickers")
 
-        latest_ratio_file = max(ratio_files, key=os.path.getmtime)
-        print(f"Loading ratio data: {os.path.basename(latest_ratio_file)}")
+    def _fill_from_history(self, kinds=FALLBACK_DATASETS):
+        """
+        Fill universe tickers missing from the latest snapshots from the newest
+        earlier snapshot that has them (see snapshot_index), recording their age.
 
-        with open(latest_ratio_file, 'r') as f:
-            return json.load(f)
+        Returns:
+            set: Tickers whose filled record or its age changed
+        """
+        datasets = {'pe': self.pe_data, 'ratio': self.ratio_data, 'forecast': self.forecast_data}
+        tickers = unique_tickers(self.stock_list)
+        changed = set()
+        for kind in kinds:
+            previous = {ticker: ages.pop(kind) for ticker, ages in self.data_age.items() if kind in ages}
+            latest = self.snapshot_files.get(kind)
+            data = datasets[kind]
+            missing = [ticker for ticker in tickers if ticker not in data]
+            filled = {}
+            if latest and missing:
+                index = SnapshotIndex.load(kind, SNAPSHOT_PATTERNS[kind])
+                index.sync()
+                for path, ages in index.resolve(missing, latest).items():
+                    with open(path, 'r') as f:
+                        records = {ticker: record for ticker, record in json.load(f).items() if ticker in ages}
+                    if not is_coerced(path):
+                        records = coerce_snapshot(kind, records)[0]
+                    for ticker, record in records.items():
+                        data[ticker] = record
+                        self.data_age.setdefault(ticker, {})[kind] = ages[ticker]
+                    filled.update(ages)
+            if filled:
+                print(f"Filled {len(filled)} {kind} records from earlier snapshots "
+                      f"(up to {max(filled.values()):g} days old)")
+            changed |= {ticker for ticker in previous.keys() | filled.keys()
+                        if previous.get(ticker) != filled.get(ticker)}
+        self.data_age = {ticker: ages for ticker, ages in self.data_age.items() if ages}
+        return changed
+
+    def reload_dataset(self, kind):
+        """
+        Reload one dataset from its newest snapshot, with what is derived from it.
 
-    def _load_latest_forecast_data(self):
-        """Load the latest forecast data file"""
-        forecast_files = glob.glob("../data/forecast/stock_list_forecasts_*.json")
-        if not forecast_files:
-            print("Warning: No forecast data files found")
-            return {}
+        Used by watch mode, so a new snapshot of one dataset does not reload the
+        others. A new ratio snapshot also recomputes the industry statistics;
+        ratio and forecast snapshots are folded into the estimate revisions.
 
-        latest_forecast_file = max(forecast_files, key=os.path.getmtime)
-        print(f"Loading forecast data: {os.path.basename(latest_forecast_file)}")
+        Args:
+            kind (str): 'pe', 'ratio', 'forecast' or 'quarterly'
 
-        with open(latest_forecast_file, 'r') as f:
-            return json.load(f)
+        Returns:
+            set: Tickers whose valuation inputs changed
+        """
+        data = self._load_latest_snapshot(kind)
+        if kind == 'quarterly':
+            metrics = compute_quarterly_metrics(data)
+            tickers = changed_tickers(self.quarterly_metrics, metrics)
+            self.quarterly_metrics = metrics
+            return tickers
+
+        attribute = f"{kind}_data"
+        previous = getattr(self, attribute)
+        setattr(self, attribute, compact_snapshot(kind, data))
+        if kind == 'ratio':
+            self.ratio_file = self.snapshot_files.get('ratio')
+            self.industry_stats = self._load_industry_stats()
+        self._apply_overlays([kind])
+        tickers = self._fill_from_history([kind])
+        tickers |= changed_tickers(previous, getattr(self, attribute))
+
+        if kind in ('ratio', 'forecast'):
+            latest_date = self.revisions.latest_date
+            tickers |= self.revisions.sync()
+            if self.revisions.latest_date != latest_date:
+                # Momentum decays to the newest snapshot date, so every tracked ticker moves
+                tickers |= set(self.revisions.metrics)
+        return tickers
+
+    def _load_industry_stats(self):
+        """Load industry medians, quartiles and percentile ranks for the loaded ratio snapshot"""
+        if not self.ratio_file:
+            return IndustryStats({}, {})
+        return IndustryStats.for_snapshot(self.ratio_file, self.ratio_data, self.stock_list)
 
     def safe_get(self, data, key, default=None):
         """Safely get a value from dictionary, returning default if None or missing"""
         value = data.get(key, default)
         return value if value is not None else default
 
+    def get_forecast_for_year(self, forecast, year):
+        """
+        Select one fiscal year from a stored forecast record.
+
+        Args:
+            forecast (ForecastRecord or dict): Forecast record for a ticker
+            year (int): Fiscal year
+
+        Returns:
+            dict: 'eps', 'eps_growth', 'revenue' and 'revenue_growth' for that year (values may be None)
+        """
+        if isinstance(forecast, ForecastRecord):
+            if forecast.years is not None:
+                return forecast.for_year(year)
+            annual_get = forecast.annual_get
+        else:
+            by_year = forecast.get('annual_by_year')
+            if by_year:
+                return by_year.get(str(year), {})
+            annual_get = forecast.get('annual', {}).get
+
+        if year == LEGACY_FORECAST_YEAR:
+            prefix = 'current'
+        elif year == LEGACY_FORECAST_YEAR + 1:
+            prefix = 'next_year'
+        else:
+            return {}
+        return {
+            'eps': annual_get(f'{prefix}_eps'),
+            'eps_growth': annual_get(f'{prefix}_growth'),
+            'revenue': annual_get(f'{prefix}_revenue'),
+            'revenue_growth': annual_get(f'{prefix}_revenue_growth'),
+        }
+
+    @profiled('calculate_valuations')
     def calculate_valuations(self, stock_data, pe_median):
         """
         Calculates various valuations and differences based on stock data.
 
         Args:
-            stock_data (dict): Contains EPS, price, growth data
+            stock_data (dict): Contains EPS per valuation year, price, growth data
             pe_median (float): The five-year median PE ratio
 
         Returns:
-            dict: Calculated valuations and differences
+            dict: Calculated valuations (floats, NaN when unavailable) and valuation flags
         """
         valuations = {}
 
-        current_year_suffix = str(self.current_year)[-2:]
-        next_year_suffix = str(self.current_year + 1)[-2:]
-
         # Get growth rate (prefer eps_growth_5y, fallback to past_eps_growth)
         growth = self.safe_get(stock_data, 'eps_growth_5y') or self.safe_get(stock_data, 'past_eps_growth', 0) or 0
 
@@ -97,71 +378,51 @@ class Valuation_Analyzer_Pure:
         else:
             valuations['預估PE'] *= 2.0
 
-        valuations['預估PE'] = round(valuations['預估PE'], 2) if valuations['預估PE'] else 0.0
-
-        # Get EPS values
-        eps_current = self.safe_get(stock_data, f'eps_{current_year_suffix}', 0.0) or 0.0
-        eps_next = self.safe_get(stock_data, f'eps_{next_year_suffix}', 0.0) or 0.0
-
-        # Current year calculations
-        valuations[f"{current_year_suffix}年EPS"] = eps_current
-        valuations[f"{current_year_suffix}年合理價"] = round(eps_current * valuations['預估PE']) if eps_current else 0
+        valuations['預估PE'] = round(float(valuations['預估PE']), 2)
 
-        # Next year calculations
-        valuations[f"{next_year_suffix}年EPS"] = eps_next
-        valuations[f"{next_year_suffix}年合理價"] = round(eps_next * valuations['預估PE']) if eps_next else 0
-
-        # Five-year PE Median calculations
-        valuations["五年PE MEDIAN"] = pe_median or 0
-        valuations["五年PE中位價"] = round((pe_median or 0) * eps_current) if eps_current else 0
+        # Five-year PE Median
+        valuations["五年PE MEDIAN"] = to_float(pe_median)
 
         # Current price
-        current_price = self.safe_get(stock_data, '股價', 0) or 0
-
-        # Valuation comparison for current year
-        if current_price and valuations["五年PE中位價"]:
-            valuations[f"{current_year_suffix}年估值"] = "高估" if current_price > valuations["五年PE中位價"] else "低估"
+        current_price = to_float(stock_data.get('股價'))
 
-            if valuations["五年PE中位價"] != 0:
-                diff_pct = (valuations['五年PE中位價'] - current_price) / valuations['五年PE中位價'] * 100
-                valuations[f"{current_year_suffix}年相差百分比"] = f"{round(diff_pct)}%"
-            else:
-                valuations[f"{current_year_suffix}年相差百分比"] = "N/A"
-        else:
-            valuations[f"{current_year_suffix}年估值"] = "N/A"
-            valuations[f"{current_year_suffix}年相差百分比"] = "N/A"
+        for index, year in enumerate(self.valuation_years):
+            suffix = str(year)[-2:]
+            eps = to_float(stock_data.get(f'eps_{suffix}'))
+            has_eps = not math.isnan(eps) and eps != 0
 
-        # Next year PE median valuation
-        valuations[f"{next_year_suffix}年PE中位價"] = round((pe_median or 0) * eps_next) if eps_next else 0
+            valuations[f"{suffix}年EPS"] = eps
+            valuations[f"{suffix}年合理價"] = float(round(eps * valuations['預估PE'])) if has_eps and valuations['預估PE'] else math.nan
 
-        # Valuation comparison for next year
-        if current_price and valuations[f"{next_year_suffix}年PE中位價"]:
-            valuations[f"{next_year_suffix}年估值"] = "高估" if current_price > valuations[f"{next_year_suffix}年PE中位價"] else "低估"
+            # The first valuation year's PE median price is reported as 五年PE中位價
+            median_price_key = "五年PE中位價" if index == 0 else f"{suffix}年PE中位價"
+            pe_median_value = valuations["五年PE MEDIAN"]
+            has_pe_median = not math.isnan(pe_median_value) and pe_median_value != 0
+            median_price = float(round(pe_median_value * eps)) if has_eps and has_pe_median else math.nan
+            valuations[median_price_key] = median_price
 
-            if valuations[f"{next_year_suffix}年PE中位價"] != 0:
-                diff_pct = (valuations[f"{next_year_suffix}年PE中位價"] - current_price) / valuations[f"{next_year_suffix}年PE中位價"] * 100
-                valuations[f"{next_year_suffix}年相差百分比"] = f"{round(diff_pct)}%"
-            else:
-                valuations[f"{next_year_suffix}年相差百分比"] = "N/A"
-        else:
-            valuations[f"{next_year_suffix}年估值"] = "N/A"
-            valuations[f"{next_year_suffix}年相差百分比"] = "N/A"
+            # Valuation comparison against the PE median price
+            flag, diff_pct = compare_to_price(median_price, current_price)
+            valuations[f"{suffix}年估值"] = flag
+            valuations[f"{suffix}年相差百分比"] = diff_pct
 
         return valuations
 
-    def process_company(self, ticker):
+    def process_company(self, ticker, industry=None):
         """
         Process data for a single company using only pre-collected data.
 
+        Values are typed: floats (NaN when missing), percentages in percent units,
+        market cap in billions and the valuation flag as '高估'/'低估' or None.
+        Formatting is left to the presentation layer (see report_format).
+
         Args:
             ticker (str): The stock ticker symbol
+            industry (str, optional): Industry to compare the company against
 
         Returns:
             dict or None: Dictionary containing all valuation data, or None if failed
         """
-        current_year_suffix = str(self.current_year)[-2:]
-        next_year_suffix = str(self.current_year + 1)[-2:]
-
         # Check if ticker exists in all required datasets
         if ticker not in self.forecast_data:
             print(f"Warning: {ticker} not found in forecast data")
@@ -176,34 +437,31 @@ class Valuation_Analyzer_Pure:
             return None
 
         # Get data from pre-loaded datasets
-        forecast = self.forecast_data[ticker]['annual']
+        forecast = self.forecast_data[ticker]
         ratio = self.ratio_data[ticker]
         pe_median = self.pe_data[ticker]
 
         # Build stock_data dictionary from all sources
         stock_data = {}
 
-        # EPS data from forecast
-        stock_data[f'eps_{current_year_suffix}'] = forecast.get('current_eps')
-        stock_data[f'eps_{next_year_suffix}'] = forecast.get('next_year_eps')
-        stock_data['past_eps_growth'] = forecast.get('current_growth')
+        # EPS data from the forecast horizon
+        for year in self.valuation_years:
+            stock_data[f'eps_{str(year)[-2:]}'] = self.get_forecast_for_year(forecast, year).get('eps')
+        stock_data['past_eps_growth'] = self.get_forecast_for_year(forecast, self.current_year).get('eps_growth')
 
         # Growth forecasts (try to get from ratio data)
         stock_data['revenue_growth_5y'] = ratio.get('revenue5y')
         stock_data['eps_growth_5y'] = ratio.get('eps5y')
 
-        # Market data from ratio
-        marketcap_raw = ratio.get('marketcap')
-        if marketcap_raw:
-            stock_data['市值'] = f"{round(marketcap_raw / 1e9, 2)}B"
-        else:
-            stock_data['市值'] = "N/A"
+        # Market data from ratio, market cap in billions
+        marketcap_raw = to_float(ratio.get('marketcap'))
+        stock_data['市值'] = round(marketcap_raw / 1e9, 2) if marketcap_raw else math.nan
 
         # Get current price from pre-collected ratio data
         # NOTE: Ratio scraper should include 'currentPrice' field
         # For backwards compatibility, if currentPrice not in data, we'll skip it
-        stock_data['股價'] = ratio.get('currentPrice', 0) or 0
-        if stock_data['股價'] == 0:
+        stock_data['股價'] = to_float(ratio.get('currentPrice'))
+        if math.isnan(stock_data['股價']) or stock_data['股價'] == 0:
             print(f"Warning: No current price for {ticker} in ratio data. Re-run ratio scraper to collect prices.")
 
         # Beta from ratio data
@@ -214,45 +472,92 @@ class Valuation_Analyzer_Pure:
 
         # Build final result
         company_data = {
-            "Revenue Growth Forecast (5Y)": f"{stock_data.get('revenue_growth_5y', 0) or 0}%",
-            "EPS Growth Forecast (5Y)": f"{stock_data.get('eps_growth_5y', 0) or 0}%",
-            "EPS Growth Past 5 Years": f"{stock_data.get('past_eps_growth', 0) or 0}%",
-            "預估PE": valuations.get("預估PE", 0),
-            f"{current_year_suffix}年EPS": valuations.get(f"{current_year_suffix}年EPS", 0),
-            f"{current_year_suffix}年合理價": valuations.get(f"{current_year_suffix}年合理價", 0),
-            f"{next_year_suffix}年EPS": valuations.get(f"{next_year_suffix}年EPS", 0),
-            f"{next_year_suffix}年合理價": valuations.get(f"{next_year_suffix}年合理價", 0),
-            "五年PEMEDIAN": valuations.get("五年PE MEDIAN", 0),
-            "五年PE中位價": valuations.get("五年PE中位價", 0),
-            "市值": stock_data.get("市值", "N/A"),
-            "股價": stock_data.get("股價", 0),
-            f"{current_year_suffix}年估值": valuations.get(f"{current_year_suffix}年估值", "N/A"),
-            f"{current_year_suffix}年相差百分比": valuations.get(f"{current_year_suffix}年相差百分比", "N/A"),
-            f"{next_year_suffix}年PE中位價": valuations.get(f"{next_year_suffix}年PE中位價", 0),
-            f"{next_year_suffix}年估值": valuations.get(f"{next_year_suffix}年估值", "N/A"),
-            f"{next_year_suffix}年相差百分比": valuations.get(f"{next_year_suffix}年相差百分比", "N/A"),
+            "Revenue Growth Forecast (5Y)": to_float(stock_data.get('revenue_growth_5y')),
+            "EPS Growth Forecast (5Y)": to_float(stock_data.get('eps_growth_5y')),
+            "EPS Growth Past 5 Years": to_float(stock_data.get('past_eps_growth')),
+            "預估PE": valuations["預估PE"],
         }
+        for year in self.valuation_years:
+            suffix = str(year)[-2:]
+            company_data[f"{suffix}年EPS"] = valuations[f"{suffix}年EPS"]
+            company_data[f"{suffix}年合理價"] = valuations[f"{suffix}年合理價"]
+
+        current_year_suffix = str(self.current_year)[-2:]
+        company_data.update({
+            "五年PEMEDIAN": valuations["五年PE MEDIAN"],
+            "五年PE中位價": valuations["五年PE中位價"],
+            "市值": stock_data["市值"],
+            "股價": stock_data["股價"],
+            f"{current_year_suffix}年估值": valuations[f"{current_year_suffix}年估值"],
+            f"{current_year_suffix}年相差百分比": valuations[f"{current_year_suffix}年相差百分比"],
+        })
+        for year in self.valuation_years[1:]:
+            suffix = str(year)[-2:]
+            company_data[f"{suffix}年PE中位價"] = valuations[f"{suffix}年PE中位價"]
+            company_data[f"{suffix}年估值"] = valuations[f"{suffix}年估值"]
+            company_data[f"{suffix}年相差百分比"] = valuations[f"{suffix}年相差百分比"]
+
+        # Quarterly history
+        quarterly = self.quarterly_metrics.get(ticker, {})
+        company_data["TTM EPS"] = to_float(quarterly.get('ttm_eps'))
+        company_data["EPS QoQ Growth"] = to_float(quarterly.get('eps_qoq'))
+        company_data["Revenue QoQ Growth"] = to_float(quarterly.get('revenue_qoq'))
+
+        # Estimate revisions across snapshots
+        next_year = self.current_year + 1
+        for label, field in (("EPS Revision", fiscal_year_field('eps', next_year)),
+                             ("Revenue Revision", fiscal_year_field('revenue', next_year)),
+                             ("EPS Growth (5Y) Revision", 'eps5y')):
+            revision = self.revisions.get_revision(ticker, field) or {}
+            company_data[f"{label} Velocity (30D)"] = to_float(revision.get('velocity'))
+            company_data[f"{label} Momentum"] = to_float(revision.get('momentum'))
+
+        # Age of the oldest record filled in from an earlier snapshot, 0 when all are current
+        company_data["Data Age (Days)"] = float(max(self.data_age.get(ticker, {}).values(), default=0))
+
+        if industry:
+            pe_rank = self.industry_stats.percentile_rank(industry, ticker, 'pe')
+            company_data["PE"] = to_float(ratio.get('pe'))
+            company_data["產業PE中位數"] = to_float(self.industry_stats.median(industry, 'pe'))
+            company_data["產業PE百分位"] = pe_rank * 100 if pe_rank is not None else math.nan
 
         return company_data
 
-    def aggregate_company_data(self, stock_list):
+    def get_peer_comparison(self, ticker, industry, metrics=None):
         """
-        Process all companies and aggregate data by industry.
+        Compare a company's ratios with its industry peers from the cached statistics.
+
+        Args:
+            ticker (str): The stock ticker symbol
+            industry (str): Industry the company is grouped under
+            metrics (list, optional): Ratio names to compare, defaults to all numeric ratios
+
+        Returns:
+            dict: Ratio name -> percentile rank and industry quartiles
+        """
+        return self.industry_stats.peer_comparison(industry, ticker, metrics)
+
+    @profiled('aggregate_company_data')
+    def aggregate_company_records(self, stock_list):
+        """
+        Process all companies and group their valuation records by industry.
 
         Args:
             stock_list (dict): Dictionary with industry as key and set of tickers as values
 
         Returns:
-            dict: Industry-wise DataFrames with transposed data
+            dict: Industry -> list of company_data dicts (with 'Industry' and 'Company' set)
         """
-        industry_dataframes = {}
+        from tqdm import tqdm
+
+        industry_records = {}
 
         for industry, companies in stock_list.items():
             print(f"\n正在處理產業：{industry}，包含 {len(companies)} 家公司。")
             all_companies_data = []
 
             for company in tqdm(list(companies), desc=f"處理 {industry}", unit="公司"):
-                company_data = self.process_company(company)
+                company_data = self.process_company(company, industry)
 
                 if company_data:
                     company_data['Industry'] = industry
@@ -262,19 +567,38 @@ class Valuation_Analyzer_Pure:
                     print(f"{company} 的數據處理失敗。")
 
             if all_companies_data:
-                # Create DataFrame
-                df = pd.DataFrame(all_companies_data)
-                # Move Industry & Company to the front
-                df.insert(0, 'Industry', df.pop('Industry'))
-                df.insert(1, 'Company', df.pop('Company'))
-                # Transpose
-                df_transposed = df.set_index(['Industry', 'Company']).transpose()
-                industry_dataframes[industry] = df_transposed
+                industry_records[industry] = all_companies_data
             else:
                 print(f"{industry} 沒有可用的公司數據。")
 
-        return industry_dataframes
+        return industry_records
+
+    def aggregate_company_data(self, stock_list):
+        """
+        Process all companies and aggregate data by industry.
+
+        Args:
+            stock_list (dict): Dictionary with industry as key and set of tickers as values
+
+        Returns:
+            dict: Industry-wise DataFrames with transposed data
+        """
+        return build_industry_dataframes(self.aggregate_company_records(stock_list))
+
+    def build_valuation_table(self, stock_list):
+        """
+        Build one typed valuation table for all companies.
+
+        Args:
+            stock_list (dict): Dictionary with industry as key and set of tickers as values
 
+        Returns:
+            pd.DataFrame: One row per (Industry, Company) with float64 metric columns
+                          (NaN when missing) and categorical valuation flag columns
+        """
+        return build_valuation_table(self.aggregate_company_records(stock_list))
+
+    @profiled('save_to_excel')
     def save_to_excel(self, industry_dataframes, path):
         """
         Save industry DataFrames to Excel file with separate worksheets.
@@ -283,12 +607,81 @@ class Valuation_Analyzer_Pure:
             industry_dataframes (dict): Industry DataFrames
             path (str): Excel file path to save
         """
-        with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
-            for industry, df in industry_dataframes.items():
-                df.to_excel(writer, sheet_name=industry, index=True)
+        from excel_export import write_dataframes_workbook
+
+        write_dataframes_workbook(industry_dataframes, path)
+        print(f"\n所有數據已保存到 {path}")
+
+    @profiled('save_to_excel')
+    def save_to_excel_fast(self, industry_records, path):
+        """
+        Save industry records to Excel by writing rows directly with xlsxwriter.
+
+        Same sheet layout as save_to_excel, without building transposed DataFrames.
+
+        Args:
+            industry_records (dict): Output of aggregate_company_records
+            path (str): Excel file path to save
+        """
+        from excel_export import write_industry_workbook
+
+        write_industry_workbook(industry_records, path)
         print(f"\n所有數據已保存到 {path}")
 
 
+@profiled('build_valuation_table')
+def build_valuation_table(industry_records):
+    """
+    Stack industry records into one typed DataFrame.
+
+    Args:
+        industry_records (dict): Industry -> list of company_data dicts
+
+    Returns:
+        pd.DataFrame: float64 metric columns, categorical valuation flags,
+                      'Industry' and 'Company' as the first two columns
+    """
+    import pandas as pd
+
+    records = [record for industry in industry_records.values() for record in industry]
+    table = pd.DataFrame.from_records(records)
+    if table.empty:
+        return table
+
+    table.insert(0, 'Industry', table.pop('Industry'))
+    table.insert(1, 'Company', table.pop('Company'))
+    for column in table.columns[2:]:
+        if column.endswith('年估值'):
+            table[column] = pd.Categorical(table[column], categories=VALUATION_FLAGS)
+        else:
+            table[column] = table[column].astype('float64')
+    return table
+
+
+def build_industry_dataframes(industry_records):
+    """
+    Build one transposed DataFrame per industry (metrics as rows, companies as columns).
+
+    Args:
+        industry_records (dict): Industry -> list of company_data dicts
+
+    Returns:
+        dict: Industry-wise DataFrames with transposed data
+    """
+    import pandas as pd
+
+    industry_dataframes = {}
+    for industry, records in industry_records.items():
+        # Create DataFrame
+        df = pd.DataFrame(records)
+        # Move Industry & Company to the front
+        df.insert(0, 'Industry', df.pop('Industry'))
+        df.insert(1, 'Company', df.pop('Company'))
+        # Transpose
+        industry_dataframes[industry] = df.set_index(['Industry', 'Company']).transpose()
+    return industry_dataframes
+
+
 if __name__ == "__main__":
     from names import STOCK_LIST
 
@@ -303,10 +696,10 @@ if __name__ == "__main__":
     test_result = analyzer.process_company('NVDA')
     if test_result:
         print("\n✓ Test successful!")
-        for key, value in list(test_result.items())[:10]:
+        for key, value in list(format_record(test_result).items())[:10]:
             print(f"  {key}: {value}")
 
     # Uncomment to run full analysis
     print("\nProcessing all companies...")
-    df_dict = analyzer.aggregate_company_data(STOCK_LIST)
-    analyzer.save_to_excel(df_dict, f'../valuation/stock_data_{date.today()}.xlsx')
+    records = analyzer.aggregate_company_records(STOCK_LIST)
+    analyzer.save_to_excel_fast(records, os.path.join(VALUATION_DIR, f'stock_data_{date.today()}.xlsx'))
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""Local HTTP/JSON valuation query service with hot reload of new snapshots"""
+
+import argparse
+import asyncio
+import copy
+import json
+import math
+import time
+from urllib.parse import unquote, urlsplit, parse_qsl
+
+import numpy as np
+
+from valuation_analyzer import (Valuation_Analyzer_Pure, compare_to_prices, latest_snapshot_signature,
+                                price_comparison_columns)
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                500: "Internal Server Error"}
+
+
+def _json_value(value):
+    """Typed table value -> JSON value (NaN becomes null)"""
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (np.floating, np.integer)):
+        return _json_value(value.item())
+    return value
+
+
+def _encode(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class ValuationState:
+    """
+    Immutable in-memory view of one valuation table.
+
+    Per-ticker and per-industry responses are serialised once when the state is
+    built, so those queries are a dict lookup. Screens filter numpy columns.
+    Live prices are applied with reprice, which returns a new state.
+    """
+
+    def __init__(self, table, signature, generation):
+        self.signature = signature
+        self.generation = generation
+        self.loaded_at = time.time()
+        self.priced_at = None
+        self.live_prices = 0
+
+        self.columns = list(table.columns)
+        self.rows = [{column: _json_value(value) for column, value in zip(self.columns, row)}
+                     for row in table.itertuples(index=False, name=None)]
+
+        # Row indices per ticker (one row per industry it is listed in) and per industry
+        self.ticker_rows, self.industry_rows = {}, {}
+        for index, row in enumerate(self.rows):
+            self.ticker_rows.setdefault(row['Company'], []).append(index)
+            self.industry_rows.setdefault(row['Industry'], []).append(index)
+        self.ticker_responses = {ticker: self._ticker_response(ticker) for ticker in self.ticker_rows}
+        self.industry_responses = {industry: self._industry_response(industry) for industry in self.industry_rows}
+
+        self.industry = table['Industry'].to_numpy(dtype=object) if len(table) else np.array([], dtype=object)
+        self.numeric = {column: table[column].to_numpy(dtype='float64')
+                        for column in self.columns if table[column].dtype == 'float64'}
+        self.text = {column: table[column].astype(object).to_numpy()
+                     for column in self.columns if column not in self.numeric}
+        self.comparisons = [columns for columns in price_comparison_columns(self.columns)
+                            if columns[0] in self.numeric and '股價' in self.numeric]
+
+    def _ticker_response(self, ticker):
+        return _encode({'ticker': ticker, 'rows': [self.rows[index] for index in self.ticker_rows[ticker]]})
+
+    def _industry_response(self, industry):
+        return _encode({'industry': industry, 'rows': [self.rows[index] for index in self.industry_rows[industry]]})
+
+    def reprice(self, prices):
+        """
+        State with live prices applied.
+
+        Only rows whose price changed get 股價, 年估值 and 年相差百分比
+        recomputed and their ticker and industry responses re-serialised; the
+        other columns do not depend on the price and are shared with this state.
+
+        Args:
+            prices (dict): Ticker -> current price
+
+        Returns:
+            ValuationState: A new state, or this one if no row changed
+        """
+        indices = [index for ticker, price in prices.items() for index in self.ticker_rows.get(ticker, ())
+                   if self.rows[index]['股價'] != price]
+        if not indices or not self.comparisons:
+            return self
+
+        state = copy.copy(self)
+        state.priced_at = time.time()
+        state.live_prices = self.live_prices + len(indices)
+        indices = np.array(indices)
+        price = np.array([prices[self.rows[index]['Company']] for index in indices], dtype='float64')
+
+        # Copy-on-write: only the price-dependent columns are replaced
+        state.numeric, state.text = dict(self.numeric), dict(self.text)
+        updated = {'股價': (state.numeric, price)}
+        for median_price, flag_column, diff_column in self.comparisons:
+            flags, diff_pct = compare_to_prices(self.numeric[median_price][indices], price)
+            updated[flag_column] = (state.text, flags)
+            updated[diff_column] = (state.numeric, diff_pct)
+        for column, (arrays, values) in updated.items():
+            arrays[column] = arrays[column].copy()
+            arrays[column][indices] = values
+
+        state.rows = list(self.rows)
+        for position, index in enumerate(indices):
+            row = dict(self.rows[index])
+            for column, (_, values) in updated.items():
+                row[column] = _json_value(values[position])
+            state.rows[index] = row
+
+        state.ticker_responses, state.industry_responses = dict(self.ticker_responses), dict(self.industry_responses)
+        for ticker in {self.rows[index]['Company'] for index in indices}:
+            state.ticker_responses[ticker] = state._ticker_response(ticker)
+        for industry in {self.rows[index]['Industry'] for index in indices}:
+            state.industry_responses[industry] = state._industry_response(industry)
+        return state
+
+    @classmethod
+    def build(cls, stock_list, current_year, horizon, generation):
+        """Load the latest snapshots and compute the valuation table"""
+        signature = latest_snapshot_signature()
+        analyzer = Valuation_Analyzer_Pure(current_year, stock_list=stock_list, horizon=horizon)
+        table = analyzer.build_valuation_table(stock_list)
+        return cls(table, signature, generation)
+
+    def health(self):
+        return {
+            'generation': self.generation,
+            'loaded_at': self.loaded_at,
+            'rows': len(self.rows),
+            'snapshots': {kind: entry[0] if entry else None for kind, entry in self.signature.items()},
+            'priced_at': self.priced_at,
+            'live_prices': self.live_prices,
+        }
+
+    def screen(self, params):
+        """
+        Filter rows with query parameters.
+
+        Supported parameters: industry=<name>, min_<column>=<x>, max_<column>=<x>,
+        <flag column>=<高估|低估>, sort=<column>, desc=1, limit=<n>.
+        """
+        mask = np.ones(len(self.rows), dtype=bool)
+        sort_column, descending, limit = None, False, None
+
+        for key, value in params:
+            if key == 'industry':
+                mask &= self.industry == value
+            elif key == 'sort':
+                sort_column = value
+            elif key == 'desc':
+                descending = value not in ('0', 'false', '')
+            elif key == 'limit':
+                limit = int(value)
+            elif key.startswith(('min_', 'max_')) and key[4:] in self.numeric:
+                column = self.numeric[key[4:]]
+                with np.errstate(invalid='ignore'):
+                    mask &= column >= float(value) if key.startswith('min_') else column <= float(value)
+            elif key in self.text:
+                mask &= self.text[key] == value
+            else:
+                raise ValueError(f"Unknown screen parameter: {key}")
+
+        indices = np.flatnonzero(mask)
+        if sort_column:
+            if sort_column not in self.numeric:
+                raise ValueError(f"Cannot sort by {sort_column}")
+            values = self.numeric[sort_column][indices]
+            # NaN always sorts last
+            order = np.argsort(-values if descending else values, kind='stable')
+            indices = indices[order]
+        if limit is not None:
+            indices = indices[:limit]
+        return {'count': len(indices), 'rows': [self.rows[index] for index in indices]}
+
+
+class ValuationService:
+    """
+    Serves the latest ValuationState and swaps in a new one when snapshots change.
+
+    With price_interval set, quotes are polled that often (see price_stream) and
+    changed prices are applied to the current state; a reload keeps them. With
+    publish set, every new state is also written to shared memory under that
+    name (see shared_table) for local readers.
+    """
+
+    def __init__(self, stock_list=None, current_year=2025, horizon=2, poll_interval=5.0, price_interval=None,
+                 publish=None):
+        if stock_list is None:
+            from names import STOCK_LIST
+            stock_list = STOCK_LIST
+        self.stock_list = stock_list
+        self.current_year = current_year
+        self.horizon = horizon
+        self.poll_interval = poll_interval
+        self.price_interval = price_interval
+        self.prices = None
+        self.state = None
+        self.publisher = None
+        if publish:
+            from shared_table import SharedTablePublisher
+            self.publisher = SharedTablePublisher(publish)
+
+    def publish(self):
+        """Write the current state to shared memory, if publishing"""
+        if self.publisher is None:
+            return
+        state = self.state
+        self.publisher.publish(state.columns, state.numeric, state.text, metadata={
+            'service_generation': state.generation,
+            'year': self.current_year,
+            'horizon': self.horizon,
+            'snapshots': {kind: entry[0] if entry else None for kind, entry in state.signature.items()},
+            'priced_at': state.priced_at,
+        })
+
+    async def reload(self):
+        """Build a new state off the event loop and swap it in with one assignment"""
+        generation = self.state.generation + 1 if self.state else 1
+        state = await asyncio.to_thread(
+            ValuationState.build, self.stock_list, self.current_year, self.horizon, generation)
+        if self.prices and self.prices.prices:
+            # Snapshot prices are older than the last polled quotes
+            state = state.reprice(self.prices.prices)
+        self.state = state
+        self.publish()
+        print(f"Valuation state generation {generation} loaded ({len(self.state.rows)} rows)")
+
+    async def watch_prices(self):
+        """Poll quotes and apply the prices that changed to the current state"""
+        from price_stream import PricePoller
+        from universe import unique_tickers
+
+        self.prices = PricePoller(unique_tickers(self.stock_list))
+        while True:
+            try:
+                changed = await asyncio.to_thread(self.prices.poll)
+            except (OSError, ValueError) as e:
+                print(f"Price poll failed: {e}")
+                changed = {}
+            if changed:
+                started = time.perf_counter()
+                state = self.state.reprice(changed)
+                if state is not self.state:
+                    self.state = state
+                    self.publish()
+                print(f"Repriced {len(changed)} tickers in {(time.perf_counter() - started) * 1000:.0f} ms")
+            await asyncio.sleep(self.price_interval)
+
+    async def watch_snapshots(self):
+        """Reload whenever the newest snapshot of any dataset changes"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if latest_snapshot_signature() == self.state.signature:
+                continue
+            try:
+                await self.reload()
+            except Exception as e:
+                # A malformed snapshot must not take the service down: keep serving, retry on the next poll
+                print(f"Reload failed, keeping generation {self.state.generation}: {type(e).__name__}: {e}")
+
+    def route(self, method, target):
+        """Answer one request, returning (status, body bytes)"""
+        if method != 'GET':
+            return 405, _encode({'error': 'only GET is supported'})
+
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        state = self.state
+
+        if parts == ['health']:
+            return 200, _encode(state.health())
+        if len(parts) == 2 and parts[0] == 'ticker':
+            body = state.ticker_responses.get(parts[1].upper())
+            return (200, body) if body else (404, _encode({'error': f'unknown ticker {parts[1]}'}))
+        if len(parts) == 2 and parts[0] == 'industry':
+            body = state.industry_responses.get(parts[1])
+            return (200, body) if body else (404, _encode({'error': f'unknown industry {parts[1]}'}))
+        if parts == ['screen']:
+            try:
+                return 200, _encode(state.screen(parse_qsl(url.query)))
+            except ValueError as e:
+                return 400, _encode({'error': str(e)})
+        return 404, _encode({'error': 'not found'})
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    status, body, keep_alive = 400, _encode({'error': 'malformed request'}), False
+                else:
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        name, _, value = line.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip().lower()
+                    keep_alive = headers.get('connection', 'keep-alive' if version == 'HTTP/1.1' else 'close') == 'keep-alive'
+                    try:
+                        status, body = self.route(method, target)
+                    except Exception as e:
+                        print(f"Error answering {method} {target}: {type(e).__name__}: {e}")
+                        status, body = 500, _encode({'error': 'internal server error'})
+
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                    f"Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        await self.reload()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Valuation service listening on http://{host}:{port}")
+        tasks = [server.serve_forever(), self.watch_snapshots()]
+        if self.price_interval:
+            tasks.append(self.watch_prices())
+        try:
+            async with server:
+                await asyncio.gather(*tasks)
+        finally:
+            if self.publisher is not None:
+                # The last version stays published for readers
+                self.publisher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve valuations from the latest snapshots")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--year', type=int, default=2025)
+    parser.add_argument('--horizon', type=int, default=2)
+    parser.add_argument('--poll-interval', type=float, default=5.0)
+    parser.add_argument('--price-interval', type=float, help="poll live quotes every this many seconds")
+    parser.add_argument('--publish', metavar='NAME', help="also publish every state to shared memory under NAME")
+    args = parser.parse_args()
+
+    service = ValuationService(current_year=args.year, horizon=args.horizon, poll_interval=args.poll_interval,
+                               price_interval=args.price_interval, publish=args.publish)
+    asyncio.run(service.serve(args.host, args.port))
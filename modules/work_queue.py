@@ -0,0 +1,554 @@
+"""
+Scrape work queue with leases, shared by worker processes on one or more hosts.
+
+A run enqueues one task per (dataset, ticker) into a SQLite database. Workers
+claim a task under a lease, keep the lease alive with heartbeats while the
+ticker is scraped, and write the result back. A task whose lease expires (the
+worker died or hung) is handed to the next worker that asks, up to
+MAX_ATTEMPTS claims. Once every task of a dataset is done or failed, its
+results are assembled into the usual dated snapshot, exactly once.
+
+Workers on the queue's machine open the database directly; workers on other
+hosts talk to `QueueServer` (`main.py queue serve`) over HTTP with
+RemoteWorkQueue, which has the same claim/heartbeat/complete/fail interface.
+Every worker fetches through fetch_url and so draws from its machine's
+RATE_BUDGET: processes sharing an egress IP share one per-host budget.
+"""
+
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from paths import data_path
+from task_deadline import TASK_BUDGET_SECONDS, run_guarded
+from universe import unique_tickers
+
+QUEUE_PATH = data_path('queue.sqlite3')
+LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 5
+# Retries of a queue server call that is unreachable or answers 503 (database busy), with doubling waits
+REMOTE_RETRIES = 6
+REMOTE_BACKOFF_SECONDS = 1
+
+# Dataset -> (module, scraper class)
+DATASET_SCRAPERS = {
+    'ratio': ('ratio_scraper', 'Ratio_Scraper_Fixed'),
+    'forecast': ('forecast_scraper', 'Forecast_Scraper_Working'),
+    'pe': ('pe_scraper', 'PERatioScraper'),
+    'quarterly': ('quarterly_scraper', 'Quarterly_Scraper'),
+}
+
+Task = namedtuple('Task', ['id', 'run_id', 'dataset', 'ticker', 'industry', 'attempts', 'options'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    options TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    industry TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    updated_at REAL,
+    priority REAL NOT NULL DEFAULT 0,
+    deadline REAL,
+    UNIQUE (run_id, dataset, ticker)
+);
+CREATE INDEX IF NOT EXISTS tasks_by_status ON tasks (run_id, status, lease_expires);
+CREATE TABLE IF NOT EXISTS assemblies (
+    run_id TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    path TEXT,
+    assembled_at REAL,
+    PRIMARY KEY (run_id, dataset)
+);
+"""
+
+# Columns added after the first release, with their definitions for ALTER TABLE
+MIGRATIONS = {
+    'priority': 'REAL NOT NULL DEFAULT 0',
+    'deadline': 'REAL',
+}
+
+
+def worker_name():
+    """Unique worker id: host, process and a random suffix"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class WorkQueue:
+    """
+    SQLite-backed task queue. Every operation uses its own connection and an
+    IMMEDIATE transaction, so any number of processes and threads can share
+    one database file.
+
+    Args:
+        path (str): Database file, created on first use
+        lease_seconds (float): Default lease length of a claim or heartbeat
+        max_attempts (int): Claims before a task whose lease keeps expiring, or
+            that keeps failing, is marked failed
+    """
+
+    def __init__(self, path=QUEUE_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            # WAL is a property of the file: readers never block the writer
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+            columns = {row[1] for row in db.execute('PRAGMA table_info(tasks)')}
+            for column, definition in MIGRATIONS.items():
+                if column not in columns:
+                    db.execute(f'ALTER TABLE tasks ADD COLUMN {column} {definition}')
+            db.commit()
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    def enqueue(self, datasets, stock_list, options=None, run_id=None, schedule=None):
+        """
+        Create a run with one task per dataset and ticker.
+
+        Tasks are claimed earliest deadline first, then by priority, then in
+        insertion order: interleaved by ticker, so workers spread their
+        requests over the sites of the different datasets.
+
+        Args:
+            datasets (list): Dataset names, keys of DATASET_SCRAPERS
+            stock_list (dict): Industry -> tickers mapping
+            options (dict, optional): Dataset -> keyword arguments of scrape_ticker
+            run_id (str, optional): Defaults to the current local time plus a random suffix
+            schedule (list, optional): scrape_scheduler.ScheduledTask entries
+                giving tasks a priority and deadline
+
+        Returns:
+            str: The run id
+        """
+        # The random suffix keeps two enqueues within the same second apart
+        run_id = run_id or f"{time.strftime('%Y-%m-%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        tickers = unique_tickers(stock_list)
+        scheduled = {(task.dataset, task.ticker): (task.priority, task.deadline) for task in schedule or []}
+        now = time.time()
+        with self._transaction() as db:
+            db.execute('INSERT INTO runs (run_id, created_at, options) VALUES (?, ?, ?)',
+                       (run_id, now, json.dumps(options or {})))
+            db.executemany(
+                'INSERT INTO tasks (run_id, dataset, ticker, industry, updated_at, priority, deadline) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(run_id, dataset, ticker, industry, now, *scheduled.get((dataset, ticker), (0, None)))
+                 for ticker, industry in tickers.items() for dataset in datasets])
+        return run_id
+
+    def latest_run(self):
+        with self._transaction() as db:
+            row = db.execute('SELECT run_id FROM runs ORDER BY created_at DESC LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def claim(self, worker, run_id=None, lease_seconds=None):
+        """
+        Lease the next pending task, or a task whose lease has expired: earliest
+        deadline first, then highest priority.
+
+        Returns:
+            Task or None: None when nothing is claimable right now
+        """
+        now = time.time()
+        lease_seconds = lease_seconds or self.lease_seconds
+        run_filter, run_args = ('AND run_id = ?', (run_id,)) if run_id else ('', ())
+        with self._transaction() as db:
+            # Expired leases that used up their attempts will not be handed out again
+            db.execute(f"UPDATE tasks SET status = 'failed', error = 'lease expired', updated_at = ? "
+                       f"WHERE status = 'leased' AND lease_expires < ? AND attempts >= ? {run_filter}",
+                       (now, now, self.max_attempts, *run_args))
+            row = db.execute(
+                f"SELECT id, run_id, dataset, ticker, industry, attempts FROM tasks "
+                f"WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) {run_filter} "
+                f"ORDER BY deadline IS NULL, deadline, priority DESC, id LIMIT 1", (now, *run_args)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                       "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                       (worker, now + lease_seconds, now, row[0]))
+            options = db.execute('SELECT options FROM runs WHERE run_id = ?', (row[1],)).fetchone()[0]
+        return Task(*row[:5], row[5] + 1, json.loads(options).get(row[2], {}))
+
+    def heartbeat(self, task_id, worker, lease_seconds=None):
+        """Extend a lease; False if the worker no longer holds it"""
+        now = time.time()
+        with self._transaction() as db:
+            updated = db.execute("UPDATE tasks SET lease_expires = ?, updated_at = ? "
+                                 "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                                 (now + (lease_seconds or self.lease_seconds), now, task_id, worker)).rowcount
+        return updated == 1
+
+    def complete(self, task_id, worker, result):
+        """Store a task's result (None if the ticker had no data); False if the lease was lost"""
+        with self._transaction() as db:
+            updated = db.execute("UPDATE tasks SET status = 'done', result = ?, error = NULL, updated_at = ? "
+                                 "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                                 (json.dumps(result), time.time(), task_id, worker)).rowcount
+        return updated == 1
+
+    def fail(self, task_id, worker, error):
+        """Release a task after an error: back to pending, or failed after max_attempts"""
+        with self._transaction() as db:
+            updated = db.execute("UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                                 "lease_owner = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                                 "WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                                 (self.max_attempts, str(error), time.time(), task_id, worker)).rowcount
+        return updated == 1
+
+    def progress(self, run_id):
+        """
+        Returns:
+            dict: Dataset -> status -> task count
+        """
+        with self._transaction() as db:
+            rows = db.execute('SELECT dataset, status, COUNT(*) FROM tasks WHERE run_id = ? '
+                              'GROUP BY dataset, status', (run_id,)).fetchall()
+        progress = {}
+        for dataset, status, count in rows:
+            progress.setdefault(dataset, {})[status] = count
+        return progress
+
+    def unfinished(self, run_id):
+        """Number of pending or leased tasks of a run"""
+        return sum(count for statuses in self.progress(run_id).values()
+                   for status, count in statuses.items() if status in ('pending', 'leased'))
+
+    def finished_datasets(self, run_id):
+        """Datasets of a run whose tasks are all done or failed"""
+        return sorted(dataset for dataset, statuses in self.progress(run_id).items()
+                      if not statuses.get('pending') and not statuses.get('leased'))
+
+    def claim_assembly(self, run_id, dataset):
+        """True for exactly one caller per finished dataset, who must then write its snapshot"""
+        with self._transaction() as db:
+            return db.execute('INSERT OR IGNORE INTO assemblies (run_id, dataset) VALUES (?, ?)',
+                              (run_id, dataset)).rowcount == 1
+
+    def release_assembly(self, run_id, dataset):
+        """Give up a claim whose snapshot could not be written, so a later call assembles it again"""
+        with self._transaction() as db:
+            db.execute('DELETE FROM assemblies WHERE run_id = ? AND dataset = ? AND path IS NULL', (run_id, dataset))
+
+    def record_assembly(self, run_id, dataset, path):
+        with self._transaction() as db:
+            db.execute('UPDATE assemblies SET path = ?, assembled_at = ? WHERE run_id = ? AND dataset = ?',
+                       (path, time.time(), run_id, dataset))
+
+    def assemblies(self, run_id):
+        """Dataset -> snapshot path of the datasets already assembled"""
+        with self._transaction() as db:
+            rows = db.execute('SELECT dataset, path FROM assemblies WHERE run_id = ?', (run_id,)).fetchall()
+        return dict(rows)
+
+    def results(self, run_id, dataset):
+        """
+        Returns:
+            dict: Ticker -> result of the done tasks that produced data
+        """
+        with self._transaction() as db:
+            rows = db.execute("SELECT ticker, result FROM tasks WHERE run_id = ? AND dataset = ? AND status = 'done' "
+                              "ORDER BY id", (run_id, dataset)).fetchall()
+        results = {}
+        for ticker, result in rows:
+            value = json.loads(result)
+            if value is not None:
+                results[ticker] = value
+        return results
+
+
+class RemoteWorkQueue:
+    """Client of a QueueServer with the worker-facing WorkQueue interface"""
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _call(self, operation, retries=REMOTE_RETRIES, **payload):
+        """
+        POST one operation, retried with backoff while the server is unreachable or busy.
+
+        Args:
+            retries (int): Retries after a connection error or a 503 before the error is raised
+        """
+        import requests
+
+        for attempt in range(retries + 1):
+            try:
+                response = requests.post(f"{self.url}/{operation}", json=payload, timeout=self.timeout)
+                if response.status_code != 503:
+                    response.raise_for_status()
+                    return response.json()['result']
+                error = requests.HTTPError(f"503 from {self.url}/{operation}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            if attempt == retries:
+                raise error
+            wait = REMOTE_BACKOFF_SECONDS * 2 ** attempt
+            print(f"Queue server {operation} failed ({error}), retrying in {wait}s")
+            time.sleep(wait)
+
+    def latest_run(self):
+        return self._call('latest_run')
+
+    def claim(self, worker, run_id=None, lease_seconds=None):
+        task = self._call('claim', worker=worker, run_id=run_id, lease_seconds=lease_seconds)
+        return Task(**task) if task else None
+
+    def heartbeat(self, task_id, worker, lease_seconds=None):
+        # The heartbeat thread retries on its own schedule and must not hold up the task's end
+        return self._call('heartbeat', retries=0, task_id=task_id, worker=worker, lease_seconds=lease_seconds)
+
+    def complete(self, task_id, worker, result):
+        return self._call('complete', task_id=task_id, worker=worker, result=result)
+
+    def fail(self, task_id, worker, error):
+        return self._call('fail', task_id=task_id, worker=worker, error=error)
+
+    def progress(self, run_id):
+        return self._call('progress', run_id=run_id)
+
+    def unfinished(self, run_id):
+        return self._call('unfinished', run_id=run_id)
+
+
+def open_queue(location=None):
+    """WorkQueue for a database path, RemoteWorkQueue for an http(s) URL"""
+    if location and location.startswith(('http://', 'https://')):
+        return RemoteWorkQueue(location)
+    return WorkQueue(location or QUEUE_PATH)
+
+
+class QueueServer:
+    """
+    Expose a WorkQueue to workers on other hosts: POST /<operation> with a JSON
+    object of arguments, answered with {"result": ...}. There is no
+    authentication, bind it to a trusted network only.
+
+    While serving, datasets that finish are assembled into snapshots here,
+    where the data directory lives.
+    """
+
+    OPERATIONS = ('latest_run', 'claim', 'heartbeat', 'complete', 'fail', 'progress', 'unfinished')
+
+    def __init__(self, queue, host='127.0.0.1', port=8766, assemble_interval=10):
+        self.queue = queue
+        self.assemble_interval = assemble_interval
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+
+    def call(self, operation, payload):
+        result = getattr(self.queue, operation)(**payload)
+        return result._asdict() if isinstance(result, Task) else result
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                operation = urlsplit(self.path).path.strip('/')
+                if operation not in server.OPERATIONS:
+                    return self._send(404, {'error': f'unknown operation {operation}'})
+                try:
+                    payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                    result = server.call(operation, payload)
+                except (TypeError, ValueError) as e:
+                    return self._send(400, {'error': str(e)})
+                except sqlite3.Error as e:
+                    # e.g. "database is locked": the worker should retry, not see a reset connection
+                    return self._send(503, {'error': str(e)})
+                self._send(200, {'result': result})
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path.strip('/') != 'progress':
+                    return self._send(404, {'error': 'not found'})
+                try:
+                    run_id = dict(parse_qsl(url.query)).get('run_id') or server.queue.latest_run()
+                    progress = server.queue.progress(run_id) if run_id else {}
+                except sqlite3.Error as e:
+                    return self._send(503, {'error': str(e)})
+                self._send(200, {'run_id': run_id, 'progress': progress})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _assemble_loop(self):
+        while True:
+            time.sleep(self.assemble_interval)
+            run_id = self.queue.latest_run()
+            if run_id:
+                assemble_finished(self.queue, run_id)
+
+    def serve_forever(self):
+        threading.Thread(target=self._assemble_loop, daemon=True).start()
+        host, port = self.httpd.server_address[:2]
+        print(f"Work queue {self.queue.path} serving on http://{host}:{port}")
+        self.httpd.serve_forever()
+
+
+def build_scraper(dataset, delay_range=None):
+    """Default scraper of a dataset; delay_range overrides its inter-ticker sleeps"""
+    import importlib
+
+    module_name, class_name = DATASET_SCRAPERS[dataset]
+    scraper_class = getattr(importlib.import_module(module_name), class_name)
+    return scraper_class() if delay_range is None or dataset == 'quarterly' else scraper_class(delay_range=delay_range)
+
+
+class QueueWorker:
+    """
+    Claim and scrape tasks until the run has nothing left to claim.
+
+    Args:
+        queue (WorkQueue or RemoteWorkQueue): Where tasks come from
+        worker (str, optional): Lease owner id, defaults to host:pid:random
+        lease_seconds (float): Lease requested per claim; heartbeats renew it every third of that
+        delay_range (tuple): Seconds (min, max) slept after each task on top of the per-host budget
+        task_budget (float): Wall-clock seconds one attempt may take before it is failed back to the queue
+    """
+
+    def __init__(self, queue, worker=None, lease_seconds=LEASE_SECONDS, delay_range=(0, 0),
+                 task_budget=TASK_BUDGET_SECONDS):
+        self.queue = queue
+        self.worker = worker or worker_name()
+        self.lease_seconds = lease_seconds
+        self.delay_range = delay_range
+        self.task_budget = task_budget
+        self.scrapers = {}
+        self.counts = {'done': 0, 'failed': 0, 'lost': 0}
+
+    def _scraper(self, dataset):
+        if dataset not in self.scrapers:
+            self.scrapers[dataset] = build_scraper(dataset, delay_range=(0, 0))
+        return self.scrapers[dataset]
+
+    def _heartbeat(self, task, stop, lost):
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                alive = self.queue.heartbeat(task.id, self.worker, self.lease_seconds)
+            except Exception as e:
+                # A missed heartbeat is retried; the lease only lapses after lease_seconds
+                print(f"Heartbeat for {task.dataset}/{task.ticker} failed: {e}")
+                continue
+            if not alive:
+                lost.set()
+                return
+
+    def run_task(self, task):
+        """Scrape one task under a heartbeat and a deadline and report the outcome to the queue"""
+        stop, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(task, stop, lost), daemon=True)
+        heartbeat.start()
+        try:
+            outcome = run_guarded(self._scraper(task.dataset).scrape_ticker, task.ticker, task.industry,
+                                  budget=self.task_budget, name=f"{task.dataset}-{task.ticker}", **task.options)
+        finally:
+            stop.set()
+            heartbeat.join()
+        if outcome.reason in ('deadline', 'error'):
+            # Back to pending for a later claim, failed for good after MAX_ATTEMPTS
+            print(f"{task.dataset}/{task.ticker} failed on attempt {task.attempts}: {outcome.detail}")
+            self.queue.fail(task.id, self.worker, f"{outcome.reason}: {outcome.detail}")
+            self.counts['failed'] += 1
+            return
+        result = outcome.result
+
+        if lost.is_set() or not self.queue.complete(task.id, self.worker, result):
+            print(f"Lease on {task.dataset}/{task.ticker} expired, result discarded")
+            self.counts['lost'] += 1
+            return
+        self.counts['done'] += 1
+
+    def run(self, run_id=None):
+        """
+        Work on a run (default: the latest) until no task is pending or leased.
+
+        Returns:
+            dict: Counts of done, failed and lost tasks
+        """
+        from instrumentation import paced_sleep
+
+        run_id = run_id or self.queue.latest_run()
+        while True:
+            task = self.queue.claim(self.worker, run_id, self.lease_seconds)
+            if task is None:
+                # Leases held by other workers may still expire and become claimable
+                if not self.queue.unfinished(run_id):
+                    return self.counts
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+            print(f"[{self.worker}] {task.dataset} {task.ticker} (attempt {task.attempts})")
+            self.run_task(task)
+            if self.delay_range[1]:
+                paced_sleep(random.uniform(*self.delay_range))
+
+
+def assemble_finished(queue, run_id):
+    """
+    Write the snapshot of every finished dataset of a run not yet assembled.
+
+    Returns:
+        dict: Dataset -> snapshot path written by this call
+    """
+    written = {}
+    for dataset in queue.finished_datasets(run_id):
+        if not queue.claim_assembly(run_id, dataset):
+            continue
+        try:
+            path = build_scraper(dataset).write_snapshot(queue.results(run_id, dataset))
+        except Exception as e:
+            # Without the release the dataset would stay claimed with no snapshot and never be retried
+            queue.release_assembly(run_id, dataset)
+            print(f"Writing the {dataset} snapshot of run {run_id} failed, it is retried on the next pass: {e}")
+            continue
+        queue.record_assembly(run_id, dataset, path)
+        written[dataset] = path
+    return written